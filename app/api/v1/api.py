@@ -3,6 +3,7 @@ from .endpoints.market_review import router as market_review_router
 from .endpoints.technical import router as technical_router
 from .endpoints.stock import router as stock_router
 from .endpoints.volume_price import router as volume_price_router
+from .endpoints.admin import router as admin_router
 from app.market_view.router import router as market_view_router
 
 api_router = APIRouter()
@@ -31,4 +32,9 @@ api_router.include_router(
     market_view_router,
     prefix="/market",
     tags=["market"]
+)
+api_router.include_router(
+    admin_router,
+    prefix="/admin",
+    tags=["admin"]
 )
\ No newline at end of file
@@ -0,0 +1,59 @@
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.core.query_stats import query_stats
+from app.core.responses import FastRoute
+from app.market_view import indicators
+
+
+async def verify_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """校验请求头 X-Admin-Token；未配置 ADMIN_TOKEN 时管理接口一律拒绝"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled: ADMIN_TOKEN is not configured")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode("utf-8"),
+                                                           settings.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(route_class=FastRoute, dependencies=[Depends(verify_admin_token)])
+
+QUERY_STATS_SORT_FIELDS = ["total_ms", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "slow"]
+
+
+@router.get("/query-stats")
+async def get_query_stats(
+    sort_by: str = Query("total_ms", description="排序字段：" + "/".join(QUERY_STATS_SORT_FIELDS)),
+    limit: int = Query(50, ge=1, le=1000, description="返回的语句指纹数")
+) -> Dict[str, Any]:
+    """按语句指纹统计的 SQL 执行耗时（p50/p95/p99 等，单位毫秒）"""
+    if sort_by not in QUERY_STATS_SORT_FIELDS:
+        raise HTTPException(status_code=400,
+                            detail=f"Invalid sort field: {sort_by}. Must be one of: {', '.join(QUERY_STATS_SORT_FIELDS)}")
+    return {
+        "since": query_stats.started_at,
+        "sample_rate": settings.QUERY_STATS_SAMPLE_RATE,
+        "slow_query_ms": settings.SLOW_QUERY_MS,
+        "queries": query_stats.snapshot(sort_by, limit)
+    }
+
+
+@router.delete("/query-stats")
+async def reset_query_stats() -> Dict[str, Any]:
+    """清空 SQL 执行耗时统计"""
+    query_stats.reset()
+    return {"reset": True}
+
+
+@router.get("/indicators/validate")
+async def validate_indicators(
+    trade_date: str = Query(..., description="交易日期，格式：YYYYMMDD"),
+    tolerance: float = Query(0.01, description="相对误差容忍度")
+) -> Dict[str, Any]:
+    """原生指标与 stk_factor_pro 当日全市场数据的逐列比对结果（全市场计算，仅供运维核对）"""
+    result = await indicators.validate_against_stk_factor(trade_date, tolerance=tolerance)
+    return {
+        "code": 0,
+        "message": "success",
+        "data": result
+    }
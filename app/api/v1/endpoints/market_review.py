@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from app.core.cache import RedisCache, get_cache
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.validators import DateValidator
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.market_view.service import MarketReviewService
+from app.market_view.market_review_service import MarketReviewService as MarketTrendService
 from loguru import logger
+from app.core.responses import FastRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
 def format_trade_date(date_str: str) -> str:
     """格式化交易日期，去掉日期中的横线"""
@@ -18,8 +19,7 @@ def format_trade_date(date_str: str) -> str:
 @router.get("/market-overview")
 async def get_market_overview(
     trade_date: str | None = None,
-    db: Session = Depends(get_db),
-    cache: RedisCache = Depends(get_cache)
+    db: AsyncSession = Depends(get_async_db)
 ):
     logger.info("Getting market overview for date: {}", trade_date)
     try:
@@ -35,8 +35,7 @@ async def get_market_overview(
 @router.get("/sector-flow")
 async def get_sector_flow(
     trade_date: str | None = None,
-    db: Session = Depends(get_db),
-    cache: RedisCache = Depends(get_cache)
+    db: AsyncSession = Depends(get_async_db)
 ):
     logger.info("Getting sector flow for date: {}", trade_date)
     try:
@@ -50,7 +49,7 @@ async def get_sector_flow(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/top-list")
-async def get_top_list(  trade_date: str | None = None, db: Session = Depends(get_db)):
+async def get_top_list(  trade_date: str | None = None, db: AsyncSession = Depends(get_async_db)):
     logger.info("Getting top list for date: {}", trade_date)
     try:
         formatted_date = format_trade_date(trade_date)
@@ -63,7 +62,7 @@ async def get_top_list(  trade_date: str | None = None, db: Session = Depends(ge
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/concepts")
-async def get_concepts(  trade_date: str | None = None, db: Session = Depends(get_db)):
+async def get_concepts(  trade_date: str | None = None, db: AsyncSession = Depends(get_async_db)):
     """获取概念列表"""
     logger.info("Getting concepts for date: {}", trade_date)
     try:
@@ -87,7 +86,7 @@ async def get_concepts(  trade_date: str | None = None, db: Session = Depends(ge
 async def get_concept_stocks(
     date: str = Query(..., description="查询日期"),
     code: str = Query(..., description="概念代码"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取概念成分股列表"""
     try:
@@ -129,12 +128,12 @@ async def get_market_trend(
         default=["total_mv", "float_mv", "turnover_rate", "pe"],
         description="指标列表，可选：total_mv（总市值）, float_mv（流通市值）, turnover_rate（换手率）, pe（市盈率）, pe_ttm（市盈率TTM）, pb（市净率）"
     ),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取市场指数的时间序列趋势数据"""
     try:
-        service = MarketReviewService(db)
-        trend_data = service.get_market_trend(index_code, start_date, end_date, metrics)
+        service = MarketTrendService(db)
+        trend_data = await service.get_market_trend(index_code, start_date, end_date, metrics)
         return {"data": trend_data}
     except Exception as e:
         logger.error(f"Error getting market trend: {str(e)}")
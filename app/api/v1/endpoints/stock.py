@@ -1,73 +1,84 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date
 from app.models.stock import StockBasic
 from app.models.limit_list import LimitList
-from app.core.database import get_db
+from app.core.database import get_async_db, fetch_all
 from app.schemas.stock import StockBasicResponse, LimitListResponse, StockDetailResponse
-from sqlalchemy import or_, text
+from app.market_view.daily_bar_store import get_daily_bar_store
+from app.market_view import stock_search_service as stock_search
+from sqlalchemy import select, text
+from app.core.responses import FastRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
+
+# 详情接口从日线列式存储读取的字段
+DETAIL_DAILY_FIELDS = ["open", "high", "low", "close", "pre_close", "vol", "amount", "pct_chg", "turnover_rate"]
 
 @router.get("/search", response_model=List[StockBasicResponse])
-async def search_stocks(query: str, db: Session = Depends(get_db)):
+async def search_stocks(query: str, limit: int = Query(10, ge=1, le=50)):
     """
-    搜索股票，支持按代码或名称搜索
+    搜索股票，支持按代码、名称或拼音首字母（如 payh → 平安银行）搜索
     """
     if not query:
         return []
     
-    stocks = db.query(StockBasic).filter(
-        or_(
-            StockBasic.ts_code.ilike(f"%{query}%"),
-            StockBasic.symbol.ilike(f"%{query}%"),
-            StockBasic.name.ilike(f"%{query}%")
-        )
-    ).limit(10).all()
-    
-    return stocks
+    return await stock_search.search_stocks(query, limit)
+
+async def _query_daily_data(db: AsyncSession, ts_code: str, start_date: str, end_date: str):
+    """从 stock_daily 查询日线数据（换手率取自 stk_factor_pro，与日线列式存储一致）"""
+    daily_query = text("""
+        SELECT 
+            d.trade_date,
+            d.open,
+            d.high,
+            d.low,
+            d.close,
+            d.pre_close,
+            d.vol as volume,
+            d.amount,
+            d.pct_chg,
+            f.turnover_rate
+        FROM stock_daily d
+        LEFT JOIN stk_factor_pro f ON f.ts_code = d.ts_code AND f.trade_date = d.trade_date
+        WHERE d.ts_code = :ts_code 
+        AND d.trade_date BETWEEN :start_date AND :end_date
+        ORDER BY d.trade_date ASC
+    """)
+    return await fetch_all(
+        daily_query,
+        {
+            "ts_code": ts_code,
+            "start_date": start_date,
+            "end_date": end_date
+        },
+        db
+    )
 
 @router.get("/detail", response_model=StockDetailResponse)
 async def get_stock_detail(
     ts_code: str,
     start_date: str,
     end_date: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取股票详细信息，包括日线数据和技术指标"""
     # 1. 获取股票基本信息
-    stock_info = db.query(StockBasic).filter(StockBasic.ts_code == ts_code).first()
+    stock_info = (await db.execute(
+        select(StockBasic).where(StockBasic.ts_code == ts_code)
+    )).scalars().first()
     if not stock_info:
         raise HTTPException(status_code=404, detail="Stock not found")
 
-    # 2. 获取日线数据
-    daily_query = text("""
-        SELECT 
-            trade_date,
-            open,
-            high,
-            low,
-            close,
-            pre_close,
-            vol as volume,
-            amount,
-            pct_chg,
-            turnover_rate
-        FROM stock_daily
-        WHERE ts_code = :ts_code 
-        AND trade_date BETWEEN :start_date AND :end_date
-        ORDER BY trade_date ASC
-    """)
-    daily_result = db.execute(
-        daily_query,
-        {
-            "ts_code": ts_code,
-            "start_date": start_date,
-            "end_date": end_date
-        }
-    )
-    daily_data = [dict(row) for row in daily_result]
+    # 2. 获取日线数据（优先从日线列式存储读取）
+    store = get_daily_bar_store()
+    if store is not None and store.covers(end_date) and store.has(ts_code):
+        daily_data = store.window(ts_code, start_date, end_date).records(
+            DETAIL_DAILY_FIELDS, rename={"vol": "volume"}
+        )
+    else:
+        daily_data = await _query_daily_data(db, ts_code, start_date, end_date)
 
     # 3. 获取技术指标数据
     tech_query = text("""
@@ -94,15 +105,15 @@ async def get_stock_detail(
         AND trade_date BETWEEN :start_date AND :end_date
         ORDER BY trade_date ASC
     """)
-    tech_result = db.execute(
+    technical_data = await fetch_all(
         tech_query,
         {
             "ts_code": ts_code,
             "start_date": start_date,
             "end_date": end_date
-        }
+        },
+        db
     )
-    technical_data = [dict(row) for row in tech_result]
 
     # 4. 获取涨跌停数据
     limit_query = text("""
@@ -116,15 +127,15 @@ async def get_stock_detail(
         AND trade_date BETWEEN :start_date AND :end_date
         ORDER BY trade_date ASC
     """)
-    limit_result = db.execute(
+    limit_data = await fetch_all(
         limit_query,
         {
             "ts_code": ts_code,
             "start_date": start_date,
             "end_date": end_date
-        }
+        },
+        db
     )
-    limit_data = [dict(row) for row in limit_result]
 
     return {
         "basic": {
@@ -142,10 +153,10 @@ async def get_stock_detail(
 async def get_limit_list(
     limit_times: Optional[int] = None,
     up_stat: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取符合连板次数和涨停统计的股票列表
     """
-    stocks = LimitList.filter_by_criteria(db, limit_times, up_stat)
+    stocks = await LimitList.filter_by_criteria(db, limit_times, up_stat)
     return stocks
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Dict, Any, List
+from fastapi import APIRouter, Body, HTTPException, Query
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel
 from app.market_view.technical_service import TechnicalAnalysisService
 from loguru import logger
 from datetime import datetime, timedelta
+from app.core.responses import FastRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
 @router.get("/indicators")
 async def get_technical_indicators(
@@ -27,3 +29,32 @@ async def get_technical_indicators(
     except Exception as e:
         logger.error(f"Error in get_technical_indicators: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+class CustomIndicatorRequest(BaseModel):
+    ts_codes: Optional[List[str]] = None
+    indicators: List[str]
+    start_date: str
+    end_date: str
+
+@router.post("/indicators/custom")
+async def get_custom_indicators(
+    request: CustomIndicatorRequest = Body(..., description="自定义指标计算参数")
+) -> Dict[str, Any]:
+    """按任意参数计算 MA/EMA/MACD/KDJ/RSI/BOLL/ATR/BIAS，不指定股票时计算全市场
+
+    指标格式为 "名称:参数1,参数2"，如 "ma:30"、"macd:12,26,9"、"boll:20,2"，省略参数取默认值。
+    """
+    try:
+        result = await TechnicalAnalysisService.get_custom_indicators(
+            ts_codes=request.ts_codes,
+            specs=request.indicators,
+            start_date=request.start_date,
+            end_date=request.end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "code": 0,
+        "message": "success",
+        "data": result
+    }
@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.market_view.market_review_service import MarketReviewService
+from app.core.responses import FastRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
 @router.get("/limit-analysis/{trade_date}")
-def get_limit_analysis(
+async def get_limit_analysis(
     trade_date: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """获取指定交易日的涨停板分析数据
     
@@ -27,14 +28,14 @@ def get_limit_analysis(
     """
     try:
         service = MarketReviewService(db)
-        return service._get_limit_up_analysis(trade_date)
+        return await service._get_limit_up_analysis(trade_date)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/daily-review/{trade_date}")
-def get_daily_review(
+async def get_daily_review(
     trade_date: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """获取指定交易日的市场复盘数据
     
@@ -51,7 +52,7 @@ def get_daily_review(
     """
     try:
         service = MarketReviewService(db)
-        return service.get_daily_review(trade_date)
+        return await service.get_daily_review(trade_date)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -59,7 +60,7 @@ def get_daily_review(
 async def get_stock_detail(
     ts_code: str,
     trade_date: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """获取股票详细信息
     
@@ -83,7 +84,7 @@ async def get_stock_detail(
 async def get_limit_history(
     ts_code: str,
     trade_date: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """获取股票的连板历史数据"""
     try:
@@ -96,7 +97,7 @@ async def get_limit_history(
 async def get_volume_analysis(
     ts_code: str,
     trade_date: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """获取股票的30日成交量分析数据"""
     try:
@@ -1,75 +1,299 @@
-from redis import Redis
-from fastapi import Depends
-from functools import lru_cache
+from redis.asyncio import ConnectionPool, Redis
+from collections import OrderedDict
+from functools import lru_cache, wraps
+import asyncio
+import copy
+import hashlib
+import inspect
 import json
-from typing import Any, Optional
+import time
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from app.core.config import settings
+from app.core.cache_policy import ttl_policy
+from app.core.metrics import CACHE_REQUESTS
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _json_default(value: Any) -> Any:
+    """JSON 序列化兜底：处理 NumPy 标量/数组等类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+
 class RedisCache:
+    """基于 redis.asyncio 的异步缓存客户端
+
+    所有方法都不会阻塞事件循环；连接由进程内共享的连接池管理，
+    创建实例时不建立连接，首次使用时才连接 Redis。
+    """
+
     def __init__(self):
+        self.pool = ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD or None,
+            decode_responses=True,
+            socket_timeout=5,
+            retry_on_timeout=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS
+        )
+        self.redis_client = Redis(connection_pool=self.pool)
+        self.default_expire = settings.CACHE_EXPIRE
+
+    async def ping(self) -> bool:
+        """测试连接"""
         try:
-            self.redis_client = Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                password=settings.REDIS_PASSWORD,
-                decode_responses=True,
-                socket_timeout=5,
-                retry_on_timeout=True
-            )
-            # 测试连接
-            self.redis_client.ping()
-            logger.info("Successfully connected to Redis")
+            return await self.redis_client.ping()
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {str(e)}")
-            raise
-
-        self.default_expire = settings.CACHE_EXPIRE
+            return False
 
-    async def get(self, key: str) -> Optional[Any]:
-        """获取缓存数据"""
+    async def get_raw(self, key: str) -> Optional[str]:
+        """获取序列化后的缓存内容"""
         try:
-            data = self.redis_client.get(key)
-            return json.loads(data) if data else None
+            return await self.redis_client.get(key)
         except Exception as e:
             logger.error(f"Redis get error: {str(e)}")
             return None
 
+    async def set_raw(self, key: str, data: str, expire: int = None) -> bool:
+        """写入已序列化的缓存内容"""
+        try:
+            await self.redis_client.set(key, data, ex=expire or self.default_expire)
+            return True
+        except Exception as e:
+            logger.error(f"Redis set error: {str(e)}")
+            return False
+
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存数据"""
+        data = await self.get_raw(key)
+        return json.loads(data) if data else None
+
     async def set(self, key: str, value: Any, expire: int = None) -> bool:
         """设置缓存数据"""
+        return await self.set_raw(key, dumps(value), expire)
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        """批量获取缓存数据（一次 MGET 往返），未命中的位置为 None"""
+        if not keys:
+            return []
         try:
-            self.redis_client.set(
-                key,
-                json.dumps(value),
-                ex=expire or self.default_expire
-            )
+            values = await self.redis_client.mget(list(keys))
+            return [json.loads(v) if v else None for v in values]
+        except Exception as e:
+            logger.error(f"Redis mget error: {str(e)}")
+            return [None] * len(keys)
+
+    async def mset(self, mapping: Dict[str, Any], expire: int = None) -> bool:
+        """批量设置缓存数据（pipeline 一次往返，每个键单独设置过期时间）"""
+        if not mapping:
+            return True
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, dumps(value), ex=expire or self.default_expire)
+                await pipe.execute()
             return True
         except Exception as e:
-            logger.error(f"Redis set error: {str(e)}")
+            logger.error(f"Redis mset error: {str(e)}")
             return False
 
     async def delete(self, key: str) -> bool:
         """删除缓存数据"""
         try:
-            return bool(self.redis_client.delete(key))
+            return bool(await self.redis_client.delete(key))
         except Exception as e:
             logger.error(f"Redis delete error: {str(e)}")
             return False
 
     async def clear_prefix(self, prefix: str) -> bool:
         """清除指定前缀的所有缓存"""
+        return await self.clear_pattern(f"{prefix}:*")
+
+    async def clear_pattern(self, pattern: str) -> bool:
+        """清除匹配模式的所有缓存（SCAN 分批删除，避免 KEYS 阻塞 Redis）"""
         try:
-            keys = self.redis_client.keys(f"{prefix}:*")
-            if keys:
-                self.redis_client.delete(*keys)
+            batch = []
+            async for key in self.redis_client.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    await self.redis_client.delete(*batch)
+                    batch = []
+            if batch:
+                await self.redis_client.delete(*batch)
             return True
         except Exception as e:
-            logger.error(f"Redis clear_prefix error: {str(e)}")
+            logger.error(f"Redis clear_pattern error: {str(e)}")
             return False
 
+    async def close(self):
+        """关闭连接池"""
+        await self.pool.disconnect()
+
+class LocalCache:
+    """进程内 LRU 缓存（一级缓存）
+
+    保存序列化后的内容，命中时由调用方反序列化，各调用方拿到的是互不影响的新对象。
+    按条目序列化后的字符长度近似估算占用，总量超过 max_size 时淘汰最久未使用的条目。
+    单个条目超过总容量的 1/4 时不缓存。
+    """
+
+    def __init__(self, max_size: int, max_expire: int):
+        self.max_size = max_size
+        self.max_expire = max_expire
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, size: int, expire: int) -> None:
+        if size > self.max_size // 4:
+            return
+        self._remove(key)
+        expires_at = time.monotonic() + min(expire, self.max_expire)
+        self._entries[key] = (expires_at, value, size)
+        self.size += size
+        while self.size > self.max_size and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def delete_matching(self, predicate: Callable[[str], bool]) -> None:
+        for key in [k for k in self._entries if predicate(k)]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
 @lru_cache()
 def get_cache() -> RedisCache:
-    return RedisCache() 
\ No newline at end of file
+    return RedisCache()
+
+@lru_cache()
+def get_local_cache() -> LocalCache:
+    return LocalCache(settings.CACHE_L1_MAX_SIZE, settings.CACHE_L1_MAX_EXPIRE)
+
+# 正在计算中的缓存键 -> 计算任务（同一进程内相同请求只计算一次）
+_inflight: Dict[str, "asyncio.Task"] = {}
+
+
+def make_cache_key(prefix: str, func: Callable, bound: inspect.BoundArguments) -> str:
+    """生成缓存键：前缀:方法名:交易日:其余参数摘要"""
+    arguments = dict(bound.arguments)
+    arguments.pop("self", None)
+    arguments.pop("cls", None)
+    trade_date = arguments.pop("trade_date", None)
+    key = f"{prefix}:{func.__name__}:{trade_date}"
+    if arguments:
+        digest = hashlib.md5(
+            json.dumps(arguments, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:12]
+        key = f"{key}:{digest}"
+    return key
+
+
+async def _load(key: str, trade_date: Optional[str], expire: Optional[int],
+                cache_if: Optional[Callable[[Any], bool]],
+                func: Callable, args: tuple, kwargs: dict) -> Any:
+    """二级缓存未命中时：读 Redis，仍未命中则调用原方法并回写两级缓存"""
+    cache = get_cache()
+    local_cache = get_local_cache()
+
+    data = await cache.get_raw(key)
+    if data:
+        CACHE_REQUESTS.inc(("redis", "hit"))
+        logger.debug(f"Cache hit: {key}")
+        value = json.loads(data)
+        ttl = expire or await ttl_policy.ttl(trade_date)
+        local_cache.set(key, data, len(data), ttl)
+        return value
+
+    CACHE_REQUESTS.inc(("redis", "miss"))
+    value = await func(*args, **kwargs)
+    if cache_if is not None and not cache_if(value):
+        return value
+    data = dumps(value)
+    ttl = expire or await ttl_policy.ttl(trade_date)
+    await cache.set_raw(key, data, ttl)
+    local_cache.set(key, data, len(data), ttl)
+    return value
+
+
+def cached(prefix: str, expire: Optional[int] = None,
+           cache_if: Optional[Callable[[Any], bool]] = None):
+    """缓存异步服务方法的返回结果
+
+    以 (方法名, trade_date, 其余参数) 作为缓存键，依次查询进程内 LRU 缓存和
+    Redis，命中时直接返回，不再访问数据库；Redis 不可用时退化为直接调用原方法。
+    同一进程内相同缓存键的并发请求只会触发一次计算，其余请求等待同一结果。
+    未指定 expire 时按交易日过期策略（app.core.cache_policy）计算过期时间；
+    cache_if 返回 False 的结果（如部分失败的结果）不写入缓存。
+
+    用法：
+        @staticmethod
+        @cached("market_review")
+        async def get_sector_flow(trade_date: str): ...
+    """
+    def decorator(func: Callable):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = make_cache_key(prefix, func, bound)
+
+            data = get_local_cache().get(key)
+            if data is not None:
+                CACHE_REQUESTS.inc(("local", "hit"))
+                return json.loads(data)
+            CACHE_REQUESTS.inc(("local", "miss"))
+
+            task = _inflight.get(key)
+            owner = task is None
+            if owner:
+                task = asyncio.ensure_future(
+                    _load(key, bound.arguments.get("trade_date"), expire, cache_if, func, args, kwargs)
+                )
+                _inflight[key] = task
+                task.add_done_callback(lambda _: _inflight.pop(key, None))
+            else:
+                CACHE_REQUESTS.inc(("inflight", "hit"))
+                logger.debug(f"Joining in-flight computation: {key}")
+            # shield：某个调用方被取消时不影响其他等待同一结果的请求
+            value = await asyncio.shield(task)
+            # 合并进来的请求各自拿一份拷贝，避免修改返回值时相互影响
+            return value if owner else copy.deepcopy(value)
+
+        return wrapper
+    return decorator
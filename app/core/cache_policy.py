@@ -0,0 +1,118 @@
+from datetime import datetime, time
+from typing import Optional
+from zoneinfo import ZoneInfo
+import logging
+from app.core.config import settings
+from app.core.trade_calendar import trade_calendar
+
+logger = logging.getLogger(__name__)
+
+# A 股交易时间（含集合竞价）
+MARKET_TZ = ZoneInfo("Asia/Shanghai")
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 0)
+
+# Redis 中记录数据入库进度的键：值为已完整入库的最新交易日（YYYYMMDD）
+WATERMARK_KEY = "ingestion:watermark"
+# 每次推进水位（包括重新入库历史交易日）时递增，供进程内的派生数据缓存判断是否失效
+GENERATION_KEY = "ingestion:generation"
+
+
+def normalize_date(value: Optional[str]) -> Optional[str]:
+    """统一日期格式为 YYYYMMDD"""
+    if not value:
+        return None
+    return str(value).replace('-', '')[:8]
+
+
+class TradeDateTTLPolicy:
+    """按交易日计算缓存过期时间
+
+    - 已收盘且已完成入库的历史交易日：数据不再变化，使用 CACHE_EXPIRE_HISTORY（长期缓存）
+    - 当日交易时间内：数据随时更新，使用 CACHE_EXPIRE_INTRADAY
+    - 当日收盘后：使用 CACHE_EXPIRE_AFTER_CLOSE，入库完成推进水位时主动清除当日缓存
+    - 尚未入库（或尚未记录水位）的历史日期、开盘前及未来日期：使用 CACHE_EXPIRE_PENDING
+    """
+
+    def __init__(self):
+        self._watermark: Optional[str] = None
+        self._generation = 0
+        self._watermark_loaded_at: Optional[datetime] = None
+
+    async def get_watermark(self) -> Optional[str]:
+        """获取入库水位，进程内缓存 CACHE_WATERMARK_REFRESH 秒"""
+        now = datetime.now(MARKET_TZ)
+        if (self._watermark_loaded_at is not None and
+                (now - self._watermark_loaded_at).total_seconds() < settings.CACHE_WATERMARK_REFRESH):
+            return self._watermark
+
+        from app.core.cache import get_cache
+        try:
+            value, generation = await get_cache().redis_client.mget(WATERMARK_KEY, GENERATION_KEY)
+            self._watermark = normalize_date(value)
+            self._generation = int(generation or 0)
+        except Exception as e:
+            logger.error(f"Failed to load ingestion watermark: {str(e)}")
+        self._watermark_loaded_at = now
+        return self._watermark
+
+    async def get_generation(self) -> int:
+        """入库代数，与水位一同缓存 CACHE_WATERMARK_REFRESH 秒"""
+        await self.get_watermark()
+        return self._generation
+
+    async def advance_watermark(self, trade_date: str) -> None:
+        """入库完成后推进水位，并清除该交易日已缓存的（可能不完整的）结果"""
+        from app.core.cache import get_cache, get_local_cache
+        trade_date = normalize_date(trade_date)
+        cache = get_cache()
+        current = normalize_date(await cache.redis_client.get(WATERMARK_KEY))
+        if current is None or trade_date > current:
+            await cache.redis_client.set(WATERMARK_KEY, trade_date)
+        self._generation = await cache.redis_client.incr(GENERATION_KEY)
+        await cache.clear_pattern(f"*:*:{trade_date}*")
+        get_local_cache().delete_matching(lambda key: f":{trade_date}" in key)
+        self._watermark = max(filter(None, [current, trade_date]))
+        self._watermark_loaded_at = datetime.now(MARKET_TZ)
+        logger.info(f"Ingestion watermark advanced to {self._watermark}")
+
+    def ttl_for(self, trade_date: Optional[str], watermark: Optional[str],
+                now: Optional[datetime] = None) -> int:
+        """计算 trade_date 对应结果的过期时间（秒）"""
+        trade_date = normalize_date(trade_date)
+        if trade_date is None:
+            return settings.CACHE_EXPIRE
+
+        now = now or datetime.now(MARKET_TZ)
+        today = now.strftime('%Y%m%d')
+
+        if trade_date < today:
+            # 未记录水位时无法确认历史日期是否已入库，按未入库短期缓存
+            if watermark is not None and trade_date <= watermark:
+                return settings.CACHE_EXPIRE_HISTORY
+            return settings.CACHE_EXPIRE_PENDING
+
+        if trade_date > today:
+            return settings.CACHE_EXPIRE_PENDING
+
+        # 当日
+        if watermark is not None and trade_date <= watermark:
+            return settings.CACHE_EXPIRE_HISTORY
+        if not trade_calendar.is_open(trade_date) or now.time() < MARKET_OPEN:
+            return settings.CACHE_EXPIRE_PENDING
+        if now.time() < MARKET_CLOSE:
+            return settings.CACHE_EXPIRE_INTRADAY
+        return settings.CACHE_EXPIRE_AFTER_CLOSE
+
+    async def ttl(self, trade_date: Optional[str]) -> int:
+        return self.ttl_for(trade_date, await self.get_watermark())
+
+
+ttl_policy = TradeDateTTLPolicy()
+
+
+if __name__ == "__main__":
+    # 数据入库完成后推进水位：python -m app.core.cache_policy 20240105
+    import asyncio
+    import sys
+    asyncio.run(ttl_policy.advance_watermark(sys.argv[1]))
@@ -8,6 +8,25 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = "123456"
     DB_NAME: str = "stockdb"
     DATABASE_URL: str = ""
+    ASYNC_DATABASE_URL: str = ""      # 异步驱动（asyncpg）连接串，默认由 DATABASE_URL 推导
+    ASYNC_DB_POOL_SIZE: int = 20
+    ASYNC_DB_MAX_OVERFLOW: int = 20
+    DB_ECHO: bool = False              # 输出全部 SQL 语句（仅调试时开启）
+
+    # SQL 执行耗时统计
+    QUERY_STATS_ENABLED: bool = True
+    QUERY_STATS_SAMPLE_RATE: float = 1.0          # 计时的语句比例
+    QUERY_STATS_MAX_FINGERPRINTS: int = 1000      # 统计的语句指纹数上限
+    SLOW_QUERY_MS: float = 500                    # 慢查询阈值（毫秒），超过时写日志
+    SLOW_QUERY_EXPLAIN: bool = False              # 慢查询执行 EXPLAIN (ANALYZE, BUFFERS)
+    SLOW_QUERY_EXPLAIN_INTERVAL: int = 600        # 同一语句两次 EXPLAIN 的最小间隔（秒）
+
+    # 运行指标（/metrics，Prometheus 文本格式）
+    METRICS_ENABLED: bool = True
+    SLOW_REQUEST_MS: float = 2000                 # 慢请求阈值（毫秒），超过时写日志
+
+    # 管理接口令牌（请求头 X-Admin-Token），为空时管理接口不可用
+    ADMIN_TOKEN: str = ""
 
     # Redis配置
     REDIS_HOST: str = "localhost"
@@ -15,6 +34,44 @@ class Settings(BaseSettings):
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
     CACHE_EXPIRE: int = 3600  # 缓存过期时间（秒）
+    REDIS_MAX_CONNECTIONS: int = 50  # 连接池最大连接数
+
+    # 按交易日的缓存过期策略（秒）
+    CACHE_EXPIRE_HISTORY: int = 30 * 24 * 3600  # 已入库的历史交易日
+    CACHE_EXPIRE_INTRADAY: int = 60             # 当日交易时间内
+    CACHE_EXPIRE_AFTER_CLOSE: int = 6 * 3600    # 当日收盘后（入库完成时主动失效）
+    CACHE_EXPIRE_PENDING: int = 300             # 尚未入库的日期
+    CACHE_WATERMARK_REFRESH: int = 30           # 入库水位的进程内缓存时间
+
+    # 进程内一级缓存
+    CACHE_L1_MAX_SIZE: int = 64 * 1024 * 1024   # 容量上限（按序列化后字符数估算）
+    CACHE_L1_MAX_EXPIRE: int = 300              # 一级缓存最长保留时间（秒）
+
+    # 每日复盘各部分的超时时间（秒）
+    DAILY_REVIEW_SECTION_TIMEOUT: float = 15
+
+    # 龙虎榜机构席位由 Postgres 预聚合为 JSON 数组返回
+    TOP_LIST_SQL_AGGREGATE: bool = False
+
+    # 交易日历：优先读取 trade_cal 表，不可用时读取文件
+    TRADE_CALENDAR_EXCHANGE: str = "SSE"
+    TRADE_CALENDAR_FILE: str = "data/trade_cal.csv"
+
+    # 股票搜索索引检查 stock_basic 变更的间隔（秒）
+    STOCK_SEARCH_REFRESH: int = 300
+
+    # 批量个股对比的股票数上限
+    COMPARE_MAX_CODES: int = 500
+
+    # 自定义指标计算区间的交易日数上限（不含预热数据）
+    CUSTOM_INDICATOR_MAX_DAYS: int = 2500         # 指定股票时
+    CUSTOM_INDICATOR_MARKET_MAX_DAYS: int = 60    # 全市场时
+
+    # 日线列式存储配置
+    DAILY_BAR_STORE_PATH: str = "data/daily_bars"  # 内存映射文件目录
+
+    # 日终数据入库文件目录（按交易日分子目录，文件名为表名）
+    INGESTION_DATA_DIR: str = "data/ingest"
 
     # 日志配置
     LOG_LEVEL: str = "DEBUG"
@@ -31,5 +88,9 @@ class Settings(BaseSettings):
                 f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}"
                 f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
             )
+        if not self.ASYNC_DATABASE_URL:
+            self.ASYNC_DATABASE_URL = self.DATABASE_URL.replace(
+                "postgresql://", "postgresql+asyncpg://", 1
+            )
 
 settings = Settings() 
\ No newline at end of file
@@ -1,18 +1,20 @@
-from sqlalchemy import create_engine, event
+from typing import Any, Dict, List, Optional, Union
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.sql.elements import TextClause
 from app.core.config import settings
+from app.core.metrics import timed_pool, watch_pool
+from app.core.query_stats import instrument
 from loguru import logger
-
-# 添加数据库查询监听器
-def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-    logger.debug("Executing query:")
-    logger.debug(f"Statement: {statement}")
-    logger.debug(f"Parameters: {parameters}")
+import pandas as pd
 
 try:
     engine = create_engine(
         settings.DATABASE_URL,
+        poolclass=timed_pool(QueuePool, "sync"),
         pool_size=5,
         max_overflow=10,
         pool_timeout=60,  # 增加超时时间
@@ -25,18 +27,38 @@ try:
             'keepalives_interval': 10,
             'keepalives_count': 5
         },
-        echo=True  # 启用 SQL 日志
+        echo=settings.DB_ECHO
     )
-    
-    # 注册查询监听器
-    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
-    
+    # 按语句指纹统计执行耗时，只记录慢查询
+    instrument(engine)
+    watch_pool(engine, "sync")
+
     logger.info("Successfully connected to the database")
 except Exception as e:
     logger.error(f"Failed to connect to database: {str(e)}")
     raise
 
+# 异步引擎（asyncpg），供请求处理路径使用；同步引擎保留给建表、离线任务等
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    poolclass=timed_pool(AsyncAdaptedQueuePool, "async"),
+    pool_size=settings.ASYNC_DB_POOL_SIZE,
+    max_overflow=settings.ASYNC_DB_MAX_OVERFLOW,
+    pool_timeout=60,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    connect_args={'timeout': 10}
+)
+instrument(async_engine.sync_engine)
+watch_pool(async_engine.sync_engine, "async")
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 Base = declarative_base()
 
 def get_db():
@@ -45,3 +67,40 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """请求级异步会话依赖，请求结束时归还连接"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def execute(query: Union[str, TextClause], params: Optional[Dict[str, Any]] = None,
+                  db: Optional[AsyncSession] = None):
+    """异步执行查询，返回已缓冲的结果；未传入会话时临时从连接池取连接"""
+    if isinstance(query, str):
+        query = text(query)
+    if db is not None:
+        return await db.execute(query, params or {})
+    async with async_engine.connect() as conn:
+        result = await conn.execute(query, params or {})
+        # 连接归还前取出全部结果
+        frozen = result.freeze()
+    return frozen()
+
+async def fetch_all(query: Union[str, TextClause], params: Optional[Dict[str, Any]] = None,
+                    db: Optional[AsyncSession] = None) -> List[Dict[str, Any]]:
+    """异步执行查询，返回字典列表"""
+    result = await execute(query, params, db)
+    return [dict(row) for row in result.mappings()]
+
+async def fetch_one(query: Union[str, TextClause], params: Optional[Dict[str, Any]] = None,
+                    db: Optional[AsyncSession] = None) -> Optional[Dict[str, Any]]:
+    """异步执行查询，返回第一行（字典）或 None"""
+    result = await execute(query, params, db)
+    row = result.mappings().first()
+    return dict(row) if row is not None else None
+
+async def read_sql(query: Union[str, TextClause], params: Optional[Dict[str, Any]] = None,
+                   db: Optional[AsyncSession] = None) -> pd.DataFrame:
+    """pd.read_sql 的异步版本（numeric 列的 Decimal 同样转换为 float）"""
+    result = await execute(query, params, db)
+    return pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
@@ -33,8 +33,8 @@ logger.add(
     format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level} | {module}:{function}:{line} | {message}"
 )
 
-# 配置 SQLAlchemy 日志
-logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+# 配置 SQLAlchemy 日志（语句日志仅在 DB_ECHO 开启时输出，耗时统计见 app.core.query_stats）
+logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO if settings.DB_ECHO else logging.WARNING)
 
 class InterceptHandler(logging.Handler):
     def emit(self, record):
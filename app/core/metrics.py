@@ -0,0 +1,316 @@
+"""进程内运行指标（Prometheus 文本格式）
+
+- HTTP：按路由模板（如 /api/v1/market/overview/{trade_date}）统计请求数、状态码、
+  延迟直方图、响应字节数和处理中的请求数，未匹配路由的请求合并为 <unmatched>
+- 数据库连接池：取连接的等待时间（含新建连接）、取连接超时次数、各状态的连接数
+- 缓存：进程内缓存、Redis 的命中/未命中次数，以及合并到进行中计算的请求数
+
+指标只在当前进程内累计，多 worker 部署时每个 worker 各自暴露，由 Prometheus
+按实例分别采集后汇总。
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import logging
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# 直方图桶上界
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                     0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f"{name}=\"{_escape(value)}\"" for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """指标基类：按标签值元组保存样本"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, labels, value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            names = self.labelnames + ("le",) * (len(labels) - len(self.labelnames))
+            lines.append(f"{name}{_format_labels(names, labels)} {_format_value(value)}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values = {}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: Labels = (), value: float = 0.0) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackGauge(Metric):
+    """采集时调用 collect() 取值的仪表（返回 标签值元组 -> 数值）"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[Labels, float]]):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            logger.warning(f"Failed to collect metric {self.name}: {str(e)}")
+            return
+        for labels, value in values.items():
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值元组 -> [各桶计数（非累计，最后一个为 +Inf）, 总和, 次数]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        with self._lock:
+            items = [(labels, list(counts), total, count)
+                     for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                yield f"{self.name}_bucket", labels + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series = {}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        for metric in self._metrics:
+            metric.reset()
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is fully sent",
+    ("method", "route"), LATENCY_BUCKETS))
+HTTP_RESPONSE_SIZE = registry.register(Histogram(
+    "http_response_size_bytes", "HTTP response body size", ("method", "route"), SIZE_BUCKETS))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being processed"))
+HTTP_ROUTE_IN_FLIGHT = registry.register(Gauge(
+    "http_route_requests_in_flight", "HTTP requests currently being processed by route handlers",
+    ("method", "route")))
+
+DB_POOL_CHECKOUT = registry.register(Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled database connection",
+    ("pool",), POOL_WAIT_BUCKETS))
+DB_POOL_TIMEOUTS = registry.register(Counter(
+    "db_pool_checkout_timeouts_total", "Database connection checkouts that hit pool_timeout", ("pool",)))
+
+CACHE_REQUESTS = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by layer (local/redis/inflight) and result", ("layer", "result")))
+
+PROCESS_START_TIME = registry.register(Gauge(
+    "process_start_time_seconds", "Start time of the process since unix epoch"))
+PROCESS_START_TIME.set((), time.time())
+
+
+# 已登记的引擎：连接池名称 -> 引擎（dispose 后 engine.pool 会替换为新池，采集时再取）
+_engines: Dict[str, Engine] = {}
+
+
+def _pool_connections() -> Dict[Labels, float]:
+    values: Dict[Labels, float] = {}
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        values[(name, "checked_out")] = pool.checkedout()
+        values[(name, "idle")] = pool.checkedin()
+        values[(name, "overflow")] = max(pool.overflow(), 0)
+    return values
+
+
+DB_POOL_CONNECTIONS = registry.register(CallbackGauge(
+    "db_pool_connections", "Database pool connections by state", ("pool", "state"), _pool_connections))
+
+
+def timed_pool(pool_class: type, name: str) -> type:
+    """连接池子类：记录每次取连接的等待时间（传给 create_engine 的 poolclass）"""
+    class TimedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                DB_POOL_TIMEOUTS.inc((name,))
+                raise
+            finally:
+                DB_POOL_CHECKOUT.observe((name,), time.perf_counter() - started)
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+def watch_pool(engine: Engine, name: str) -> None:
+    """采集时输出引擎连接池的各状态连接数（异步引擎传入 async_engine.sync_engine）"""
+    if isinstance(engine.pool, Pool):
+        _engines[name] = engine
+
+
+def route_label(scope) -> str:
+    """匹配到的路由的完整路径模板
+
+    较新版本的 FastAPI 中 include_router 的路由保留不含前缀的原始路径，
+    按模板的路径段数从实际路径中截出前缀补回；旧版本的模板已含前缀，截出的前缀为空。
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return UNMATCHED_ROUTE
+    if ":path}" in template:
+        return template
+    segments = scope["path"].split("/")
+    depth = template.count("/")
+    if depth >= len(segments):
+        return template
+    return "/".join(segments[:-depth]) + template
+
+
+class MetricsMiddleware:
+    """统计每个 HTTP 请求的延迟、状态码和响应字节数
+
+    纯 ASGI 中间件（不缓冲响应体）；路由匹配后 scope["route"] 为匹配到的路由，
+    按其路径模板归类，避免路径参数造成标签数量膨胀。超过 SLOW_REQUEST_MS 的请求写日志。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            duration = time.perf_counter() - started
+            method = scope["method"]
+            route = route_label(scope)
+            HTTP_REQUESTS.inc((method, route, str(status)))
+            HTTP_LATENCY.observe((method, route), duration)
+            HTTP_RESPONSE_SIZE.observe((method, route), size)
+            if duration * 1000 >= settings.SLOW_REQUEST_MS:
+                query_string = scope.get("query_string", b"").decode("latin-1")
+                path = scope["path"] + (f"?{query_string}" if query_string else "")
+                logger.warning(f"Slow request ({duration * 1000:.1f} ms): {method} {path} -> {status}")
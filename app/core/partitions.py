@@ -0,0 +1,62 @@
+"""按 trade_date 年度范围分区的表
+
+stock_daily、stk_factor_pro、moneyflow_dc 以 (ts_code, trade_date) 为主键，按年度
+RANGE 分区（分区名为 <表名>_y<年份>，范围 [YYYY0101, YYYY+10101)）。按股票和日期区间
+的查询只会扫描一到两个分区，按单日的截面查询只扫描一个分区。
+
+分区的创建时机：
+- alembic 迁移：按已有数据的年份范围创建
+- create_all 新建表：创建 FIRST_PARTITION_YEAR 至明年的分区
+- 数据入库：写入前确保批次涉及年份的分区存在
+"""
+from datetime import date
+from typing import Iterable
+import logging
+from sqlalchemy import Table, event, text
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("stock_daily", "stk_factor_pro", "moneyflow_dc")
+
+# create_all 新建分区表时的首个分区年份
+FIRST_PARTITION_YEAR = 1990
+
+PARTITION_BY = "RANGE (trade_date)"
+
+IS_PARTITIONED_SQL = text("""
+    SELECT c.relkind = 'p' as partitioned
+    FROM pg_class c
+    WHERE c.oid = to_regclass(:table)
+""")
+
+
+def partition_name(table: str, year: int) -> str:
+    return f"{table}_y{year}"
+
+
+def create_partition_sql(table: str, year: int) -> str:
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(table, year)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{year}0101') TO ('{year + 1}0101')")
+
+
+def default_years() -> range:
+    return range(FIRST_PARTITION_YEAR, date.today().year + 2)
+
+
+def is_partitioned(conn, table: str) -> bool:
+    row = conn.execute(IS_PARTITIONED_SQL, {"table": table}).fetchone()
+    return bool(row and row.partitioned)
+
+
+def ensure_partitions(conn, table: str, years: Iterable[int]) -> None:
+    """创建 years 中尚不存在的年度分区（conn 可以是 Connection 或 Session）"""
+    for year in sorted(set(years)):
+        conn.execute(text(create_partition_sql(table, year)))
+
+
+def partition_by_year(table: Table) -> None:
+    """ORM 模型的表由 create_all 新建后，创建默认年份范围的分区"""
+    @event.listens_for(table, "after_create")
+    def _create_partitions(target, connection, **kw):
+        ensure_partitions(connection, target.name, default_years())
+        logger.info(f"Created yearly partitions for {target.name}")
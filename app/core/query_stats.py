@@ -0,0 +1,205 @@
+"""SQL 执行耗时统计
+
+在引擎的 before/after_cursor_execute 事件上计时（按 QUERY_STATS_SAMPLE_RATE 抽样），
+按语句指纹（去掉字面量和绑定参数、合并 IN 列表、压缩空白后的 SQL）累计对数分桶直方图，
+可估算每类语句的 p50/p95/p99。只有超过 SLOW_QUERY_MS 的语句才写日志；开启
+SLOW_QUERY_EXPLAIN 时对慢查询（仅只读语句，每个指纹每 SLOW_QUERY_EXPLAIN_INTERVAL
+秒至多一次）在同一连接上执行 EXPLAIN (ANALYZE, BUFFERS) 并保存执行计划。
+"""
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 直方图桶上界：0.05ms 起每桶放大 2^(1/4) 倍（相对误差约 19%），最大约 160 秒
+BUCKET_BOUNDS = [0.05 * 2 ** (i / 4) for i in range(88)]
+
+# 超出 QUERY_STATS_MAX_FINGERPRINTS 后新出现的语句合并到此指纹
+OTHER_FINGERPRINT = "<other>"
+
+# 慢查询日志中语句的最大长度
+LOG_STATEMENT_LENGTH = 2000
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PARAMS = re.compile(r"%\([^)]+\)s|%s|\$\d+|(?<!:):[A-Za-z_]\w*")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.I)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|INTO)\b", re.I)
+# 加行锁的查询不重复执行（EXPLAIN ANALYZE 会再次加锁）
+_LOCKING = re.compile(r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.I)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """语句指纹：相同结构、不同参数的语句归为一类"""
+    text = _COMMENTS.sub(" ", statement)
+    text = _STRINGS.sub("?", text)
+    text = _PARAMS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _IN_LISTS.sub("(?)", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class QueryHistogram:
+    """单个指纹的耗时直方图（毫秒）"""
+
+    __slots__ = ("counts", "count", "total", "max", "slow", "explain", "explained_at")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.explain: Optional[str] = None
+        self.explained_at = 0.0
+
+    def record(self, duration_ms: float) -> None:
+        self.counts[bisect_left(BUCKET_BOUNDS, duration_ms)] += 1
+        self.count += 1
+        self.total += duration_ms
+        self.max = max(self.max, duration_ms)
+
+    def percentile(self, q: float) -> float:
+        """按桶内线性插值估算分位数，不超过实际最大值"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+                upper = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / n, self.max)
+            cumulative += n
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(self.max, 3),
+            "slow": self.slow,
+        }
+
+
+class QueryStats:
+    """进程内全部语句指纹的耗时统计"""
+
+    def __init__(self):
+        self._histograms: Dict[str, QueryHistogram] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, statement: str, duration_ms: float) -> QueryHistogram:
+        key = fingerprint(statement)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                if len(self._histograms) >= settings.QUERY_STATS_MAX_FINGERPRINTS:
+                    key = OTHER_FINGERPRINT
+                histogram = self._histograms.setdefault(key, QueryHistogram())
+            histogram.record(duration_ms)
+            return histogram
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+            self.started_at = time.time()
+
+    def snapshot(self, sort_by: str = "total_ms", limit: int = 50) -> List[Dict[str, Any]]:
+        """按 sort_by 降序的前 limit 个指纹的统计"""
+        with self._lock:
+            items = list(self._histograms.items())
+        rows = [{"fingerprint": key, **histogram.summary(), "explain": histogram.explain}
+                for key, histogram in items]
+        rows.sort(key=lambda row: row[sort_by], reverse=True)
+        return rows[:limit]
+
+
+query_stats = QueryStats()
+
+
+def _explain(cursor, statement: str, parameters: Any) -> Optional[str]:
+    """在同一连接上获取执行计划；用保存点隔离，失败不影响外层事务"""
+    try:
+        cursor.execute("SAVEPOINT query_stats_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(str(row[0]) for row in cursor.fetchall())
+            cursor.execute("RELEASE SAVEPOINT query_stats_explain")
+            return plan
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT query_stats_explain")
+            raise
+    except Exception as e:
+        logger.warning(f"Failed to explain slow query: {str(e)}")
+        return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    sampled = settings.QUERY_STATS_SAMPLE_RATE >= 1 or random.random() < settings.QUERY_STATS_SAMPLE_RATE
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter() if sampled else None)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("query_start_time")
+    started = stack.pop() if stack else None
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    histogram = query_stats.record(statement, duration_ms)
+    if duration_ms < settings.SLOW_QUERY_MS:
+        return
+
+    histogram.slow += 1
+    message = (f"Slow query ({duration_ms:.1f} ms): "
+               f"{_SPACES.sub(' ', statement).strip()[:LOG_STATEMENT_LENGTH]}")
+    now = time.monotonic()
+    if (settings.SLOW_QUERY_EXPLAIN and not executemany and _READ_ONLY.match(statement)
+            and not _WRITES.search(statement) and not _LOCKING.search(statement)
+            and now - histogram.explained_at >= settings.SLOW_QUERY_EXPLAIN_INTERVAL):
+        histogram.explained_at = now
+        # EXPLAIN 使用新游标，避免覆盖原语句尚未读取的结果
+        explain_cursor = conn.connection.cursor()
+        try:
+            plan = _explain(explain_cursor, statement, parameters)
+        finally:
+            explain_cursor.close()
+        if plan is not None:
+            histogram.explain = plan
+            message += f"\n{plan}"
+    logger.warning(message)
+
+
+def _handle_error(exception_context):
+    """语句执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间"""
+    conn = exception_context.connection
+    stack = conn.info.get("query_start_time") if conn is not None else None
+    if stack:
+        stack.pop()
+
+
+def instrument(engine: Engine) -> None:
+    """为同步引擎（异步引擎传入 async_engine.sync_engine）注册计时事件"""
+    if not settings.QUERY_STATS_ENABLED or settings.QUERY_STATS_SAMPLE_RATE <= 0:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
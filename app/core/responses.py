@@ -0,0 +1,125 @@
+import asyncio
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
+from typing import Any, Callable, Optional
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.routing import APIRoute
+from fastapi.datastructures import DefaultPlaceholder
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from app.core.metrics import HTTP_ROUTE_IN_FLIGHT, route_label
+
+try:
+    import msgpack
+except ImportError:  # 未安装 msgpack 时只输出 JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# 当前请求是否要求 MessagePack 输出（由 FastRoute 按 Accept 头设置）
+_msgpack_requested: ContextVar[bool] = ContextVar("msgpack_requested", default=False)
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    """orjson / msgpack 无法直接处理的类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Decimal):
+        return float(value)
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray) and value.dtype.kind == "f":
+        # 与 JSON 输出保持一致：NaN/inf 输出 null
+        result = value.astype(object)
+        result[~np.isfinite(value)] = None
+        return result.tolist()
+    return _default(value)
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    if not accept or msgpack is None:
+        return False
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson 序列化的响应类
+
+    直接处理 NumPy 标量/数组、datetime、Decimal，NaN/inf 输出 null；
+    请求 Accept 头包含 application/msgpack 时改为输出 MessagePack。
+    """
+
+    def __init__(self, content: Any, status_code: int = 200, headers=None,
+                 media_type: Optional[str] = None, background=None):
+        if media_type is None and _msgpack_requested.get():
+            media_type = MSGPACK_MEDIA_TYPES[0]
+        super().__init__(content, status_code, headers, media_type, background)
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type in MSGPACK_MEDIA_TYPES:
+            return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+class FastRoute(APIRoute):
+    """未声明 response_model 的路由直接用 FastJSONResponse 序列化返回值
+
+    跳过 FastAPI 默认的 jsonable_encoder 逐层转换，大体量结果（技术指标、
+    个股对比等）不再需要预先把 NumPy 类型转换为 Python 类型。
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        response_model = kwargs.get("response_model")
+        if response_model is None or isinstance(response_model, DefaultPlaceholder):
+            endpoint = self._wrap_endpoint(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _wrap_endpoint(endpoint: Callable, status_code: Optional[int]) -> Callable:
+        is_coroutine = asyncio.iscoroutinefunction(endpoint)
+
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            if is_coroutine:
+                result = await endpoint(*args, **kwargs)
+            else:
+                result = await run_in_threadpool(endpoint, *args, **kwargs)
+            if isinstance(result, Response):
+                return result
+            return FastJSONResponse(result, status_code=status_code or 200)
+
+        return wrapper
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            token = _msgpack_requested.set(wants_msgpack(request.headers.get("accept")))
+            # 按路由统计处理中的请求数，用于定位占满 worker 的接口
+            labels = (request.method, route_label(request.scope))
+            HTTP_ROUTE_IN_FLIGHT.inc(labels)
+            try:
+                return await handler(request)
+            finally:
+                HTTP_ROUTE_IN_FLIGHT.dec(labels)
+                _msgpack_requested.reset(token)
+
+        return route_handler
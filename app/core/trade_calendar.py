@@ -0,0 +1,195 @@
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DateLike = Union[str, int, date, datetime]
+
+TRADE_CAL_QUERY = text("""
+    SELECT cal_date
+    FROM trade_cal
+    WHERE exchange = :exchange
+    AND is_open = 1
+    ORDER BY cal_date
+""")
+
+
+def to_int(value: DateLike) -> int:
+    """日期统一转换为 YYYYMMDD 整数"""
+    if isinstance(value, (date, datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(str(value).replace('-', '')[:8])
+
+
+def to_str(value: int) -> str:
+    return str(int(value))
+
+
+def _weekdays() -> np.ndarray:
+    """无交易日历数据时的近似：2000 年至明年年底的全部工作日"""
+    days = pd.bdate_range("2000-01-01", f"{date.today().year + 1}-12-31")
+    return (days.year * 10000 + days.month * 100 + days.day).to_numpy(dtype=np.int64)
+
+
+class TradeCalendar:
+    """交易日历
+
+    交易日以 YYYYMMDD 整数的有序数组保存，所有查询都是二分查找（np.searchsorted）。
+    数据来源依次为 trade_cal 表、TRADE_CALENDAR_FILE 文件，均不可用时退化为工作日近似；
+    日历范围之外的日期按工作日判断是否开市。
+
+    服务层用它直接计算查询的日期边界，例如 "前 10 个交易日" 作为字面参数传给 SQL，
+    不再在每次查询中用 DISTINCT/ORDER BY/LIMIT 子查询推算。
+    """
+
+    def __init__(self):
+        self._dates = np.empty(0, dtype=np.int64)
+        self.source: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.source is not None
+
+    @property
+    def authoritative(self) -> bool:
+        """是否为真实交易日历（而非工作日近似）"""
+        if not self.loaded:
+            self.load_sync()
+        return self.source != "weekdays"
+
+    def set_dates(self, dates: Iterable[DateLike], source: str) -> None:
+        values = np.unique(np.fromiter((to_int(d) for d in dates), dtype=np.int64))
+        self._dates = values
+        self.source = source
+        if len(values):
+            logger.info(f"Trade calendar loaded from {source}: "
+                        f"{len(values)} days, {values[0]} - {values[-1]}")
+
+    async def load(self) -> None:
+        """从 trade_cal 表加载（应用启动时调用，可重复调用以刷新）"""
+        from app.core.database import fetch_all
+        try:
+            rows = await fetch_all(TRADE_CAL_QUERY, {"exchange": settings.TRADE_CALENDAR_EXCHANGE})
+            if rows:
+                self.set_dates((row["cal_date"] for row in rows), "trade_cal")
+                return
+        except Exception as e:
+            logger.warning(f"Failed to load trade calendar from database: {str(e)}")
+        self._load_fallback()
+
+    def load_sync(self) -> None:
+        """同步加载，供命令行脚本等非异步场景使用"""
+        from app.core.database import engine
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(TRADE_CAL_QUERY, {"exchange": settings.TRADE_CALENDAR_EXCHANGE}).fetchall()
+            if rows:
+                self.set_dates((row.cal_date for row in rows), "trade_cal")
+                return
+        except Exception as e:
+            logger.warning(f"Failed to load trade calendar from database: {str(e)}")
+        self._load_fallback()
+
+    def _load_fallback(self) -> None:
+        path = Path(settings.TRADE_CALENDAR_FILE)
+        if path.exists():
+            # tushare trade_cal 导出格式（cal_date, is_open 列），或每行一个交易日
+            df = pd.read_csv(path, dtype=str)
+            if "cal_date" in df.columns:
+                if "is_open" in df.columns:
+                    df = df[df["is_open"].astype(int) == 1]
+                dates = df["cal_date"]
+            else:
+                dates = pd.read_csv(path, dtype=str, header=None)[0]
+            self.set_dates(dates.dropna(), str(path))
+            return
+        logger.warning("No trade calendar available, falling back to weekdays")
+        self._dates = _weekdays()
+        self.source = "weekdays"
+
+    @property
+    def dates(self) -> np.ndarray:
+        if not self.loaded:
+            self.load_sync()
+        return self._dates
+
+    def _covers(self, value: int) -> bool:
+        dates = self.dates
+        return len(dates) > 0 and dates[0] <= value <= dates[-1]
+
+    def is_open(self, value: DateLike) -> bool:
+        """是否为交易日"""
+        try:
+            value = to_int(value)
+            if not self._covers(value):
+                return datetime.strptime(str(value), '%Y%m%d').weekday() < 5
+        except ValueError:
+            return False
+        dates = self.dates
+        index = np.searchsorted(dates, value)
+        return index < len(dates) and dates[index] == value
+
+    def offset(self, value: DateLike, n: int) -> Optional[str]:
+        """相对 value 的第 n 个交易日
+
+        n > 0 为之后第 n 个交易日，n < 0 为之前第 |n| 个交易日（均不含 value 本身）；
+        n == 0 时 value 为交易日则返回 value，否则返回之前最近的交易日。
+        超出日历范围时返回 None。
+        """
+        value = to_int(value)
+        dates = self.dates
+        if n > 0:
+            index = np.searchsorted(dates, value, side='right') + n - 1
+        else:
+            index = np.searchsorted(dates, value, side='left') + n
+            if n == 0 and index < len(dates) and dates[index] == value:
+                return to_str(value)
+            if n == 0:
+                index -= 1
+        if 0 <= index < len(dates):
+            return to_str(dates[index])
+        return None
+
+    def prev(self, value: DateLike, n: int = 1) -> Optional[str]:
+        """之前第 n 个交易日"""
+        return self.offset(value, -n)
+
+    def next(self, value: DateLike, n: int = 1) -> Optional[str]:
+        """之后第 n 个交易日"""
+        return self.offset(value, n)
+
+    def window_start(self, value: DateLike, n: int) -> str:
+        """value 之前 n 个交易日中最早的一天（不足 n 天时取日历首日，没有更早交易日时取 value）
+
+        等价于 SELECT MIN(trade_date) FROM (... WHERE trade_date < :value ORDER BY trade_date DESC LIMIT n)
+        """
+        value = to_int(value)
+        dates = self.dates
+        end = np.searchsorted(dates, value, side='left')
+        if end == 0 or n <= 0:
+            return to_str(value)
+        return to_str(dates[max(end - n, 0)])
+
+    def range(self, start: DateLike, end: DateLike) -> List[str]:
+        """[start, end] 区间内的全部交易日"""
+        dates = self.dates
+        lo = np.searchsorted(dates, to_int(start), side='left')
+        hi = np.searchsorted(dates, to_int(end), side='right')
+        return [to_str(d) for d in dates[lo:hi]]
+
+    def count(self, start: DateLike, end: DateLike) -> int:
+        """[start, end] 区间内的交易日数"""
+        dates = self.dates
+        return int(np.searchsorted(dates, to_int(end), side='right') -
+                   np.searchsorted(dates, to_int(start), side='left'))
+
+
+trade_calendar = TradeCalendar()
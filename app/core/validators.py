@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, validator
+from app.core.trade_calendar import trade_calendar
 
 class DateValidator(BaseModel):
     trade_date: str
@@ -18,15 +19,9 @@ class DateValidator(BaseModel):
             raise ValueError(f"无效的交易日期: {str(e)}")
 
 def is_trading_day(date_str: str) -> bool:
-    """检查是否为交易日"""
+    """检查是否为交易日（按交易日历，见 app.core.trade_calendar）"""
     try:
-        # 这里可以接入 tushare 或其他数据源来验证是否为交易日
-        # 示例实现
-        date = datetime.strptime(date_str, '%Y-%m-%d')
-        # 周末不是交易日
-        if date.weekday() > 4:
-            return False
-        # TODO: 检查节假日
-        return True
-    except:
-        return False 
\ No newline at end of file
+        datetime.strptime(date_str, '%Y-%m-%d')
+    except ValueError:
+        return False
+    return trade_calendar.is_open(date_str)
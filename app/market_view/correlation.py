@@ -0,0 +1,149 @@
+"""全市场收益率相关性与 beta 计算
+
+以 (股票 × 交易日) 的日收益率矩阵为基础，对任意一条收益率序列（某只股票或指数）
+一次性向量化计算全市场每只股票与它的相关系数和 beta。缺失值（停牌、未上市）
+按成对有效样本处理：每只股票只使用自身与目标序列同时有数据的交易日。
+"""
+import asyncio
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import text
+from app.core.cache_policy import ttl_policy
+from app.core.database import read_sql
+from app.core.trade_calendar import trade_calendar
+from app.market_view.daily_bar_store import get_daily_bar_store, to_int_date
+
+logger = logger.bind(module=__name__)
+
+# 有效样本不足窗口的该比例时结果为 NaN
+MIN_OBSERVATION_RATIO = 0.8
+
+# 进程内缓存的收益率矩阵个数（按 交易日 + 窗口）
+MATRIX_CACHE_SIZE = 4
+
+
+class ReturnsMatrix(NamedTuple):
+    codes: np.ndarray     # 股票代码，长度 N
+    dates: np.ndarray     # 交易日 YYYYMMDD 整数，长度 T
+    returns: np.ndarray   # (N, T) 日收益率（小数），缺失为 NaN
+
+    def row(self, ts_code: str) -> Optional[np.ndarray]:
+        index = np.flatnonzero(self.codes == ts_code)
+        return self.returns[index[0]] if len(index) else None
+
+
+class PairwiseStats(NamedTuple):
+    correlation: np.ndarray   # (N,) 与目标序列的相关系数
+    beta: np.ndarray          # (N,) 对目标序列的 beta
+    observations: np.ndarray  # (N,) 成对有效样本数
+
+
+def pairwise_stats(returns: np.ndarray, target: np.ndarray, min_periods: int) -> PairwiseStats:
+    """矩阵每一行与 target 的相关系数和 beta（成对剔除缺失值，全部为向量化运算）"""
+    mask = ~np.isnan(returns) & ~np.isnan(target)[None, :]
+    n = mask.sum(axis=1)
+    x = np.where(mask, returns, 0.0)
+    y = np.where(mask, target[None, :], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = x.sum(axis=1) / n
+        mean_y = y.sum(axis=1) / n
+        cov = (x * y).sum(axis=1) / n - mean_x * mean_y
+        var_x = (x * x).sum(axis=1) / n - mean_x ** 2
+        var_y = (y * y).sum(axis=1) / n - mean_y ** 2
+        correlation = cov / np.sqrt(var_x * var_y)
+        beta = cov / var_y
+    insufficient = n < min_periods
+    correlation[insufficient] = np.nan
+    beta[insufficient] = np.nan
+    return PairwiseStats(correlation, beta, n)
+
+
+def window_bounds(trade_date: str, window: int) -> Tuple[str, str]:
+    """截至 trade_date（含）window 个交易日的起止日期"""
+    trade_date = trade_date.replace('-', '')
+    return trade_calendar.window_start(trade_date, window - 1), trade_date
+
+
+_matrix_cache: "OrderedDict[Tuple[str, int], ReturnsMatrix]" = OrderedDict()
+_matrix_lock = asyncio.Lock()
+# 缓存对应的 (入库代数, 日线存储构建时间)，任一变化时清空缓存
+_matrix_version: Optional[Tuple[int, Optional[str]]] = None
+
+
+async def _data_version() -> Tuple[int, Optional[str]]:
+    store = get_daily_bar_store()
+    return await ttl_policy.get_generation(), store.meta.get("built_at") if store is not None else None
+
+
+async def _load_returns(start_date: str, end_date: str) -> ReturnsMatrix:
+    store = get_daily_bar_store()
+    if store is not None and store.covers(end_date):
+        dates, values = store.matrix(store.codes, ["pct_chg"], start_date, end_date)
+        return ReturnsMatrix(store.codes, dates.astype(np.int64), values["pct_chg"] / 100)
+
+    df = await read_sql(text("""
+        SELECT ts_code, trade_date, pct_chg
+        FROM stock_daily
+        WHERE trade_date BETWEEN :start_date AND :end_date
+    """), {"start_date": start_date, "end_date": end_date})
+    codes, rows = np.unique(df["ts_code"].astype(str).to_numpy(), return_inverse=True)
+    trade_dates = df["trade_date"].map(to_int_date).to_numpy(dtype=np.int64)
+    dates, cols = np.unique(trade_dates, return_inverse=True)
+    returns = np.full((len(codes), len(dates)), np.nan)
+    returns[rows, cols] = pd.to_numeric(df["pct_chg"], errors="coerce").to_numpy(np.float64) / 100
+    return ReturnsMatrix(codes, dates, returns)
+
+
+async def get_returns_matrix(trade_date: str, window: int) -> ReturnsMatrix:
+    """全市场截至 trade_date 的 window 日收益率矩阵
+
+    进程内缓存；推进入库水位（含重新入库）或重建日线存储后缓存失效。
+    """
+    global _matrix_version
+    key = (trade_date.replace('-', ''), window)
+    version = await _data_version()
+    async with _matrix_lock:
+        if version != _matrix_version:
+            _matrix_cache.clear()
+            _matrix_version = version
+        matrix = _matrix_cache.get(key)
+        if matrix is not None:
+            _matrix_cache.move_to_end(key)
+            return matrix
+        start_date, end_date = window_bounds(*key)
+        matrix = await _load_returns(start_date, end_date)
+        logger.info("Loaded returns matrix {} x {} for {} - {}",
+                    len(matrix.codes), len(matrix.dates), start_date, end_date)
+        _matrix_cache[key] = matrix
+        while len(_matrix_cache) > MATRIX_CACHE_SIZE:
+            _matrix_cache.popitem(last=False)
+        return matrix
+
+
+async def get_index_returns(index_code: str, matrix: ReturnsMatrix) -> Optional[np.ndarray]:
+    """指数（或个股）在收益率矩阵日期上的日收益率，缺失为 NaN"""
+    row = matrix.row(index_code)
+    if row is not None:
+        return row
+    if not len(matrix.dates):
+        return None
+    df = await read_sql(text("""
+        SELECT trade_date, pct_chg
+        FROM index_daily
+        WHERE ts_code = :ts_code
+        AND trade_date BETWEEN :start_date AND :end_date
+    """), {"ts_code": index_code, "start_date": str(matrix.dates[0]), "end_date": str(matrix.dates[-1])})
+    if df.empty:
+        return None
+    series = pd.Series(
+        pd.to_numeric(df["pct_chg"], errors="coerce").to_numpy(np.float64) / 100,
+        index=df["trade_date"].map(to_int_date).to_numpy(dtype=np.int64)
+    )
+    return series.reindex(matrix.dates).to_numpy(np.float64)
+
+
+def min_periods(window: int) -> int:
+    return max(int(np.ceil(window * MIN_OBSERVATION_RATIO)), 2)
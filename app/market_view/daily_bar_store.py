@@ -0,0 +1,380 @@
+"""日线列式存储
+
+将 stock_daily（以及 stk_factor_pro 中常用的换手率、量比等字段）按
+“股票 × 交易日”排布为每个字段一个 NumPy 二维数组，落盘为 .npy 文件，
+服务进程以内存映射方式加载。单只股票任意日期区间的数据就是某一行上的
+连续切片，读取时不发生拷贝，也不需要访问数据库。
+
+构建方式：
+    python -m app.market_view.daily_bar_store                     # 全量构建
+    python -m app.market_view.daily_bar_store patch 20240105 ...  # 只更新指定交易日
+"""
+import json
+import shutil
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logger.bind(module=__name__)
+
+# 字段名 -> 构建时使用的列表达式（d: stock_daily, f: stk_factor_pro）
+FIELDS: Dict[str, str] = {
+    "open": "d.open",
+    "high": "d.high",
+    "low": "d.low",
+    "close": "d.close",
+    "pre_close": "d.pre_close",
+    "change": "d.change",
+    "pct_chg": "d.pct_chg",
+    "vol": "d.vol",
+    "amount": "d.amount",
+    "turnover_rate": "f.turnover_rate",
+    "turnover_rate_f": "f.turnover_rate_f",
+    "volume_ratio": "f.volume_ratio",
+    "brar_ar_bfq": "f.brar_ar_bfq",
+    "brar_br_bfq": "f.brar_br_bfq",
+    "psy_bfq": "f.psy_bfq",
+    "psyma_bfq": "f.psyma_bfq",
+}
+
+# 增量更新时每次从原存储复制的行数
+PATCH_COPY_ROWS = 500
+
+
+def _select_sql(condition: str = ""):
+    return text(f"""
+        SELECT d.ts_code, d.trade_date, {", ".join(f"{expr} AS {name}" for name, expr in FIELDS.items())}
+        FROM stock_daily d
+        LEFT JOIN stk_factor_pro f ON d.ts_code = f.ts_code AND d.trade_date = f.trade_date
+        {condition}
+    """)
+
+
+def to_int_date(value: Any) -> int:
+    """将 YYYYMMDD / YYYY-MM-DD 字符串或 date 对象统一转换为整数 YYYYMMDD"""
+    return int(str(value).replace('-', '')[:8])
+
+
+class BarWindow:
+    """单只股票在某个日期区间内的日线视图
+
+    所有字段都是底层内存映射数组的切片视图，不复制数据。停牌或未上市的
+    日期收盘价为 NaN，可通过 valid 掩码过滤。
+    """
+
+    __slots__ = ("ts_code", "dates", "_arrays", "_row", "_lo", "_hi")
+
+    def __init__(self, ts_code: str, dates: np.ndarray, arrays: Dict[str, np.ndarray],
+                 row: int, lo: int, hi: int):
+        self.ts_code = ts_code
+        self.dates = dates[lo:hi]
+        self._arrays = arrays
+        self._row = row
+        self._lo = lo
+        self._hi = hi
+
+    def __len__(self) -> int:
+        return self._hi - self._lo
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self._arrays[field][self._row, self._lo:self._hi]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """有交易数据的日期掩码"""
+        return ~np.isnan(self["close"])
+
+    def to_frame(self, fields: Sequence[str]) -> pd.DataFrame:
+        """转换为 DataFrame（仅包含有交易的日期，trade_date 为 YYYYMMDD 字符串）"""
+        mask = self.valid
+        data = {"trade_date": self.dates[mask].astype(str)}
+        for field in fields:
+            data[field] = self[field][mask]
+        return pd.DataFrame(data)
+
+    def columns(self, fields: Sequence[str]) -> Dict[str, List[Any]]:
+        """按列输出 JSON 兼容的列表，NaN 转换为 None"""
+        mask = self.valid
+        result: Dict[str, List[Any]] = {"trade_date": self.dates[mask].astype(str).tolist()}
+        for field in fields:
+            values = self[field][mask].tolist()
+            result[field] = [None if v != v else v for v in values]
+        return result
+
+    def records(self, fields: Sequence[str], rename: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """按行输出 JSON 兼容的字典列表"""
+        rename = rename or {}
+        columns = self.columns(fields)
+        keys = [rename.get(name, name) for name in columns]
+        return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+
+class DailyBarStore:
+    """基于内存映射的日线列式存储
+
+    目录结构：
+        meta.json     字段列表、构建时间等元信息
+        codes.npy     股票代码（行索引，升序）
+        dates.npy     交易日期 int32 YYYYMMDD（列索引，升序）
+        <field>.npy   float64 二维数组，形状为 (股票数, 交易日数)
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.codes = np.load(self.path / "codes.npy")
+        self.dates = np.load(self.path / "dates.npy")
+        self.arrays: Dict[str, np.ndarray] = {
+            field: np.load(self.path / f"{field}.npy", mmap_mode="r")
+            for field in self.meta["fields"]
+        }
+        self._index = {code: i for i, code in enumerate(self.codes.tolist())}
+        logger.info("Loaded daily bar store: {} stocks x {} dates from {}",
+                    len(self.codes), len(self.dates), self.path)
+
+    @property
+    def first_date(self) -> int:
+        return int(self.dates[0]) if len(self.dates) else 0
+
+    @property
+    def last_date(self) -> int:
+        return int(self.dates[-1]) if len(self.dates) else 0
+
+    def covers(self, end_date: Optional[Any]) -> bool:
+        """判断存储是否已包含截至 end_date 的数据"""
+        return end_date is None or to_int_date(end_date) <= self.last_date
+
+    def has(self, ts_code: str) -> bool:
+        return ts_code in self._index
+
+    def window(self, ts_code: str, start_date: Optional[Any] = None,
+               end_date: Optional[Any] = None) -> Optional[BarWindow]:
+        """获取 [start_date, end_date] 区间的日线视图"""
+        row = self._index.get(ts_code)
+        if row is None:
+            return None
+        lo = 0 if start_date is None else int(np.searchsorted(self.dates, to_int_date(start_date), "left"))
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, to_int_date(end_date), "right"))
+        return BarWindow(ts_code, self.dates, self.arrays, row, lo, max(lo, hi))
+
+    def matrix(self, ts_codes: Sequence[str], fields: Sequence[str], start_date: Optional[Any] = None,
+               end_date: Optional[Any] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """多只股票 [start_date, end_date] 区间的字段矩阵
+
+        返回 (交易日数组, {字段: 二维数组})，行顺序与 ts_codes 一致，
+        不在存储中的股票整行为 NaN。只复制选中的行。
+        """
+        lo = 0 if start_date is None else int(np.searchsorted(self.dates, to_int_date(start_date), "left"))
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, to_int_date(end_date), "right"))
+        hi = max(lo, hi)
+        rows = np.array([self._index.get(code, -1) for code in ts_codes], dtype=np.int64)
+        present = rows >= 0
+        result = {}
+        for field in fields:
+            values = np.full((len(rows), hi - lo), np.nan)
+            values[present] = self.arrays[field][rows[present], lo:hi]
+            result[field] = values
+        return self.dates[lo:hi], result
+
+    def tail(self, ts_code: str, end_date: Optional[Any], n: int) -> Optional[BarWindow]:
+        """获取截至 end_date（含）最近 n 个有交易的日线视图"""
+        row = self._index.get(ts_code)
+        if row is None:
+            return None
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, to_int_date(end_date), "right"))
+        traded = np.flatnonzero(~np.isnan(self.arrays["close"][row, :hi]))
+        lo = int(traded[-n]) if len(traded) >= n else 0
+        return BarWindow(ts_code, self.dates, self.arrays, row, lo, hi)
+
+    @classmethod
+    def build(cls, path: Optional[str] = None, engine=None, chunksize: int = 500_000) -> "DailyBarStore":
+        """从 stock_daily 全量构建存储
+
+        先写入临时目录，完成后整体替换，构建过程中不影响正在读取的进程。
+        """
+        if engine is None:
+            from app.core.database import engine
+        path = Path(path or settings.DAILY_BAR_STORE_PATH)
+        tmp_path = path.with_name(path.name + ".tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+
+        started = datetime.now()
+        with engine.connect() as conn:
+            codes = pd.read_sql(
+                text("SELECT DISTINCT ts_code FROM stock_daily ORDER BY ts_code"), conn
+            )["ts_code"].astype(str).to_numpy()
+            raw_dates = pd.read_sql(text("SELECT DISTINCT trade_date FROM stock_daily"), conn)["trade_date"]
+            dates = np.unique(np.array([to_int_date(d) for d in raw_dates], dtype=np.int32))
+            logger.info("Building daily bar store: {} stocks x {} dates", len(codes), len(dates))
+
+            arrays = {}
+            for field in FIELDS:
+                arr = np.lib.format.open_memmap(
+                    tmp_path / f"{field}.npy", mode="w+", dtype=np.float64,
+                    shape=(len(codes), len(dates))
+                )
+                arr[:] = np.nan
+                arrays[field] = arr
+
+            code_index = pd.Index(codes)
+            stream = conn.execution_options(stream_results=True)
+            rows_loaded = 0
+            for chunk in pd.read_sql(_select_sql(), stream, chunksize=chunksize):
+                rows = code_index.get_indexer(chunk["ts_code"].astype(str))
+                cols = np.searchsorted(dates, chunk["trade_date"].map(to_int_date).to_numpy())
+                for field in FIELDS:
+                    arrays[field][rows, cols] = pd.to_numeric(chunk[field], errors="coerce").to_numpy(np.float64)
+                rows_loaded += len(chunk)
+                logger.debug("Loaded {} rows into daily bar store", rows_loaded)
+
+        logger.info("Daily bar store built with {} rows in {}", rows_loaded, datetime.now() - started)
+        return cls._publish(tmp_path, path, arrays, codes, dates, {"rows": rows_loaded})
+
+    @classmethod
+    def patch(cls, trade_dates: Sequence[Any], path: Optional[str] = None, engine=None) -> "DailyBarStore":
+        """只从数据库重新读取 trade_dates 这些交易日，合并到已有存储
+
+        新出现的股票和交易日插入到行列索引中，其余数据从原存储按块复制，不再全量读取
+        stock_daily。同样写入临时目录后整体替换；存储不存在或字段列表变化时全量构建。
+        """
+        if engine is None:
+            from app.core.database import engine
+        path = Path(path or settings.DAILY_BAR_STORE_PATH)
+        if not (path / "meta.json").exists():
+            return cls.build(path, engine)
+        old = cls(path)
+        if old.meta["fields"] != list(FIELDS):
+            logger.info("Daily bar store fields changed, rebuilding")
+            return cls.build(path, engine)
+
+        started = datetime.now()
+        trade_dates = sorted({str(to_int_date(d)) for d in trade_dates})
+        with engine.connect() as conn:
+            df = pd.read_sql(_select_sql("WHERE d.trade_date = ANY(:dates)"), conn, params={"dates": trade_dates})
+        patch_dates = df["trade_date"].map(to_int_date).to_numpy(np.int32)
+        codes = np.union1d(old.codes, df["ts_code"].astype(str).unique()).astype(str)
+        dates = np.union1d(old.dates, patch_dates).astype(np.int32)
+        logger.info("Patching daily bar store: {} rows for {} dates, {} stocks x {} dates",
+                    len(df), len(trade_dates), len(codes), len(dates))
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+
+        # 原存储的行列在新存储中的位置；重新读取的交易日整列先置空再填入
+        old_rows = pd.Index(codes).get_indexer(old.codes)
+        old_cols = np.searchsorted(dates, old.dates)
+        reset_cols = np.flatnonzero(np.isin(dates, np.array(trade_dates, dtype=np.int32)))
+        rows = pd.Index(codes).get_indexer(df["ts_code"].astype(str))
+        cols = np.searchsorted(dates, patch_dates)
+        arrays = {}
+        for field in FIELDS:
+            arr = np.lib.format.open_memmap(
+                tmp_path / f"{field}.npy", mode="w+", dtype=np.float64,
+                shape=(len(codes), len(dates))
+            )
+            arr[:] = np.nan
+            for lo in range(0, len(old_rows), PATCH_COPY_ROWS):
+                hi = lo + PATCH_COPY_ROWS
+                arr[old_rows[lo:hi, None], old_cols] = old.arrays[field][lo:hi]
+            arr[:, reset_cols] = np.nan
+            arr[rows, cols] = pd.to_numeric(df[field], errors="coerce").to_numpy(np.float64)
+            arrays[field] = arr
+        del old
+
+        logger.info("Daily bar store patched with {} rows in {}", len(df), datetime.now() - started)
+        return cls._publish(tmp_path, path, arrays, codes, dates, {"patched_dates": trade_dates, "rows": len(df)})
+
+    @classmethod
+    def _publish(cls, tmp_path: Path, path: Path, arrays: Dict[str, np.ndarray], codes: np.ndarray,
+                 dates: np.ndarray, meta: Dict[str, Any]) -> "DailyBarStore":
+        """写入索引和 meta.json，并用临时目录整体替换 path"""
+        for arr in arrays.values():
+            arr.flush()
+        arrays.clear()
+        np.save(tmp_path / "codes.npy", codes.astype(str))
+        np.save(tmp_path / "dates.npy", dates)
+        with open(tmp_path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "fields": list(FIELDS),
+                "built_at": datetime.now().isoformat(timespec="seconds"),
+                **meta,
+            }, f, ensure_ascii=False)
+
+        old_path = path.with_name(path.name + ".old")
+        if old_path.exists():
+            shutil.rmtree(old_path)
+        if path.exists():
+            path.rename(old_path)
+        tmp_path.rename(path)
+        if old_path.exists():
+            shutil.rmtree(old_path)
+
+        if path == Path(settings.DAILY_BAR_STORE_PATH):
+            return reload_daily_bar_store()
+        return cls(path)
+
+
+# 进程内共享的存储及其 meta.json 的 (st_ino, st_mtime_ns)，用于发现重建
+_store: Optional[DailyBarStore] = None
+_store_signature: Optional[Tuple[int, int]] = None
+_store_lock = threading.Lock()
+
+
+def get_daily_bar_store() -> Optional[DailyBarStore]:
+    """获取进程内共享的日线存储，未构建时返回 None（调用方回退到数据库查询）
+
+    每次调用检查 meta.json：存储在进程启动后才构建、或被其他进程重建时自动重新加载；
+    未找到存储的结果不缓存。
+    """
+    global _store, _store_signature
+    path = Path(settings.DAILY_BAR_STORE_PATH)
+    try:
+        stat = (path / "meta.json").stat()
+    except FileNotFoundError:
+        if _store_signature != (0, 0):
+            logger.warning("Daily bar store not found at {}, falling back to database", path)
+            _store, _store_signature = None, (0, 0)
+        return None
+
+    signature = (stat.st_ino, stat.st_mtime_ns)
+    if signature == _store_signature:
+        return _store
+    with _store_lock:
+        if signature != _store_signature:
+            try:
+                _store = DailyBarStore(path)
+            except Exception as e:
+                logger.error("Failed to load daily bar store: {}", str(e))
+                _store = None
+            _store_signature = signature
+    return _store
+
+
+def reload_daily_bar_store() -> Optional[DailyBarStore]:
+    """重新加载日线存储（重建完成后调用）"""
+    global _store_signature
+    with _store_lock:
+        _store_signature = None
+    return get_daily_bar_store()
+
+
+if __name__ == "__main__":
+    # 用法：python -m app.market_view.daily_bar_store [patch <trade_date> ...]
+    if len(sys.argv) > 2 and sys.argv[1] == "patch":
+        DailyBarStore.patch(sys.argv[2:])
+    else:
+        DailyBarStore.build()
@@ -0,0 +1,283 @@
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.core.database import fetch_all, get_db
+from app.market_view import indicators
+from app.market_view.daily_bar_store import get_daily_bar_store, to_int_date
+from app.market_view.ingestion_service import copy_frame
+from loguru import logger
+
+logger = logger.bind(module=__name__)
+
+STATE_COLUMNS = indicators.STATE_SCALARS + indicators.STATE_WINDOWS
+
+# 全量重建时每批读取的交易日数
+REBUILD_CHUNK_DAYS = 250
+
+# 状态先 COPY 到事务内的暂存表，再合并到 stock_indicator_state
+STAGE_TABLE = "pg_temp.stg_stock_indicator_state"
+
+CREATE_STAGE_SQL = text(f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} ON COMMIT DROP AS
+    SELECT ts_code, trade_date, {", ".join(STATE_COLUMNS)}
+    FROM stock_indicator_state WITH NO DATA
+""")
+
+MERGE_SQL = text(f"""
+    INSERT INTO stock_indicator_state (ts_code, trade_date, {", ".join(STATE_COLUMNS)}, updated_at)
+    SELECT ts_code, trade_date, {", ".join(STATE_COLUMNS)}, NOW()
+    FROM {STAGE_TABLE}
+    ON CONFLICT (ts_code, trade_date) DO UPDATE SET
+        {", ".join(f"{col} = EXCLUDED.{col}" for col in STATE_COLUMNS)},
+        updated_at = EXCLUDED.updated_at
+""")
+
+# 每只股票在 trade_date 之前的最近一条状态（逐只按主键索引倒序取一行）
+LATEST_STATE_SQL = text(f"""
+    SELECT c.ts_code, {", ".join(f"s.{col}" for col in STATE_COLUMNS)}
+    FROM unnest(CAST(:codes AS varchar[])) AS c(ts_code)
+    CROSS JOIN LATERAL (
+        SELECT {", ".join(STATE_COLUMNS)}
+        FROM stock_indicator_state
+        WHERE ts_code = c.ts_code
+        AND trade_date < :trade_date
+        ORDER BY trade_date DESC
+        LIMIT 1
+    ) s
+""")
+
+# 读路径：在 LATEST_STATE_SQL 基础上附带每只股票在 trade_date 之前最后一个交易日，
+# 两者一致（或从未交易）时状态才是完整的
+STATE_BEFORE_SQL = text(f"""
+    SELECT c.ts_code, s.trade_date as state_date, d.trade_date as daily_date,
+        {", ".join(f"s.{col}" for col in STATE_COLUMNS)}
+    FROM unnest(CAST(:codes AS varchar[])) AS c(ts_code)
+    LEFT JOIN LATERAL (
+        SELECT trade_date, {", ".join(STATE_COLUMNS)}
+        FROM stock_indicator_state
+        WHERE ts_code = c.ts_code
+        AND trade_date < :trade_date
+        ORDER BY trade_date DESC
+        LIMIT 1
+    ) s ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT trade_date
+        FROM stock_daily
+        WHERE ts_code = c.ts_code
+        AND trade_date < :trade_date
+        ORDER BY trade_date DESC
+        LIMIT 1
+    ) d ON TRUE
+""")
+
+
+def _state_from_rows(codes: np.ndarray, rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """将状态行填入 codes 顺序的状态数组（没有状态的股票为初始状态）"""
+    state = indicators.empty_state(len(codes))
+    if not rows:
+        return state
+    index = pd.Index(codes).get_indexer([row["ts_code"] for row in rows])
+    known = index >= 0
+    for col in STATE_COLUMNS:
+        values = np.array([row[col] for row in rows], dtype=np.float64)
+        state[col][index[known]] = values[known]
+    return state
+
+
+async def load_state_before(trade_date: str, codes: np.ndarray,
+                            db: Optional[AsyncSession] = None) -> Optional[Dict[str, np.ndarray]]:
+    """异步读取 codes 在 trade_date 之前的最近状态，供指标读路径从状态推进
+
+    有股票在 trade_date 之前的最后一个交易日尚未写入状态时返回 None，由调用方回退为预热计算。
+    """
+    if not len(codes):
+        return indicators.empty_state(0)
+    rows = await fetch_all(STATE_BEFORE_SQL, {"trade_date": trade_date, "codes": codes.tolist()}, db)
+    if any(row["daily_date"] is not None and row["state_date"] != row["daily_date"] for row in rows):
+        return None
+    return _state_from_rows(codes, [row for row in rows if row["state_date"] is not None])
+
+
+def _array_literal(values: np.ndarray) -> str:
+    """窗口状态写为 PostgreSQL 数组文本（NaN 保留为 NaN）"""
+    return "{" + ",".join(map(repr, values.tolist())) + "}"
+
+
+class IndicatorStateService:
+    """维护 stock_indicator_state 派生表
+
+    新交易日入库后调用 update_trade_date（或 sync）：读取每只股票最近一条状态和当日
+    high/low/close，全部股票一次向量化推进一步，不再从全部历史重新计算 EMA 类指标。
+    表为空时 rebuild 从 stock_daily 首日逐日递推，只写入每只股票的最新状态。
+    指标读路径通过 load_state_before 读取这里的状态继续推进。
+    """
+
+    def __init__(self, db: Session = None):
+        self.db = next(get_db()) if db is None else db
+
+    def _trade_dates(self, start_date: Optional[str], end_date: str) -> List[str]:
+        rows = self.db.execute(text("""
+            SELECT DISTINCT trade_date
+            FROM stock_daily
+            WHERE trade_date BETWEEN :start_date AND :end_date
+            ORDER BY trade_date
+        """), {"start_date": start_date or "0", "end_date": end_date}).fetchall()
+        return [str(row.trade_date) for row in rows]
+
+    def _load_bars(self, codes: np.ndarray, start_date: str,
+                   end_date: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """[start_date, end_date] 区间 codes 的 high/low/close 矩阵"""
+        store = get_daily_bar_store()
+        if store is not None and store.covers(end_date):
+            dates, values = store.matrix(codes, indicators.BAR_FIELDS, start_date, end_date)
+            return dates.astype(np.int64), values
+
+        df = pd.read_sql(text("""
+            SELECT ts_code, trade_date, high, low, close
+            FROM stock_daily
+            WHERE trade_date BETWEEN :start_date AND :end_date
+        """), self.db.connection(), params={"start_date": start_date, "end_date": end_date})
+        dates, cols = np.unique(df["trade_date"].map(to_int_date).to_numpy(dtype=np.int64), return_inverse=True)
+        rows = pd.Index(codes).get_indexer(df["ts_code"].astype(str))
+        known = rows >= 0
+        values = {}
+        for field in indicators.BAR_FIELDS:
+            matrix = np.full((len(codes), len(dates)), np.nan)
+            matrix[rows[known], cols[known]] = pd.to_numeric(df[field], errors="coerce").to_numpy(np.float64)[known]
+            values[field] = matrix
+        return dates, values
+
+    def _iter_bars(self, codes: np.ndarray, dates: List[str]) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        for i in range(0, len(dates), REBUILD_CHUNK_DAYS):
+            chunk = dates[i:i + REBUILD_CHUNK_DAYS]
+            yield self._load_bars(codes, chunk[0], chunk[-1])
+
+    def _load_state(self, trade_date: str, codes: np.ndarray) -> Dict[str, np.ndarray]:
+        """codes 在 trade_date 之前的最近状态（没有状态的股票为初始状态）"""
+        rows = self.db.execute(LATEST_STATE_SQL, {"trade_date": trade_date, "codes": codes.tolist()})
+        return _state_from_rows(codes, [dict(row) for row in rows.mappings()])
+
+    def _daily_codes(self, start_date: str, end_date: str) -> List[str]:
+        rows = self.db.execute(text("""
+            SELECT DISTINCT ts_code FROM stock_daily WHERE trade_date BETWEEN :start_date AND :end_date
+        """), {"start_date": start_date, "end_date": end_date}).fetchall()
+        return [row.ts_code for row in rows]
+
+    def _write(self, codes: np.ndarray, trade_date: str, state: Dict[str, np.ndarray],
+               rows: np.ndarray) -> int:
+        """写入 rows 指定股票在 trade_date 的状态（COPY 到暂存表后一条语句合并）"""
+        if not len(rows):
+            return 0
+        df = pd.DataFrame({"ts_code": codes[rows], "trade_date": trade_date})
+        for col in indicators.STATE_SCALARS:
+            df[col] = state[col][rows]
+        for col in indicators.STATE_WINDOWS:
+            df[col] = [_array_literal(window) for window in state[col][rows]]
+        self.db.execute(CREATE_STAGE_SQL)
+        self.db.execute(text(f"TRUNCATE {STAGE_TABLE}"))
+        copy_frame(self.db, STAGE_TABLE, df)
+        self.db.execute(MERGE_SQL)
+        return len(df)
+
+    def refresh(self, start_date: str, end_date: str) -> int:
+        """从 start_date 之前的状态逐日推进，写入 [start_date, end_date] 每个交易日的状态（可重复执行）"""
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+        dates = self._trade_dates(start_date, end_date)
+        if not dates:
+            return 0
+        logger.info("Refreshing indicator state from {} to {}", dates[0], dates[-1])
+        try:
+            # 区间内停牌的股票状态不变，只需推进有交易的股票
+            codes = np.array(sorted(self._daily_codes(dates[0], dates[-1])), dtype=str)
+            state = self._load_state(dates[0], codes)
+            written = 0
+            for bar_dates, bars in self._iter_bars(codes, dates):
+                for t, trade_date in enumerate(bar_dates.astype(str).tolist()):
+                    close = bars['close'][:, t]
+                    state = indicators.step(state, bars['high'][:, t], bars['low'][:, t], close)
+                    written += self._write(codes, trade_date, state, np.flatnonzero(~np.isnan(close)))
+            self.db.commit()
+            logger.info("Refreshed {} indicator state rows", written)
+            return written
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error refreshing indicator state: {}", str(e))
+            raise
+
+    def update_trade_date(self, trade_date: str) -> int:
+        """推进单个交易日的状态"""
+        return self.refresh(trade_date, trade_date)
+
+    def rebuild(self, end_date: Optional[str] = None) -> int:
+        """从 stock_daily 首日起逐日递推至 end_date，写入每只股票的最新状态"""
+        end_date = (end_date or self.db.execute(text(
+            "SELECT MAX(trade_date) as daily_date FROM stock_daily"
+        )).fetchone().daily_date).replace('-', '')
+        dates = self._trade_dates(None, end_date)
+        if not dates:
+            return 0
+        logger.info("Rebuilding indicator state from {} to {}", dates[0], dates[-1])
+        try:
+            codes = np.array(sorted(self._daily_codes(dates[0], dates[-1])), dtype=str)
+            state = indicators.empty_state(len(codes))
+            last = np.full(len(codes), -1)
+            offset = 0
+            all_dates: List[int] = []
+            for bar_dates, bars in self._iter_bars(codes, dates):
+                state, chunk_last = indicators.advance(state, bars)
+                last = np.where(chunk_last >= 0, chunk_last + offset, last)
+                offset += len(bar_dates)
+                all_dates.extend(bar_dates.tolist())
+
+            # 每只股票的状态记在其最后一个交易日上
+            all_dates = np.array(all_dates)
+            written = 0
+            traded = last >= 0
+            for trade_date in np.unique(all_dates[last[traded]]):
+                rows = np.flatnonzero(traded & (all_dates[np.maximum(last, 0)] == trade_date))
+                written += self._write(codes, str(trade_date), state, rows)
+            self.db.commit()
+            logger.info("Rebuilt {} indicator state rows", written)
+            return written
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error rebuilding indicator state: {}", str(e))
+            raise
+
+    def sync(self) -> int:
+        """补齐 stock_daily 中已入库但尚未推进状态的交易日（状态表为空时全量重建）"""
+        row = self.db.execute(text("""
+            SELECT
+                (SELECT MAX(trade_date) FROM stock_indicator_state) as state_date,
+                (SELECT MAX(trade_date) FROM stock_daily) as daily_date
+        """)).fetchone()
+        if not row.daily_date:
+            return 0
+        if not row.state_date:
+            return self.rebuild(row.daily_date)
+        if row.state_date >= row.daily_date:
+            logger.info("Indicator state already up to date: {}", row.state_date)
+            return 0
+
+        start_date = self.db.execute(text("""
+            SELECT MIN(trade_date) as next_date
+            FROM stock_daily
+            WHERE trade_date > :state_date
+        """), {"state_date": row.state_date}).fetchone().next_date
+        return self.refresh(start_date, row.daily_date)
+
+
+if __name__ == "__main__":
+    # 用法：python -m app.market_view.indicator_state_service [rebuild [end_date] | start_date [end_date]]
+    service = IndicatorStateService()
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        service.rebuild(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif len(sys.argv) > 1:
+        service.refresh(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else sys.argv[1])
+    else:
+        service.sync()
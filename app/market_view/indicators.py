@@ -0,0 +1,545 @@
+"""原生技术指标引擎
+
+直接基于日线数组计算技术指标，参数任意。所有函数都以最后一维为时间轴，
+对 (股票数, 交易日数) 的二维数组一次性计算全部股票。计算口径与
+tushare stk_factor_pro 的不复权（bfq）指标一致：
+
+    MA(N)     收盘价 N 日简单平均
+    EMA(N)    Y = (2X + (N-1)Y') / (N+1)
+    MACD      DIF = EMA(C,S) - EMA(C,L)，DEA = EMA(DIF,M)，MACD = 2(DIF-DEA)
+    KDJ       RSV = (C-LLV(L,N)) / (HHV(H,N)-LLV(L,N)) × 100，K = SMA(RSV,M1,1)，D = SMA(K,M2,1)，J = 3K-2D
+    RSI(N)    SMA(MAX(C-LC,0),N,1) / SMA(ABS(C-LC),N,1) × 100
+    BOLL      MID = MA(C,N)，UPPER/LOWER = MID ± P×STD(C,N)
+    ATR(N)    MA(MAX(H-L, |LC-H|, |LC-L|), N)
+    BIAS(N)   (C-MA(C,N)) / MA(C,N) × 100
+
+停牌日（收盘价为 NaN）不参与计算：每只股票的有效交易日先右对齐压缩，
+计算完成后再还原到原日期上。EMA/SMA 等递推指标以第一个有效值为初值，
+加载数据时在起始日之前额外读取 WARMUP_DAYS 个交易日使其收敛。
+stk_factor_pro 参数的 MACD/KDJ/RSI 优先从 stock_indicator_state 中起始日之前的
+状态逐日推进，不再读取预热数据。
+
+用法：
+    python -m app.market_view.indicators validate 20240105
+"""
+import asyncio
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from loguru import logger
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import read_sql
+from app.core.trade_calendar import trade_calendar
+from app.market_view.daily_bar_store import get_daily_bar_store, to_int_date
+
+logger = logger.bind(module=__name__)
+
+# 递推指标的预热交易日数（在最长窗口之外额外读取）
+WARMUP_DAYS = 250
+
+# 窗口参数上限
+MAX_WINDOW = 250
+
+# BOLL 标准差的自由度（总体标准差，与 stk_factor_pro 一致）
+BOLL_DDOF = 0
+
+# 计算指标所需的日线字段
+BAR_FIELDS = ('high', 'low', 'close')
+
+
+# ---------------------------------------------------------------- 基础运算
+
+
+def _windows(x: np.ndarray, n: int) -> np.ndarray:
+    """最后一维上长度为 n 的滑动窗口视图，前 n-1 个窗口以 NaN 补齐"""
+    pad = np.full(x.shape[:-1] + (n - 1,), np.nan)
+    return sliding_window_view(np.concatenate([pad, x], axis=-1), n, axis=-1)
+
+
+def ref(x: np.ndarray, n: int = 1) -> np.ndarray:
+    """前 n 个交易日的值"""
+    pad = np.full(x.shape[:-1] + (n,), np.nan)
+    return np.concatenate([pad, x[..., :-n]], axis=-1)
+
+
+def ma(x: np.ndarray, n: int) -> np.ndarray:
+    """N 日简单平均（不足 N 日为 NaN）"""
+    return _windows(x, n).mean(axis=-1)
+
+
+def std(x: np.ndarray, n: int, ddof: int = BOLL_DDOF) -> np.ndarray:
+    """N 日标准差（不足 N 日为 NaN），由 E[X²] - E[X]² 计算以复用滑动平均"""
+    mean = ma(x, n)
+    variance = np.maximum(ma(x * x, n) - mean * mean, 0) * (n / max(n - ddof, 1))
+    return np.sqrt(variance)
+
+
+def hhv(x: np.ndarray, n: int) -> np.ndarray:
+    """N 日最高值（不足 N 日时取已有数据）"""
+    return np.fmax.reduce(_windows(x, n), axis=-1)
+
+
+def llv(x: np.ndarray, n: int) -> np.ndarray:
+    """N 日最低值（不足 N 日时取已有数据）"""
+    return np.fmin.reduce(_windows(x, n), axis=-1)
+
+
+def sma_step(prev: np.ndarray, value: np.ndarray, n: float, m: float = 1) -> np.ndarray:
+    """SMA 递推一步：Y = (M×X + (N-M)×Y') / N
+
+    Y' 为 NaN（尚无数据）时取 X 为初值；X 为 NaN 时沿用 Y'。
+    """
+    result = (m * value + (n - m) * prev) / n
+    result = np.where(np.isnan(prev), value, result)
+    return np.where(np.isnan(value), prev, result)
+
+
+def sma(x: np.ndarray, n: float, m: float = 1) -> np.ndarray:
+    """SMA(X, N, M)：按时间递推，每一步对全部股票向量化计算"""
+    out = np.empty(x.shape)
+    prev = np.full(x.shape[:-1], np.nan)
+    for t in range(x.shape[-1]):
+        prev = sma_step(prev, x[..., t], n, m)
+        out[..., t] = prev
+    return out
+
+
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    """EMA(X, N) = SMA(X, N+1, 2)"""
+    return sma(x, n + 1, 2)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+# ---------------------------------------------------------------- 指标
+
+
+def _ma(bars: Dict[str, np.ndarray], n: int) -> Tuple[np.ndarray, ...]:
+    return ma(bars['close'], n),
+
+
+def _ema(bars: Dict[str, np.ndarray], n: int) -> Tuple[np.ndarray, ...]:
+    return ema(bars['close'], n),
+
+
+def _macd(bars: Dict[str, np.ndarray], short: int, long: int, m: int) -> Tuple[np.ndarray, ...]:
+    dif = ema(bars['close'], short) - ema(bars['close'], long)
+    dea = ema(dif, m)
+    return dif, dea, (dif - dea) * 2
+
+
+def _kdj(bars: Dict[str, np.ndarray], n: int, m1: int, m2: int) -> Tuple[np.ndarray, ...]:
+    low = llv(bars['low'], n)
+    rsv = _ratio(bars['close'] - low, hhv(bars['high'], n) - low) * 100
+    k = sma(rsv, m1)
+    d = sma(k, m2)
+    return k, d, 3 * k - 2 * d
+
+
+def _rsi(bars: Dict[str, np.ndarray], n: int) -> Tuple[np.ndarray, ...]:
+    diff = bars['close'] - ref(bars['close'])
+    return _ratio(sma(np.maximum(diff, 0), n), sma(np.abs(diff), n)) * 100,
+
+
+def _boll(bars: Dict[str, np.ndarray], n: int, p: float) -> Tuple[np.ndarray, ...]:
+    mid = ma(bars['close'], n)
+    width = std(bars['close'], n) * p
+    return mid + width, mid, mid - width
+
+
+def _atr(bars: Dict[str, np.ndarray], n: int) -> Tuple[np.ndarray, ...]:
+    pre_close = ref(bars['close'])
+    tr = np.fmax(bars['high'] - bars['low'],
+                 np.fmax(np.abs(pre_close - bars['high']), np.abs(pre_close - bars['low'])))
+    return ma(tr, n),
+
+
+def _bias(bars: Dict[str, np.ndarray], n: int) -> Tuple[np.ndarray, ...]:
+    average = ma(bars['close'], n)
+    return _ratio(bars['close'] - average, average) * 100,
+
+
+class IndicatorDef(NamedTuple):
+    func: Callable[..., Tuple[np.ndarray, ...]]
+    defaults: Tuple[float, ...]   # 默认参数
+    outputs: Tuple[str, ...]      # 输出名前缀
+    windows: Tuple[int, ...]      # 参数中属于窗口长度的下标
+    recursive: bool               # 是否为 EMA/SMA 递推指标（需要预热）
+
+
+# 指标名 -> 定义
+INDICATORS: Dict[str, IndicatorDef] = {
+    'ma': IndicatorDef(_ma, (5,), ('ma',), (0,), False),
+    'ema': IndicatorDef(_ema, (12,), ('ema',), (0,), True),
+    'macd': IndicatorDef(_macd, (12, 26, 9), ('macd_dif', 'macd_dea', 'macd'), (0, 1, 2), True),
+    'kdj': IndicatorDef(_kdj, (9, 3, 3), ('kdj_k', 'kdj_d', 'kdj_j'), (0, 1, 2), True),
+    'rsi': IndicatorDef(_rsi, (6,), ('rsi',), (0,), True),
+    'boll': IndicatorDef(_boll, (20, 2), ('boll_upper', 'boll_mid', 'boll_lower'), (0,), False),
+    'atr': IndicatorDef(_atr, (20,), ('atr',), (0,), False),
+    'bias': IndicatorDef(_bias, (6,), ('bias',), (0,), False),
+}
+
+
+def _format_param(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+class IndicatorSpec(NamedTuple):
+    name: str
+    params: Tuple[float, ...]
+
+    @classmethod
+    def parse(cls, spec: str) -> "IndicatorSpec":
+        """解析 "macd:12,26,9" 形式的指标参数，省略的参数取默认值"""
+        name, _, args = spec.strip().lower().partition(':')
+        definition = INDICATORS.get(name)
+        if definition is None:
+            raise ValueError(f"不支持的指标: {name}，可选 {', '.join(INDICATORS)}")
+        try:
+            values = [float(arg) for arg in args.split(',') if arg.strip()]
+        except ValueError:
+            raise ValueError(f"指标参数格式错误: {spec}")
+        if len(values) > len(definition.defaults):
+            raise ValueError(f"指标 {name} 最多 {len(definition.defaults)} 个参数")
+        params = tuple(values) + definition.defaults[len(values):]
+        for i in definition.windows:
+            if not float(params[i]).is_integer() or not 1 <= params[i] <= MAX_WINDOW:
+                raise ValueError(f"指标 {name} 的窗口参数须为 1-{MAX_WINDOW} 的整数")
+        if any(p <= 0 for p in params):
+            raise ValueError(f"指标 {name} 的参数须为正数")
+        params = tuple(int(p) if i in definition.windows else p for i, p in enumerate(params))
+        return cls(name, params)
+
+    @property
+    def keys(self) -> List[str]:
+        """输出列名，如 macd_dif_12_26_9"""
+        suffix = '_'.join(_format_param(p) for p in self.params)
+        return [f"{output}_{suffix}" for output in INDICATORS[self.name].outputs]
+
+    @property
+    def lookback(self) -> int:
+        """计算所需的历史交易日数"""
+        return max(int(self.params[i]) for i in INDICATORS[self.name].windows)
+
+
+def parse_specs(specs: Sequence[str]) -> List[IndicatorSpec]:
+    parsed = list(dict.fromkeys(IndicatorSpec.parse(spec) for spec in specs))
+    if not parsed:
+        raise ValueError("请指定至少一个指标")
+    return parsed
+
+
+def lookback_days(specs: Sequence[IndicatorSpec]) -> int:
+    """计算所需的历史交易日数：最长窗口，含递推指标时再加 WARMUP_DAYS"""
+    if not specs:
+        return 0
+    warmup = WARMUP_DAYS if any(INDICATORS[spec.name].recursive for spec in specs) else 0
+    return max(spec.lookback for spec in specs) + warmup
+
+
+# stk_factor_pro 中的指标 -> 原生指标引擎的输出列
+STK_FACTOR_SPECS = ['ma:5', 'ma:10', 'ma:20', 'ma:60', 'macd:12,26,9', 'kdj:9,3,3', 'boll:20,2',
+                    'rsi:6', 'rsi:12', 'rsi:24', 'atr:20', 'bias:6', 'bias:12', 'bias:24']
+STK_FACTOR_COLUMNS = {
+    'ma_bfq_5': 'ma_5',
+    'ma_bfq_10': 'ma_10',
+    'ma_bfq_20': 'ma_20',
+    'ma_bfq_60': 'ma_60',
+    'macd_dif_bfq': 'macd_dif_12_26_9',
+    'macd_dea_bfq': 'macd_dea_12_26_9',
+    'macd_bfq': 'macd_12_26_9',
+    'kdj_k_bfq': 'kdj_k_9_3_3',
+    'kdj_d_bfq': 'kdj_d_9_3_3',
+    'kdj_bfq': 'kdj_j_9_3_3',
+    'boll_upper_bfq': 'boll_upper_20_2',
+    'boll_mid_bfq': 'boll_mid_20_2',
+    'boll_lower_bfq': 'boll_lower_20_2',
+    'rsi_bfq_6': 'rsi_6',
+    'rsi_bfq_12': 'rsi_12',
+    'rsi_bfq_24': 'rsi_24',
+    'atr_bfq': 'atr_20',
+    'bias1_bfq': 'bias_6',
+    'bias2_bfq': 'bias_12',
+    'bias3_bfq': 'bias_24',
+}
+
+
+# ---------------------------------------------------------------- 计算
+
+
+class TradedLayout:
+    """停牌日压缩：每行的有效交易日保持顺序右对齐排列，计算后按原位置还原"""
+
+    def __init__(self, valid: np.ndarray):
+        self.valid = valid
+        self.dense = bool(valid.all())
+        if not self.dense:
+            # 稳定排序使无效日期（False）排在前面，有效日期保持原顺序
+            self.order = np.argsort(valid, axis=1, kind='stable')
+            self.inverse = np.argsort(self.order, axis=1)
+
+    def pack(self, values: np.ndarray) -> np.ndarray:
+        if self.dense:
+            return values
+        return np.take_along_axis(np.where(self.valid, values, np.nan), self.order, axis=1)
+
+    def unpack(self, packed: np.ndarray) -> np.ndarray:
+        if self.dense:
+            return packed
+        return np.where(self.valid, np.take_along_axis(packed, self.inverse, axis=1), np.nan)
+
+
+def compute(bars: Dict[str, np.ndarray], specs: Sequence[IndicatorSpec]) -> Dict[str, np.ndarray]:
+    """对 (股票数, 交易日数) 的 high/low/close 数组计算指标，返回 {输出列: 二维数组}"""
+    layout = TradedLayout(~np.isnan(bars['close']))
+    packed = {field: layout.pack(bars[field]) for field in BAR_FIELDS}
+    result: Dict[str, np.ndarray] = {}
+    for spec in specs:
+        outputs = INDICATORS[spec.name].func(packed, *spec.params)
+        for key, values in zip(spec.keys, outputs):
+            result[key] = layout.unpack(values)
+    return result
+
+
+# ---------------------------------------------------------------- 递推状态
+
+# 递推状态固定使用 stk_factor_pro 的参数
+MACD_PARAMS = (12, 26, 9)
+KDJ_PARAMS = (9, 3, 3)
+RSI_PERIODS = (6, 12, 24)
+
+# 逐只股票保存的标量状态：上一交易日收盘价、两条 EMA、DEA、K/D、各周期 RSI 的平滑涨幅/振幅
+STATE_SCALARS = ['close', 'ema_short', 'ema_long', 'macd_dea', 'kdj_k', 'kdj_d'] + [
+    f'rsi_{kind}_{n}' for n in RSI_PERIODS for kind in ('up', 'abs')
+]
+# 窗口状态：含当日在内最近 KDJ_PARAMS[0] 个交易日的最高价/最低价
+STATE_WINDOWS = ['high_window', 'low_window']
+
+STATE_SPECS = ['macd:%d,%d,%d' % MACD_PARAMS, 'kdj:%d,%d,%d' % KDJ_PARAMS] + [f'rsi:{n}' for n in RSI_PERIODS]
+
+
+def empty_state(size: int) -> Dict[str, np.ndarray]:
+    """尚无任何交易日的初始状态"""
+    state = {field: np.full(size, np.nan) for field in STATE_SCALARS}
+    state.update({field: np.full((size, KDJ_PARAMS[0]), np.nan) for field in STATE_WINDOWS})
+    return state
+
+
+def step(state: Dict[str, np.ndarray], high: np.ndarray, low: np.ndarray,
+         close: np.ndarray) -> Dict[str, np.ndarray]:
+    """全部股票前进一个交易日（每只股票 O(1)），当日停牌（close 为 NaN）的股票状态不变
+
+    每一步的运算与 compute 中的整列递推完全相同，从上市首日逐日推进的结果与全量计算一致。
+    """
+    short, long, m = MACD_PARAMS
+    _, m1, m2 = KDJ_PARAMS
+    traded = ~np.isnan(close)
+
+    high_window = np.concatenate([state['high_window'][:, 1:], high[:, None]], axis=1)
+    low_window = np.concatenate([state['low_window'][:, 1:], low[:, None]], axis=1)
+    lowest = np.fmin.reduce(low_window, axis=1)
+    rsv = _ratio(close - lowest, np.fmax.reduce(high_window, axis=1) - lowest) * 100
+
+    ema_short = sma_step(state['ema_short'], close, short + 1, 2)
+    ema_long = sma_step(state['ema_long'], close, long + 1, 2)
+    kdj_k = sma_step(state['kdj_k'], rsv, m1)
+    new = {
+        'close': close,
+        'ema_short': ema_short,
+        'ema_long': ema_long,
+        'macd_dea': sma_step(state['macd_dea'], ema_short - ema_long, m + 1, 2),
+        'kdj_k': kdj_k,
+        'kdj_d': sma_step(state['kdj_d'], kdj_k, m2),
+        'high_window': high_window,
+        'low_window': low_window
+    }
+    diff = close - state['close']
+    for n in RSI_PERIODS:
+        new[f'rsi_up_{n}'] = sma_step(state[f'rsi_up_{n}'], np.maximum(diff, 0), n)
+        new[f'rsi_abs_{n}'] = sma_step(state[f'rsi_abs_{n}'], np.abs(diff), n)
+
+    return {
+        field: np.where(traded if values.ndim == 1 else traded[:, None], values, state[field])
+        for field, values in new.items()
+    }
+
+
+def advance(state: Dict[str, np.ndarray], bars: Dict[str, np.ndarray]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """按 (股票数, 交易日数) 的日线逐日推进状态
+
+    返回 (新状态, 每只股票在 bars 中最后一个交易日的列下标，无交易为 -1)。
+    """
+    last = np.full(len(bars['close']), -1)
+    for t in range(bars['close'].shape[1]):
+        close = bars['close'][:, t]
+        state = step(state, bars['high'][:, t], bars['low'][:, t], close)
+        last[~np.isnan(close)] = t
+    return state, last
+
+
+def state_outputs(state: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """由状态计算 MACD/KDJ/RSI 输出（列名与 compute 的输出一致）"""
+    macd_key, kdj_key, *rsi_keys = [IndicatorSpec.parse(spec).keys for spec in STATE_SPECS]
+    dif = state['ema_short'] - state['ema_long']
+    result = dict(zip(macd_key, (dif, state['macd_dea'], (dif - state['macd_dea']) * 2)))
+    result.update(zip(kdj_key, (state['kdj_k'], state['kdj_d'], 3 * state['kdj_k'] - 2 * state['kdj_d'])))
+    for n, (key,) in zip(RSI_PERIODS, rsi_keys):
+        result[key] = _ratio(state[f'rsi_up_{n}'], state[f'rsi_abs_{n}']) * 100
+    return result
+
+
+def compute_from_state(state: Dict[str, np.ndarray], bars: Dict[str, np.ndarray], start: int,
+                       specs: Sequence[IndicatorSpec]) -> Dict[str, np.ndarray]:
+    """由 bars 第 start 列之前的状态逐日推进，计算 specs 中 STATE_SPECS 以内的指标
+
+    其余指标按 bars 整列计算；返回与 compute 相同形状的数组，start 之前的列为 NaN。
+    """
+    state_specs = set(parse_specs(STATE_SPECS))
+    result = compute(bars, [spec for spec in specs if spec not in state_specs])
+    keys = [key for spec in specs if spec in state_specs for key in spec.keys]
+    result.update({key: np.full(bars['close'].shape, np.nan) for key in keys})
+    for t in range(start, bars['close'].shape[1]):
+        close = bars['close'][:, t]
+        state = step(state, bars['high'][:, t], bars['low'][:, t], close)
+        outputs = state_outputs(state)
+        traded = ~np.isnan(close)
+        for key in keys:
+            result[key][traded, t] = outputs[key][traded]
+    return result
+
+
+# ---------------------------------------------------------------- 数据加载
+
+
+async def load_bars(ts_codes: Optional[Sequence[str]], start_date: str, end_date: str,
+                    db: Optional[AsyncSession] = None) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """读取 [start_date, end_date] 的 high/low/close 矩阵
+
+    返回 (股票代码, 交易日 YYYYMMDD 整数, {字段: 二维数组})。ts_codes 为空时读取全市场；
+    指定 ts_codes 时行顺序与其一致，没有数据的股票整行为 NaN。
+    """
+    store = get_daily_bar_store()
+    if store is not None and store.covers(end_date):
+        codes = store.codes if ts_codes is None else np.asarray(ts_codes, dtype=str)
+        dates, values = store.matrix(codes, BAR_FIELDS, start_date, end_date)
+        return codes, dates.astype(np.int64), values
+
+    condition = "" if ts_codes is None else "AND ts_code = ANY(:codes)"
+    df = await read_sql(text(f"""
+        SELECT ts_code, trade_date, high, low, close
+        FROM stock_daily
+        WHERE trade_date BETWEEN :start_date AND :end_date
+        {condition}
+    """), {"start_date": start_date, "end_date": end_date, "codes": list(ts_codes or [])}, db)
+
+    trade_dates = df["trade_date"].map(to_int_date).to_numpy(dtype=np.int64)
+    dates, cols = np.unique(trade_dates, return_inverse=True)
+    if ts_codes is None:
+        codes, rows = np.unique(df["ts_code"].astype(str).to_numpy(), return_inverse=True)
+    else:
+        codes = np.asarray(ts_codes, dtype=str)
+        rows = pd.Index(codes).get_indexer(df["ts_code"].astype(str))
+    values = {}
+    for field in BAR_FIELDS:
+        matrix = np.full((len(codes), len(dates)), np.nan)
+        matrix[rows, cols] = pd.to_numeric(df[field], errors="coerce").to_numpy(np.float64)
+        values[field] = matrix
+    return codes, dates, values
+
+
+async def compute_indicators(ts_codes: Optional[Sequence[str]], specs: Sequence[IndicatorSpec],
+                             start_date: str, end_date: str,
+                             db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+    """计算 [start_date, end_date] 区间的指标
+
+    含 STATE_SPECS 中的指标时，先从 stock_indicator_state 读取 start_date 之前的状态逐日推进，
+    其余指标只读取窗口所需的历史；状态表未推进到 start_date 之前时回退为预热计算：
+    在 start_date 之前按交易日历多读取预热数据，结果只保留区间内的交易日。
+    返回 {"codes", "dates", "values": {输出列: (股票数, 交易日数) 数组}}。
+    """
+    start_date = start_date.replace('-', '')
+    end_date = end_date.replace('-', '')
+    state_specs = set(parse_specs(STATE_SPECS))
+    values = None
+    if any(spec in state_specs for spec in specs):
+        from app.market_view.indicator_state_service import load_state_before
+
+        others = [spec for spec in specs if spec not in state_specs]
+        load_start = trade_calendar.window_start(start_date, lookback_days(others))
+        codes, dates, bars = await load_bars(ts_codes, load_start, end_date, db)
+        state = await load_state_before(start_date, codes, db)
+        if state is not None:
+            start = int(np.searchsorted(dates, int(start_date)))
+            values = await run_in_threadpool(compute_from_state, state, bars, start, specs)
+        else:
+            logger.info("Indicator state not available before {}, computing with warmup", start_date)
+
+    if values is None:
+        load_start = trade_calendar.window_start(start_date, lookback_days(specs))
+        codes, dates, bars = await load_bars(ts_codes, load_start, end_date, db)
+        # 整块矩阵运算放到线程池，不阻塞事件循环
+        values = await run_in_threadpool(compute, bars, specs)
+    keep = dates >= int(start_date)
+    return {
+        "codes": codes,
+        "dates": dates[keep],
+        "values": {key: matrix[:, keep] for key, matrix in values.items()}
+    }
+
+
+async def validate_against_stk_factor(trade_date: str, ts_codes: Optional[Sequence[str]] = None,
+                                      tolerance: float = 0.01,
+                                      db: Optional[AsyncSession] = None) -> Dict[str, Dict[str, Any]]:
+    """将原生指标与 stk_factor_pro 当日数据逐列比对
+
+    |原生 - stk_factor_pro| <= tolerance × max(1, |stk_factor_pro|) 视为一致。
+    返回 {stk_factor_pro 列: {count, matched, match_ratio, max_abs_diff, mean_abs_diff}}。
+    """
+    trade_date = trade_date.replace('-', '')
+    condition = "" if ts_codes is None else "AND ts_code = ANY(:codes)"
+    reference = await read_sql(text(f"""
+        SELECT ts_code, {", ".join(STK_FACTOR_COLUMNS)}
+        FROM stk_factor_pro
+        WHERE trade_date = :trade_date
+        {condition}
+    """), {"trade_date": trade_date, "codes": list(ts_codes or [])}, db)
+    if reference.empty:
+        return {}
+
+    codes = reference["ts_code"].astype(str).tolist()
+    native = await compute_indicators(codes, parse_specs(STK_FACTOR_SPECS), trade_date, trade_date, db)
+    if not len(native["dates"]) or native["dates"][-1] != int(trade_date):
+        return {}
+
+    report = {}
+    for column, key in STK_FACTOR_COLUMNS.items():
+        expected = pd.to_numeric(reference[column], errors="coerce").to_numpy(np.float64)
+        actual = native["values"][key][:, -1]
+        both = ~np.isnan(expected) & ~np.isnan(actual)
+        diff = np.abs(actual[both] - expected[both])
+        matched = int((diff <= tolerance * np.maximum(1, np.abs(expected[both]))).sum())
+        report[column] = {
+            "count": int(both.sum()),
+            "matched": matched,
+            "match_ratio": matched / both.sum() if both.any() else None,
+            "max_abs_diff": float(diff.max()) if len(diff) else None,
+            "mean_abs_diff": float(diff.mean()) if len(diff) else None
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # 用法：python -m app.market_view.indicators validate <trade_date> [ts_code ...]
+    if len(sys.argv) < 3 or sys.argv[1] != "validate":
+        print("usage: python -m app.market_view.indicators validate <trade_date> [ts_code ...]")
+        sys.exit(1)
+    result = asyncio.run(validate_against_stk_factor(sys.argv[2], sys.argv[3:] or None))
+    for column, stats in result.items():
+        logger.info("{}: {}", column, stats)
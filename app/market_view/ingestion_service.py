@@ -0,0 +1,360 @@
+"""日终数据批量入库
+
+每张表的数据（DataFrame，或 CSV / Parquet 文件）先用 COPY 写入与目标表同列的
+临时暂存表，再用一条 INSERT ... SELECT ... ON CONFLICT 合并到目标表：
+
+- 以 (ts_code, trade_date) 等业务键去重，重复执行同一交易日只会更新发生变化的行；
+- 龙虎榜、涨停等“当日全集”类表，合并后删除同一交易日中本批次已不存在的行；
+- 一次调用的全部表在同一个事务中完成，失败时整体回滚。
+
+入库完成后按入库的日期区间刷新派生表（成交量统计、市场宽度、指标状态），
+只更新日线列式存储中入库的交易日，并推进缓存入库水位（清除相应交易日的缓存）。
+
+用法：
+    python -m app.market_view.ingestion_service 20240105          # 读取 INGESTION_DATA_DIR/20240105/<表名>.csv|.parquet
+    python -m app.market_view.ingestion_service path/to/stock_daily.csv path/to/dir ...
+"""
+import asyncio
+import io
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.partitions import PARTITIONED_TABLES, ensure_partitions, is_partitioned
+from loguru import logger
+
+logger = logger.bind(module=__name__)
+
+Source = Union[pd.DataFrame, str, Path]
+
+
+class IngestTable(NamedTuple):
+    keys: Tuple[str, ...]   # 业务键，目标表上需有对应的唯一索引
+    replace: bool = False   # 批次为当日全集：删除同一交易日中不在批次内的行
+
+
+TABLES: Dict[str, IngestTable] = {
+    "stock_daily": IngestTable(("ts_code", "trade_date")),
+    "stk_factor_pro": IngestTable(("ts_code", "trade_date")),
+    "moneyflow_dc": IngestTable(("ts_code", "trade_date")),
+    "moneyflow": IngestTable(("ts_code", "trade_date")),
+    "index_daily": IngestTable(("ts_code", "trade_date")),
+    "limit_list": IngestTable(("trade_date", "ts_code"), replace=True),
+    "kpl_list": IngestTable(("trade_date", "ts_code"), replace=True),
+    "top_list": IngestTable(("trade_date", "ts_code", "reason"), replace=True),
+    "top_inst": IngestTable(("trade_date", "ts_code", "exalter", "side", "reason"), replace=True),
+    "trade_cal": IngestTable(("exchange", "cal_date")),
+}
+
+# 统一转换为 YYYYMMDD 的日期列
+DATE_COLUMNS = ("trade_date", "cal_date", "pretrade_date")
+
+INTEGER_TYPES = {"smallint", "integer", "bigint"}
+
+# 支持的文件格式
+FILE_SUFFIXES = (".parquet", ".csv", ".csv.gz")
+
+TABLE_COLUMNS_SQL = text("""
+    SELECT column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+    AND table_name = :table
+    ORDER BY ordinal_position
+""")
+
+# 是否已有恰好覆盖 keys 的唯一索引（或主键）
+UNIQUE_INDEX_SQL = text("""
+    SELECT 1
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indrelid
+    WHERE c.relname = :table
+    AND c.relnamespace = current_schema()::regnamespace
+    AND i.indisunique
+    AND i.indpred IS NULL
+    AND (
+        SELECT array_agg(a.attname::text ORDER BY a.attname::text)
+        FROM pg_attribute a
+        WHERE a.attrelid = c.oid AND a.attnum = ANY(i.indkey)
+    ) = CAST(:keys AS text[])
+    AND array_length(i.indkey, 1) = :key_count
+""")
+
+
+def _quote(name: str) -> str:
+    return f'"{name}"'
+
+
+def _column_list(columns: List[str], alias: Optional[str] = None) -> str:
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + _quote(col) for col in columns)
+
+
+def _date_text(series: pd.Series) -> pd.Series:
+    """日期列统一为 YYYYMMDD 字符串（缺失值保持为空）"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y%m%d')
+    result = series.astype(str).str.replace('-', '', regex=False).str[:8]
+    return result.where(series.notna())
+
+
+def copy_frame(db: Session, table: str, df: pd.DataFrame) -> None:
+    """用 COPY 将 df 写入 table（列名与 df 一致，NaN / None 写入为 NULL）"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({_column_list(list(df.columns))}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def read_source(source: Source) -> pd.DataFrame:
+    """读取 DataFrame 或 CSV / Parquet 文件（CSV 全部按字符串读取，由数据库解析类型）"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    path = Path(source)
+    if path.name.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.name.endswith((".csv", ".csv.gz")):
+        return pd.read_csv(path, dtype=str)
+    raise ValueError(f"Unsupported file format: {path}")
+
+
+def find_sources(path: Union[str, Path]) -> Dict[str, Path]:
+    """文件名（不含扩展名）为表名的文件；path 为目录时查找目录下的全部此类文件"""
+    path = Path(path)
+    files = sorted(path.iterdir()) if path.is_dir() else [path]
+    sources = {}
+    for file in files:
+        for suffix in FILE_SUFFIXES:
+            if file.name.endswith(suffix) and file.name[:-len(suffix)] in TABLES:
+                sources[file.name[:-len(suffix)]] = file
+    return sources
+
+
+class IngestionService:
+    """日终数据批量入库（COPY 暂存表 + ON CONFLICT 合并）"""
+
+    def __init__(self, db: Session = None):
+        self.db = next(get_db()) if db is None else db
+        self._columns: Dict[str, Dict[str, str]] = {}
+        self._indexed: Set[str] = set()
+        self._partitioned: Dict[str, bool] = {}
+
+    def _table_columns(self, table: str) -> Dict[str, str]:
+        """目标表的 {列名: 数据类型}"""
+        if table not in self._columns:
+            rows = self.db.execute(TABLE_COLUMNS_SQL, {"table": table}).fetchall()
+            if not rows:
+                raise ValueError(f"Table not found: {table}")
+            self._columns[table] = {row.column_name: row.data_type for row in rows}
+        return self._columns[table]
+
+    def _ensure_unique_index(self, table: str, keys: Tuple[str, ...]) -> None:
+        """ON CONFLICT 需要业务键上的唯一索引，缺少时创建（已有重复数据时创建失败）"""
+        if table in self._indexed:
+            return
+        exists = self.db.execute(UNIQUE_INDEX_SQL, {
+            "table": table, "keys": sorted(keys), "key_count": len(keys)
+        }).fetchone()
+        if not exists:
+            name = f"uq_{table}_{'_'.join(keys)}"
+            logger.warning("Creating unique index {} for upserts", name)
+            self.db.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({_column_list(list(keys))})"))
+        self._indexed.add(table)
+
+    def _ensure_partitions(self, table: str, df: pd.DataFrame) -> None:
+        """分区表写入前创建批次涉及年份的分区"""
+        if table not in PARTITIONED_TABLES:
+            return
+        if table not in self._partitioned:
+            self._partitioned[table] = is_partitioned(self.db, table)
+        if self._partitioned[table]:
+            ensure_partitions(self.db, table, df["trade_date"].str[:4].astype(int).unique().tolist())
+
+    def _prepare(self, table: str, df: pd.DataFrame) -> pd.DataFrame:
+        """按目标表列对齐、规范日期和整数列、去掉缺少业务键的行并按业务键去重（保留最后一条）"""
+        spec = TABLES[table]
+        target = self._table_columns(table)
+        df = df.rename(columns=str.lower)
+        missing = [key for key in spec.keys if key not in df.columns]
+        if missing:
+            raise ValueError(f"{table}: missing key columns {', '.join(missing)}")
+        ignored = [col for col in df.columns if col not in target]
+        if ignored:
+            logger.debug("{}: ignoring columns not in table: {}", table, ", ".join(ignored))
+        df = df[[col for col in target if col in df.columns]].copy()
+
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = _date_text(df[col])
+        for col in df.columns:
+            if target[col] in INTEGER_TYPES and not pd.api.types.is_integer_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+
+        invalid = df[list(spec.keys)].isna().any(axis=1)
+        if invalid.any():
+            logger.warning("{}: dropping {} rows with empty keys", table, int(invalid.sum()))
+            df = df[~invalid]
+        return df.drop_duplicates(list(spec.keys), keep="last")
+
+    def _copy(self, stage: str, df: pd.DataFrame) -> None:
+        copy_frame(self.db, stage, df)
+
+    def _merge(self, table: str, stage: str, columns: List[str]) -> Tuple[int, int]:
+        """暂存表合并到目标表，返回 (写入行数, 删除行数)"""
+        spec = TABLES[table]
+        values = [col for col in columns if col not in spec.keys]
+        if values:
+            # 值未变化的行不更新，重复执行同一批数据不产生写入
+            conflict = f"""DO UPDATE SET {", ".join(f"{_quote(c)} = EXCLUDED.{_quote(c)}" for c in values)}
+            WHERE ({_column_list(values, table)}) IS DISTINCT FROM ({_column_list(values, "EXCLUDED")})"""
+        else:
+            conflict = "DO NOTHING"
+        written = self.db.execute(text(f"""
+            INSERT INTO {table} ({_column_list(columns)})
+            SELECT {_column_list(columns)} FROM {stage}
+            ON CONFLICT ({_column_list(list(spec.keys))}) {conflict}
+        """)).rowcount
+
+        deleted = 0
+        if spec.replace and "trade_date" in spec.keys:
+            deleted = self.db.execute(text(f"""
+                DELETE FROM {table} t
+                WHERE t.trade_date IN (SELECT DISTINCT trade_date FROM {stage})
+                AND NOT EXISTS (
+                    SELECT 1 FROM {stage} s
+                    WHERE {" AND ".join(f"s.{_quote(k)} = t.{_quote(k)}" for k in spec.keys)}
+                )
+            """)).rowcount
+        return written, deleted
+
+    def _load_table(self, table: str, source: Source) -> List[str]:
+        """入库一张表（在当前事务内），返回涉及的交易日"""
+        if table not in TABLES:
+            raise ValueError(f"Unsupported table: {table}. Must be one of: {', '.join(TABLES)}")
+        df = self._prepare(table, read_source(source))
+        if df.empty:
+            logger.info("{}: nothing to load", table)
+            return []
+
+        columns = list(df.columns)
+        # 限定在 pg_temp 中，不会误删 search_path 上同名的普通表
+        stage = f"pg_temp.stg_{table}"
+        self._ensure_unique_index(table, TABLES[table].keys)
+        self._ensure_partitions(table, df)
+        self.db.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+        self.db.execute(text(f"""
+            CREATE TEMP TABLE {stage} ON COMMIT DROP AS
+            SELECT {_column_list(columns)} FROM {table} WITH NO DATA
+        """))
+        self._copy(stage, df)
+        written, deleted = self._merge(table, stage, columns)
+        logger.info("{}: {} rows staged, {} written, {} deleted", table, len(df), written, deleted)
+        return sorted(df["trade_date"].unique().tolist()) if "trade_date" in df.columns else []
+
+    def load(self, sources: Dict[str, Source], derive: bool = True) -> Dict[str, List[str]]:
+        """在一个事务中入库多张表 {表名: DataFrame 或文件路径}，返回 {表名: 交易日列表}
+
+        同步接口（命令行、离线任务使用）：derive 时用 asyncio.run 推进入库水位，
+        不能在运行中的事件循环内调用，请求处理路径中使用 load_async。
+        """
+        started = pd.Timestamp.now()
+        try:
+            loaded = {table: self._load_table(table, source) for table, source in sources.items()}
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error ingesting {}: {}", ", ".join(sources), str(e))
+            raise
+        logger.info("Ingested {} tables in {}", len(loaded), pd.Timestamp.now() - started)
+        if derive:
+            self.after_load(loaded)
+        return loaded
+
+    def load_paths(self, paths: List[Union[str, Path]], derive: bool = True) -> Dict[str, List[str]]:
+        """入库文件或目录（文件名为表名）"""
+        sources: Dict[str, Source] = {}
+        for path in paths:
+            sources.update(find_sources(path))
+        if not sources:
+            raise ValueError(f"No table files found in: {', '.join(map(str, paths))}")
+        return self.load(sources, derive)
+
+    def load_trade_date(self, trade_date: str, derive: bool = True) -> Dict[str, List[str]]:
+        """入库 INGESTION_DATA_DIR/<trade_date>/ 下的全部表文件"""
+        return self.load_paths([Path(settings.INGESTION_DATA_DIR) / trade_date.replace('-', '')], derive)
+
+    async def load_async(self, sources: Dict[str, Source], derive: bool = True) -> Dict[str, List[str]]:
+        """load 的异步版本：入库和派生数据刷新在线程池中执行，推进水位时不关闭共享的 Redis 连接池"""
+        loaded = await run_in_threadpool(self.load, sources, False)
+        if derive:
+            await run_in_threadpool(self.refresh_derived, loaded)
+            await self._advance_watermark(_loaded_dates(loaded), close_cache=False)
+        return loaded
+
+    def after_load(self, loaded: Dict[str, List[str]]) -> None:
+        """刷新派生数据，最后推进入库水位（同步，见 load）"""
+        self.refresh_derived(loaded)
+        dates = _loaded_dates(loaded)
+        if dates:
+            asyncio.run(self._advance_watermark(dates))
+
+    def refresh_derived(self, loaded: Dict[str, List[str]]) -> None:
+        """刷新交易日历、派生表和日线列式存储"""
+        from app.core.trade_calendar import trade_calendar
+        from app.market_view.daily_bar_store import DailyBarStore, get_daily_bar_store
+        from app.market_view.indicator_state_service import IndicatorStateService
+        from app.market_view.market_breadth_service import MarketBreadthService
+        from app.market_view.volume_stats_service import VolumeStatsService
+
+        if "trade_cal" in loaded:
+            trade_calendar.load_sync()
+
+        daily_dates = loaded.get("stock_daily")
+        if daily_dates:
+            # 重新入库历史交易日时，其后各交易日的滚动统计和指标状态也需要重算
+            latest = self.db.execute(text(
+                "SELECT MAX(trade_date) as daily_date FROM stock_daily"
+            )).fetchone().daily_date
+            VolumeStatsService(self.db).refresh(daily_dates[0], latest)
+            MarketBreadthService(self.db).refresh(daily_dates[0], daily_dates[-1])
+            IndicatorStateService(self.db).refresh(daily_dates[0], latest)
+
+        # 列式存储只重新读取本次入库的交易日，不全量重建
+        store_dates = sorted(set(daily_dates or []) | set(loaded.get("stk_factor_pro") or []))
+        if store_dates and get_daily_bar_store() is not None:
+            DailyBarStore.patch(store_dates)
+
+    @staticmethod
+    async def _advance_watermark(dates: List[str], close_cache: bool = True) -> None:
+        from app.core.cache import get_cache
+        from app.core.cache_policy import ttl_policy
+        try:
+            for trade_date in dates:
+                await ttl_policy.advance_watermark(trade_date)
+        except Exception as e:
+            logger.warning("Failed to advance ingestion watermark: {}", str(e))
+        finally:
+            if close_cache:
+                await get_cache().close()
+
+
+def _loaded_dates(loaded: Dict[str, List[str]]) -> List[str]:
+    return sorted({d for table_dates in loaded.values() for d in table_dates})
+
+
+if __name__ == "__main__":
+    # 用法：python -m app.market_view.ingestion_service <trade_date | 文件或目录 ...>
+    service = IngestionService()
+    args = sys.argv[1:]
+    if len(args) == 1 and args[0].replace('-', '').isdigit():
+        service.load_trade_date(args[0])
+    else:
+        service.load_paths(args)
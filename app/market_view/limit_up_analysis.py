@@ -0,0 +1,207 @@
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import read_sql
+from app.core.trade_calendar import trade_calendar
+from app.utils.serializer import Field, RAW, serialize_frame
+
+# 连板趋势回溯的交易日数（不含当日）
+TREND_DAYS = 10
+# 异动分析、强势股跟踪回溯的交易日数（不含当日）
+RECENT_DAYS = 5
+
+# 一次取出当日及之前 TREND_DAYS 个交易日的涨跌停数据（起始日由交易日历计算）
+WINDOW_QUERY = text("""
+    SELECT
+        trade_date,
+        ts_code,
+        name,
+        industry,
+        "limit",
+        limit_times,
+        fd_amount,
+        first_time,
+        last_time,
+        open_times,
+        turnover_ratio,
+        up_stat,
+        amount,
+        pct_chg
+    FROM limit_list
+    WHERE trade_date BETWEEN :start_date AND :trade_date
+""")
+
+WINDOW_COLUMNS = ['trade_date', 'ts_code', 'name', 'industry', 'limit', 'limit_times',
+                  'fd_amount', 'first_time', 'last_time', 'open_times', 'turnover_ratio',
+                  'up_stat', 'amount', 'pct_chg']
+
+
+def _records(df: pd.DataFrame, columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """输出指定列，空值输出 None（与逐条 SQL 查询的结果一致）"""
+    return serialize_frame(df, [Field(col, col, RAW) for col in columns])
+
+
+def _top(df: pd.DataFrame, by, ascending, n: int) -> pd.DataFrame:
+    return df.sort_values(by, ascending=ascending, kind='stable', na_position='last').head(n)
+
+
+class LimitUpAnalyzer:
+    """涨停板分析引擎
+
+    一次查询取出分析窗口内的 limit_list 数据，十项分析全部在内存中
+    以分组聚合完成，不再对 limit_list 逐项查询和自关联。
+    """
+
+    def __init__(self, frame: pd.DataFrame, trade_date: str):
+        frame = frame.reindex(columns=WINDOW_COLUMNS)
+        for col in ('limit_times', 'open_times'):
+            frame[col] = pd.to_numeric(frame[col], errors='coerce').astype('Int64')
+        for col in ('fd_amount', 'turnover_ratio', 'amount', 'pct_chg'):
+            frame[col] = pd.to_numeric(frame[col], errors='coerce')
+        self.trade_date = trade_date
+        self.frame = frame
+
+        self.trend_start = trade_calendar.window_start(trade_date, TREND_DAYS)
+        self.recent_start = trade_calendar.window_start(trade_date, RECENT_DAYS)
+
+        self.today = frame[frame['trade_date'] == trade_date]
+        self.limit_up = self.today[self.today['limit'] == 'U']
+
+    @classmethod
+    async def load(cls, trade_date: str, db: Optional[AsyncSession] = None) -> "LimitUpAnalyzer":
+        params = {"trade_date": trade_date,
+                  "start_date": trade_calendar.window_start(trade_date, TREND_DAYS)}
+        frame = await read_sql(WINDOW_QUERY, params, db)
+        return cls(frame, trade_date)
+
+    def analyze(self) -> Dict[str, Any]:
+        return {
+            "limit_stats": self.limit_stats(),
+            "industry_distribution": self.industry_distribution(),
+            "strongest_stocks": self.strongest_stocks(),
+            "fastest_stocks": self.fastest_stocks(),
+            "last_stocks": self.last_stocks(),
+            "broken_stocks": self.broken_stocks(),
+            "abnormal_stocks": self.abnormal_stocks(),
+            "board_trend": self.board_trend(),
+            "strong_stocks": self.strong_stocks(),
+            "sector_linkage": self.sector_linkage()
+        }
+
+    def limit_stats(self) -> List[Dict[str, Any]]:
+        """1. 涨停板统计：各连板数的涨停数量"""
+        stats = (self.limit_up.groupby('limit_times', dropna=False).size()
+                 .rename('count').reset_index().sort_values('limit_times', na_position='last'))
+        return _records(stats, ['limit_times', 'count'])
+
+    def industry_distribution(self) -> List[Dict[str, Any]]:
+        """2. 行业涨停分布（前 10）"""
+        grouped = self.limit_up.groupby('industry', dropna=False, sort=False)
+        stats = pd.DataFrame({
+            'limit_up_count': grouped.size(),
+            'stock_names': grouped['name'].agg(lambda names: ','.join(names.dropna()) or None)
+        }).reset_index()
+        return _records(_top(stats, 'limit_up_count', False, 10),
+                        ['industry', 'limit_up_count', 'stock_names'])
+
+    def strongest_stocks(self) -> List[Dict[str, Any]]:
+        """3. 最强涨停股（按封单金额，前 10）"""
+        return _records(_top(self.limit_up, 'fd_amount', False, 10),
+                        ['ts_code', 'name', 'industry', 'fd_amount', 'limit_times',
+                         'turnover_ratio', 'up_stat'])
+
+    def fastest_stocks(self) -> List[Dict[str, Any]]:
+        """4. 最快涨停股（按首次封板时间，前 10）"""
+        return _records(_top(self.limit_up, 'first_time', True, 10),
+                        ['ts_code', 'name', 'industry', 'first_time', 'fd_amount', 'limit_times'])
+
+    def last_stocks(self) -> List[Dict[str, Any]]:
+        """5. 最后涨停股（14:30 之后封板，前 10）"""
+        late = self.limit_up[self.limit_up['last_time'].fillna('') >= '14:30:00']
+        return _records(_top(late, 'last_time', False, 10),
+                        ['ts_code', 'name', 'industry', 'last_time', 'fd_amount', 'limit_times'])
+
+    def broken_stocks(self) -> List[Dict[str, Any]]:
+        """6. 炸板股（按开板次数，前 10）"""
+        broken = self.today[self.today['limit'] == 'Z']
+        return _records(_top(broken, 'open_times', False, 10),
+                        ['ts_code', 'name', 'industry', 'open_times', 'first_time', 'pct_chg'])
+
+    def abnormal_stocks(self) -> List[Dict[str, Any]]:
+        """7. 异动分析：成交额超过近 5 日均值 3 倍或换手率超 15%（前 20）"""
+        frame = self.frame
+        history = frame[(frame['trade_date'] < self.trade_date) &
+                        (frame['trade_date'] >= self.recent_start)]
+        averages = history.groupby('ts_code')[['amount', 'turnover_ratio']].mean()
+
+        today = self.today
+        avg_amount = today['ts_code'].map(averages['amount'])
+        avg_turnover = today['ts_code'].map(averages['turnover_ratio'])
+        stocks = today.assign(
+            amount_ratio=today['amount'] / avg_amount.where(avg_amount != 0),
+            turnover_ratio_change=today['turnover_ratio'] / avg_turnover.where(avg_turnover != 0)
+        )
+        stocks = stocks[(stocks['amount_ratio'] > 3) | (stocks['turnover_ratio'] > 15)]
+        return _records(_top(stocks, 'amount_ratio', False, 20),
+                        ['ts_code', 'name', 'industry', 'amount', 'turnover_ratio', 'pct_chg',
+                         'amount_ratio', 'turnover_ratio_change'])
+
+    def board_trend(self) -> List[Dict[str, Any]]:
+        """8. 连板趋势：近 10 个交易日的首板/二板/三板及以上/炸板数量"""
+        frame = self.frame[self.frame['trade_date'] >= self.trend_start]
+        limit_times = frame['limit_times']
+        flags = pd.DataFrame({
+            'trade_date': frame['trade_date'],
+            'first_board': (limit_times == 1).fillna(False),
+            'second_board': (limit_times == 2).fillna(False),
+            'third_plus_board': (limit_times >= 3).fillna(False),
+            'broken_board': frame['limit'] == 'Z'
+        })
+        trend = flags.groupby('trade_date').sum().astype(np.int64).reset_index()
+        return _records(trend, ['trade_date', 'first_board', 'second_board',
+                                'third_plus_board', 'broken_board'])
+
+    def strong_stocks(self) -> List[Dict[str, Any]]:
+        """9. 强势股跟踪：近 5 个交易日内至少 3 天强势（涨幅 ≥5% 或涨停/炸板），前 20"""
+        frame = self.frame
+        strong = frame[(frame['trade_date'] >= self.recent_start) &
+                       ((frame['pct_chg'] >= 5) | frame['limit'].isin(['U', 'Z']))]
+        strong = strong.sort_values('trade_date', kind='stable')
+        pct_label = strong['pct_chg'].map(lambda pct: f"{pct:.2f}%", na_action='ignore')
+        labels = np.select([strong['limit'] == 'U', strong['limit'] == 'Z'], ['涨停', '炸板'],
+                           default=pct_label.astype(object).to_numpy())
+
+        grouped = strong.assign(label=labels).groupby(['ts_code', 'name', 'industry'],
+                                                      dropna=False, sort=False)
+        stocks = pd.DataFrame({
+            'up_days': grouped.size(),
+            'total_gain': grouped['pct_chg'].sum(min_count=1),
+            'trend': grouped['label'].agg(lambda items: '->'.join(items.dropna()))
+        }).reset_index()
+        stocks = stocks[stocks['up_days'] >= 3]
+        return _records(_top(stocks, 'total_gain', False, 20),
+                        ['ts_code', 'name', 'industry', 'up_days', 'total_gain', 'trend'])
+
+    def sector_linkage(self) -> List[Dict[str, Any]]:
+        """10. 板块联动：当日涨停数 ≥2 的行业（按涨停占比，前 15）"""
+        today = self.today
+        grouped = today.groupby('industry', dropna=False, sort=False)
+        limit_up = self.limit_up.sort_values('first_time', kind='stable', na_position='last')
+        limit_up_grouped = limit_up.groupby('industry', dropna=False, sort=False)
+
+        sectors = pd.DataFrame({
+            'stock_count': grouped['ts_code'].nunique(),
+            'avg_change': grouped['pct_chg'].mean()
+        })
+        sectors['limit_up_count'] = limit_up_grouped['ts_code'].nunique().reindex(sectors.index, fill_value=0)
+        sectors['limit_up_stocks'] = limit_up_grouped['name'].agg(
+            lambda names: ','.join(names.dropna()) or None
+        ).reindex(sectors.index)
+        sectors = sectors[sectors['limit_up_count'] >= 2].reset_index()
+        sectors['limit_up_ratio'] = (sectors['limit_up_count'] /
+                                     sectors['stock_count'].where(sectors['stock_count'] != 0) * 100)
+        return _records(_top(sectors, ['limit_up_ratio', 'avg_change'], [False, False], 15),
+                        ['industry', 'stock_count', 'limit_up_count', 'avg_change',
+                         'limit_up_stocks', 'limit_up_ratio'])
@@ -0,0 +1,190 @@
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from app.core.database import get_db, fetch_all
+from loguru import logger
+
+logger = logger.bind(module=__name__)
+
+# 沪深主板 + 创业板（市场概览统计的范围）
+OVERVIEW_BOARDS = ('sh_main', 'sz_main', 'gem')
+
+# 按交易日、板块汇总 stock_daily；GROUPING SETS 的空分组即全市场汇总（board = 'all'）
+BREADTH_SELECT = """
+    SELECT
+        trade_date,
+        COALESCE(board, 'all') as board,
+        COUNT(*) as total_count,
+        COUNT(*) FILTER (WHERE pct_chg > 0) as up_count,
+        COUNT(*) FILTER (WHERE pct_chg < 0) as down_count,
+        COUNT(*) FILTER (WHERE pct_chg = 0) as flat_count,
+        COUNT(*) FILTER (WHERE pct_chg >= limit_pct - 0.5) as limit_up_count,
+        COUNT(*) FILTER (WHERE pct_chg <= 0.5 - limit_pct) as limit_down_count,
+        COUNT(*) FILTER (WHERE pct_chg >= 5) as up_5_count,
+        COUNT(*) FILTER (WHERE pct_chg <= -5) as down_5_count,
+        COALESCE(SUM(amount), 0) as total_amount,
+        COALESCE(SUM(vol), 0) as total_vol
+    FROM (
+        SELECT
+            trade_date,
+            board,
+            pct_chg,
+            amount,
+            vol,
+            CASE
+                WHEN board = 'bse' THEN 30
+                WHEN board = 'star' THEN 20
+                WHEN board = 'gem' AND trade_date >= '20200824' THEN 20
+                ELSE 10
+            END as limit_pct
+        FROM (
+            SELECT
+                trade_date,
+                pct_chg,
+                amount,
+                vol,
+                CASE
+                    WHEN ts_code LIKE '%.BJ' THEN 'bse'
+                    WHEN ts_code LIKE '60%' THEN 'sh_main'
+                    WHEN ts_code LIKE '68%' THEN 'star'
+                    WHEN ts_code LIKE '00%' THEN 'sz_main'
+                    WHEN ts_code LIKE '30%' THEN 'gem'
+                    ELSE 'other'
+                END as board
+            FROM stock_daily
+            WHERE trade_date BETWEEN :start_date AND :end_date
+        ) d
+    ) b
+    GROUP BY trade_date, GROUPING SETS ((board), ())
+"""
+
+UPSERT_SQL = text(f"""
+    INSERT INTO market_breadth (
+        trade_date, board, total_count, up_count, down_count, flat_count,
+        limit_up_count, limit_down_count, up_5_count, down_5_count,
+        total_amount, total_vol, updated_at
+    )
+    SELECT
+        trade_date, board, total_count, up_count, down_count, flat_count,
+        limit_up_count, limit_down_count, up_5_count, down_5_count,
+        total_amount, total_vol, NOW()
+    FROM ({BREADTH_SELECT}) t
+    ON CONFLICT (trade_date, board) DO UPDATE SET
+        total_count = EXCLUDED.total_count,
+        up_count = EXCLUDED.up_count,
+        down_count = EXCLUDED.down_count,
+        flat_count = EXCLUDED.flat_count,
+        limit_up_count = EXCLUDED.limit_up_count,
+        limit_down_count = EXCLUDED.limit_down_count,
+        up_5_count = EXCLUDED.up_5_count,
+        down_5_count = EXCLUDED.down_5_count,
+        total_amount = EXCLUDED.total_amount,
+        total_vol = EXCLUDED.total_vol,
+        updated_at = EXCLUDED.updated_at
+""")
+
+BREADTH_COLUMNS = """
+    trade_date, board, total_count, up_count, down_count, flat_count,
+    limit_up_count, limit_down_count, up_5_count, down_5_count,
+    total_amount, total_vol
+"""
+
+
+class MarketBreadthService:
+    """维护 market_breadth 派生表
+
+    新交易日入库后调用 update_trade_date（或 sync），每个交易日只汇总一次 stock_daily；
+    市场概览、市场统计等接口直接读取当日的几行汇总数据。
+    """
+
+    def __init__(self, db: Session = None):
+        self.db = next(get_db()) if db is None else db
+
+    def refresh(self, start_date: str, end_date: str) -> int:
+        """重新计算 [start_date, end_date] 区间内的市场宽度（可重复执行）"""
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+        logger.info("Refreshing market breadth from {} to {}", start_date, end_date)
+        try:
+            result = self.db.execute(UPSERT_SQL, {"start_date": start_date, "end_date": end_date})
+            self.db.commit()
+            logger.info("Refreshed {} market breadth rows", result.rowcount)
+            return result.rowcount
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error refreshing market breadth: {}", str(e))
+            raise
+
+    def update_trade_date(self, trade_date: str) -> int:
+        """计算单个交易日的市场宽度"""
+        return self.refresh(trade_date, trade_date)
+
+    def sync(self) -> int:
+        """补齐 stock_daily 中已入库但尚未汇总的交易日"""
+        row = self.db.execute(text("""
+            SELECT
+                (SELECT MAX(trade_date) FROM market_breadth) as breadth_date,
+                (SELECT MIN(trade_date) FROM stock_daily) as first_date,
+                (SELECT MAX(trade_date) FROM stock_daily) as daily_date
+        """)).fetchone()
+        if not row.daily_date:
+            return 0
+        if row.breadth_date and row.breadth_date >= row.daily_date:
+            logger.info("Market breadth already up to date: {}", row.breadth_date)
+            return 0
+
+        # 派生表为空时全量回填
+        start_date = row.first_date
+        if row.breadth_date:
+            start_date = self.db.execute(text("""
+                SELECT MIN(trade_date) as next_date
+                FROM stock_daily
+                WHERE trade_date > :breadth_date
+            """), {"breadth_date": row.breadth_date}).fetchone().next_date
+        return self.refresh(start_date, row.daily_date)
+
+
+async def get_breadth(trade_date: str, db: Optional[AsyncSession] = None) -> Dict[str, Dict[str, Any]]:
+    """读取单个交易日各板块的市场宽度：{board: 统计}
+
+    派生表中尚无该日数据（如入库后尚未运行汇总任务）时直接从 stock_daily 汇总。
+    """
+    params = {"trade_date": trade_date}
+    rows = await fetch_all(
+        f"SELECT {BREADTH_COLUMNS} FROM market_breadth WHERE trade_date = :trade_date", params, db
+    )
+    if not rows:
+        logger.debug("Market breadth not materialized for {}, aggregating stock_daily", trade_date)
+        rows = await fetch_all(BREADTH_SELECT, {"start_date": trade_date, "end_date": trade_date}, db)
+    return {row["board"]: row for row in rows}
+
+
+def combine_boards(breadth: Dict[str, Dict[str, Any]], boards: Sequence[str]) -> Dict[str, Any]:
+    """合并多个板块的统计"""
+    rows = [breadth[board] for board in boards if board in breadth]
+    fields = ['total_count', 'up_count', 'down_count', 'flat_count', 'limit_up_count',
+              'limit_down_count', 'up_5_count', 'down_5_count', 'total_amount', 'total_vol']
+    return {field: sum(row[field] or 0 for row in rows) for field in fields}
+
+
+async def get_breadth_series(start_date: str, end_date: str, board: str = 'all',
+                             db: Optional[AsyncSession] = None) -> List[Dict[str, Any]]:
+    """读取区间内某个板块的每日市场宽度（按交易日升序）"""
+    return await fetch_all(f"""
+        SELECT {BREADTH_COLUMNS}
+        FROM market_breadth
+        WHERE board = :board
+        AND trade_date BETWEEN :start_date AND :end_date
+        ORDER BY trade_date
+    """, {"board": board, "start_date": start_date, "end_date": end_date}, db)
+
+
+if __name__ == "__main__":
+    # 用法：python -m app.market_view.market_breadth_service [start_date [end_date]]
+    service = MarketBreadthService()
+    if len(sys.argv) > 1:
+        service.refresh(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else sys.argv[1])
+    else:
+        service.sync()
@@ -1,18 +1,20 @@
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.core.database import get_db
+from app.core.database import execute, fetch_all
+from app.market_view.limit_up_analysis import LimitUpAnalyzer
+from app.market_view.market_breadth_service import get_breadth
 from loguru import logger
 from datetime import datetime
-from app.db.session import async_session
 
 logger = logger.bind(module=__name__)
 
 class MarketReviewService:
-    def __init__(self, db: Session = None):
-        self.db = next(get_db()) if db is None else db
+    def __init__(self, db: AsyncSession = None):
+        # 未传入会话时，每次查询临时从异步连接池取连接
+        self.db = db
     
-    def get_limit_up_stocks(
+    async def get_limit_up_stocks(
         self,
         trade_date: str,
         limit_times: Optional[int] = None,
@@ -50,7 +52,7 @@ class MarketReviewService:
             params["up_stat"] = up_stat
         
         # 执行查询
-        result = self.db.execute(text(query), params)
+        result = await execute(text(query), params, self.db)
         stocks = result.fetchall()
         
         # 转换为字典列表并处理数值格式
@@ -64,19 +66,19 @@ class MarketReviewService:
             for row in stocks
         ]
     
-    def get_daily_review(self, trade_date: str) -> Dict[str, Any]:
+    async def get_daily_review(self, trade_date: str) -> Dict[str, Any]:
         """获取每日市场复盘数据"""
         formatted_date = trade_date.replace('-', '')
         
         return {
-            "hot_sectors": self._get_hot_sectors(formatted_date),
-            "capital_flow": self._get_capital_flow(formatted_date),
-            "market_stats": self._get_market_statistics(formatted_date),
-            "limit_up_analysis": self._get_limit_up_analysis(formatted_date),
-            "concept_analysis": self._get_concept_analysis(formatted_date)
+            "hot_sectors": await self._get_hot_sectors(formatted_date),
+            "capital_flow": await self._get_capital_flow(formatted_date),
+            "market_stats": await self._get_market_statistics(formatted_date),
+            "limit_up_analysis": await self._get_limit_up_analysis(formatted_date),
+            "concept_analysis": await self._get_concept_analysis(formatted_date)
         }
     
-    def _get_hot_sectors(self, trade_date: str) -> List[Dict]:
+    async def _get_hot_sectors(self, trade_date: str) -> List[Dict]:
         """获取热门板块数据"""
         query = text("""
             WITH sector_stats AS (
@@ -102,9 +104,9 @@ class MarketReviewService:
             LIMIT 10
         """)
         
-        return [dict(row) for row in self.db.execute(query, {"trade_date": trade_date})]
+        return await fetch_all(query, {"trade_date": trade_date}, self.db)
     
-    def _get_capital_flow(self, trade_date: str) -> List[Dict]:
+    async def _get_capital_flow(self, trade_date: str) -> List[Dict]:
         """获取资金流向数据"""
         query = text("""
             SELECT 
@@ -122,26 +124,22 @@ class MarketReviewService:
             LIMIT 20
         """)
         
-        return [dict(row) for row in self.db.execute(query, {"trade_date": trade_date})]
+        return await fetch_all(query, {"trade_date": trade_date}, self.db)
     
-    def _get_market_statistics(self, trade_date: str) -> Dict:
-        """获取市场整体统计数据"""
-        query = text("""
-            SELECT 
-                COUNT(CASE WHEN pct_chg > 0 THEN 1 END) as up_count,
-                COUNT(CASE WHEN pct_chg < 0 THEN 1 END) as down_count,
-                COUNT(CASE WHEN pct_chg >= 9.5 THEN 1 END) as limit_up_count,
-                COUNT(CASE WHEN pct_chg <= -9.5 THEN 1 END) as limit_down_count,
-                COUNT(CASE WHEN pct_chg >= 5 THEN 1 END) as up_5_percent,
-                COUNT(CASE WHEN pct_chg <= -5 THEN 1 END) as down_5_percent,
-                SUM(amount) as total_amount
-            FROM stock_daily
-            WHERE trade_date = :trade_date
-        """)
-        
-        return dict(self.db.execute(query, {"trade_date": trade_date}).first())
+    async def _get_market_statistics(self, trade_date: str) -> Dict:
+        """获取市场整体统计数据（取自 market_breadth 全市场汇总）"""
+        stats = (await get_breadth(trade_date, self.db)).get('all', {})
+        return {
+            "up_count": stats.get('up_count', 0),
+            "down_count": stats.get('down_count', 0),
+            "limit_up_count": stats.get('limit_up_count', 0),
+            "limit_down_count": stats.get('limit_down_count', 0),
+            "up_5_percent": stats.get('up_5_count', 0),
+            "down_5_percent": stats.get('down_5_count', 0),
+            "total_amount": stats.get('total_amount')
+        }
     
-    def _get_limit_up_analysis(self, trade_date: str) -> Dict[str, Any]:
+    async def _get_limit_up_analysis(self, trade_date: str) -> Dict[str, Any]:
         """获取涨停板分析
         
         返回数据包括：
@@ -155,261 +153,13 @@ class MarketReviewService:
         8. 连板趋势分析
         9. 强势股跟踪
         10. 板块联动分析
+
+        分析窗口内的 limit_list 数据一次取出，各项在内存中计算（见 LimitUpAnalyzer）
         """
-        # 1. 涨停板统计
-        limit_stats_query = text("""
-            SELECT 
-                limit_times,
-                COUNT(*) as count
-            FROM limit_list
-            WHERE trade_date = :trade_date
-            AND limit = 'U'
-            GROUP BY limit_times
-            ORDER BY limit_times
-        """)
-        
-        # 2. 行业涨停分布
-        industry_stats_query = text("""
-            SELECT 
-                industry,
-                COUNT(*) as limit_up_count,
-                STRING_AGG(name, ',') as stock_names
-            FROM limit_list
-            WHERE trade_date = :trade_date
-            AND limit = 'U'
-            GROUP BY industry
-            ORDER BY limit_up_count DESC
-            LIMIT 10
-        """)
-        
-        # 3. 最强涨停股
-        strongest_query = text("""
-            SELECT 
-                ts_code,
-                name,
-                industry,
-                fd_amount,
-                limit_times,
-                turnover_ratio,
-                up_stat
-            FROM limit_list
-            WHERE trade_date = :trade_date
-            AND limit = 'U'
-            ORDER BY fd_amount DESC
-            LIMIT 10
-        """)
-        
-        # 4. 最快涨停股
-        fastest_query = text("""
-            SELECT 
-                ts_code,
-                name,
-                industry,
-                first_time,
-                fd_amount,
-                limit_times
-            FROM limit_list
-            WHERE trade_date = :trade_date
-            AND limit = 'U'
-            ORDER BY first_time
-            LIMIT 10
-        """)
-        
-        # 5. 最后涨停股
-        last_query = text("""
-            SELECT 
-                ts_code,
-                name,
-                industry,
-                last_time,
-                fd_amount,
-                limit_times
-            FROM limit_list
-            WHERE trade_date = :trade_date
-            AND limit = 'U'
-            AND last_time >= '14:30:00'
-            ORDER BY last_time DESC
-            LIMIT 10
-        """)
-        
-        # 6. 炸板股统计
-        broken_query = text("""
-            SELECT 
-                ts_code,
-                name,
-                industry,
-                open_times,
-                first_time,
-                pct_chg
-            FROM limit_list
-            WHERE trade_date = :trade_date
-            AND limit = 'Z'
-            ORDER BY open_times DESC
-            LIMIT 10
-        """)
-        
-        # 7. 异动分析
-        abnormal_query = text("""
-            WITH prev_data AS (
-                SELECT 
-                    l1.ts_code,
-                    l1.name,
-                    l1.industry,
-                    l1.amount,
-                    l1.turnover_ratio,
-                    l1.pct_chg,
-                    AVG(l2.amount) as avg_amount_5d,
-                    AVG(l2.turnover_ratio) as avg_turnover_5d
-                FROM limit_list l1
-                LEFT JOIN limit_list l2 ON l1.ts_code = l2.ts_code
-                    AND l2.trade_date < :trade_date
-                    AND l2.trade_date >= (
-                        SELECT MAX(trade_date)
-                        FROM (
-                            SELECT DISTINCT trade_date 
-                            FROM limit_list 
-                            WHERE trade_date < :trade_date
-                            ORDER BY trade_date DESC 
-                            LIMIT 5
-                        ) t
-                    )
-                WHERE l1.trade_date = :trade_date
-                GROUP BY l1.ts_code, l1.name, l1.industry, l1.amount, 
-                         l1.turnover_ratio, l1.pct_chg
-            )
-            SELECT 
-                ts_code,
-                name,
-                industry,
-                amount,
-                turnover_ratio,
-                pct_chg,
-                (amount / NULLIF(avg_amount_5d, 0)) as amount_ratio,
-                (turnover_ratio / NULLIF(avg_turnover_5d, 0)) as turnover_ratio_change
-            FROM prev_data
-            WHERE (amount / NULLIF(avg_amount_5d, 0)) > 3  -- 成交额放大3倍
-               OR turnover_ratio > 15  -- 换手率超15%
-            ORDER BY amount_ratio DESC
-            LIMIT 20
-        """)
-        
-        # 8. 连板趋势分析
-        trend_query = text("""
-            WITH daily_stats AS (
-                SELECT 
-                    trade_date,
-                    COUNT(CASE WHEN limit_times = 1 THEN 1 END) as first_board,
-                    COUNT(CASE WHEN limit_times = 2 THEN 1 END) as second_board,
-                    COUNT(CASE WHEN limit_times >= 3 THEN 1 END) as third_plus_board,
-                    COUNT(CASE WHEN limit = 'Z' THEN 1 END) as broken_board
-                FROM limit_list
-                WHERE trade_date <= :trade_date
-                AND trade_date >= (
-                    SELECT MAX(trade_date)
-                    FROM (
-                        SELECT DISTINCT trade_date 
-                        FROM limit_list 
-                        WHERE trade_date < :trade_date
-                        ORDER BY trade_date DESC 
-                        LIMIT 10
-                    ) t
-                )
-                GROUP BY trade_date
-                ORDER BY trade_date
-            )
-            SELECT * FROM daily_stats
-        """)
-        
-        # 9. 强势股跟踪
-        strong_stocks_query = text("""
-            WITH consecutive_days AS (
-                SELECT 
-                    l1.ts_code,
-                    l1.name,
-                    l1.industry,
-                    COUNT(*) as up_days,
-                    SUM(l1.pct_chg) as total_gain,
-                    STRING_AGG(
-                        CASE 
-                            WHEN l1.limit = 'U' THEN '涨停'
-                            WHEN l1.limit = 'Z' THEN '炸板'
-                            ELSE ROUND(l1.pct_chg::numeric, 2)::text || '%'
-                        END,
-                        '->' ORDER BY l1.trade_date
-                    ) as trend
-                FROM limit_list l1
-                WHERE l1.trade_date <= :trade_date
-                AND l1.trade_date >= (
-                    SELECT MAX(trade_date)
-                    FROM (
-                        SELECT DISTINCT trade_date 
-                        FROM limit_list 
-                        WHERE trade_date < :trade_date
-                        ORDER BY trade_date DESC 
-                        LIMIT 5
-                    ) t
-                )
-                AND (l1.pct_chg >= 5 OR l1.limit IN ('U', 'Z'))
-                GROUP BY l1.ts_code, l1.name, l1.industry
-                HAVING COUNT(*) >= 3  -- 连续3天以上强势
-            )
-            SELECT 
-                ts_code,
-                name,
-                industry,
-                up_days,
-                total_gain,
-                trend
-            FROM consecutive_days
-            ORDER BY total_gain DESC
-            LIMIT 20
-        """)
-        
-        # 10. 板块联动分析
-        sector_linkage_query = text("""
-            WITH sector_stats AS (
-                SELECT 
-                    l1.industry,
-                    COUNT(DISTINCT l1.ts_code) as stock_count,
-                    COUNT(DISTINCT CASE WHEN l1.limit = 'U' THEN l1.ts_code END) as limit_up_count,
-                    AVG(l1.pct_chg) as avg_change,
-                    STRING_AGG(
-                        CASE WHEN l1.limit = 'U' THEN l1.name END,
-                        ',' ORDER BY l1.first_time
-                    ) as limit_up_stocks
-                FROM limit_list l1
-                WHERE l1.trade_date = :trade_date
-                GROUP BY l1.industry
-                HAVING COUNT(DISTINCT CASE WHEN l1.limit = 'U' THEN l1.ts_code END) >= 2
-            )
-            SELECT 
-                industry,
-                stock_count,
-                limit_up_count,
-                avg_change,
-                limit_up_stocks,
-                (limit_up_count::float / NULLIF(stock_count, 0) * 100) as limit_up_ratio
-            FROM sector_stats
-            ORDER BY limit_up_ratio DESC, avg_change DESC
-            LIMIT 15
-        """)
-        
-        result = {
-            "limit_stats": [dict(row) for row in self.db.execute(limit_stats_query, {"trade_date": trade_date})],
-            "industry_distribution": [dict(row) for row in self.db.execute(industry_stats_query, {"trade_date": trade_date})],
-            "strongest_stocks": [dict(row) for row in self.db.execute(strongest_query, {"trade_date": trade_date})],
-            "fastest_stocks": [dict(row) for row in self.db.execute(fastest_query, {"trade_date": trade_date})],
-            "last_stocks": [dict(row) for row in self.db.execute(last_query, {"trade_date": trade_date})],
-            "broken_stocks": [dict(row) for row in self.db.execute(broken_query, {"trade_date": trade_date})],
-            "abnormal_stocks": [dict(row) for row in self.db.execute(abnormal_query, {"trade_date": trade_date})],
-            "board_trend": [dict(row) for row in self.db.execute(trend_query, {"trade_date": trade_date})],
-            "strong_stocks": [dict(row) for row in self.db.execute(strong_stocks_query, {"trade_date": trade_date})],
-            "sector_linkage": [dict(row) for row in self.db.execute(sector_linkage_query, {"trade_date": trade_date})]
-        }
-        
-        return result
+        analyzer = await LimitUpAnalyzer.load(trade_date, self.db)
+        return analyzer.analyze()
     
-    def _get_concept_analysis(self, trade_date: str) -> List[Dict]:
+    async def _get_concept_analysis(self, trade_date: str) -> List[Dict]:
         """获取概念分析"""
         query = text("""
             WITH concept_stats AS (
@@ -437,9 +187,9 @@ class MarketReviewService:
             LIMIT 15
         """)
         
-        return [dict(row) for row in self.db.execute(query, {"trade_date": trade_date})]
+        return await fetch_all(query, {"trade_date": trade_date}, self.db)
     
-    def get_market_trend(self, index_code: str, start_date: str, end_date: str, metrics: List[str]) -> Dict[str, Any]:
+    async def get_market_trend(self, index_code: str, start_date: str, end_date: str, metrics: List[str]) -> Dict[str, Any]:
         """获取指数的时间序列趋势数据
         
         Args:
@@ -500,11 +250,11 @@ class MarketReviewService:
             ORDER BY d.trade_date;
         """)
         
-        result = self.db.execute(query, {
+        result = await execute(query, {
             "index_code": index_code,
             "start_date": start_date,
             "end_date": end_date
-        })
+        }, self.db)
         
         # 初始化结果字典
         trend_data = {
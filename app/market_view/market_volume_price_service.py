@@ -1,16 +1,108 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.core.database import get_db
+from app.core.database import execute, read_sql
+from app.core.trade_calendar import trade_calendar
+from app.market_view.volume_price_service import (
+    ANOMALY_TYPES, MFI_HIGH, MFI_LOW, OUTFLOW_NET_AMOUNT, OUTFLOW_NET_RATE,
+    PRICE_UP_PCT, VOLUME_SHRINK_RATIO
+)
+from app.utils.ranking import top_k
+from app.utils.serializer import Field, NULLABLE_FLOAT, STR, serialize_frame
 from loguru import logger
 
 logger = logger.bind(module=__name__)
 
+# 全市场量价异常筛选：当日全部股票的行情、前一日成交量、资金流向和 MFI
+ANOMALY_CROSS_SECTION_QUERY = text("""
+    SELECT
+        d.ts_code,
+        s.name,
+        s.industry,
+        d.close,
+        d.pct_chg,
+        d.vol,
+        d.amount,
+        v.pre_vol,
+        v.volume_ratio_5 as volume_ratio,
+        m.net_amount,
+        m.net_amount_rate,
+        f.mfi_qfq as mfi
+    FROM stock_daily d
+    LEFT JOIN stock_basic s ON s.ts_code = d.ts_code
+    LEFT JOIN stock_volume_stats v ON v.ts_code = d.ts_code AND v.trade_date = :trade_date
+    LEFT JOIN moneyflow_dc m ON m.ts_code = d.ts_code AND m.trade_date = :trade_date
+    LEFT JOIN stk_factor_pro f ON f.ts_code = d.ts_code AND f.trade_date = :trade_date
+    WHERE d.trade_date = :trade_date
+""")
+
+# 严重程度权重：anomaly_score = Σ 触发规则的权重 × (1 + 强度)，强度取值 [0, 1]
+SEVERITY_WEIGHTS = {"high": 2.0, "medium": 1.0}
+
+# 可用于排序的列（均按降序取前 limit 只）
+ANOMALY_SORT_FIELDS = ['anomaly_score', 'pct_chg', 'volume_ratio', 'amount',
+                       'net_amount', 'net_amount_rate', 'mfi']
+
+ANOMALY_STOCK_FIELDS = [
+    Field('ts_code', 'ts_code', STR),
+    Field('name', 'name', STR),
+    Field('industry', 'industry', STR),
+    Field('anomaly_score', 'anomaly_score', NULLABLE_FLOAT),
+    Field('close', 'close', NULLABLE_FLOAT),
+    Field('pct_chg', 'pct_chg', NULLABLE_FLOAT),
+    Field('vol', 'vol', NULLABLE_FLOAT),
+    Field('amount', 'amount', NULLABLE_FLOAT),
+    Field('vol_change_ratio', 'vol_change_ratio', NULLABLE_FLOAT),
+    Field('volume_ratio', 'volume_ratio', NULLABLE_FLOAT),
+    Field('net_amount', 'net_amount', NULLABLE_FLOAT),
+    Field('net_amount_rate', 'net_amount_rate', NULLABLE_FLOAT),
+    Field('mfi', 'mfi', NULLABLE_FLOAT)
+]
+
+# 异常类型 -> 输出的指标列
+ANOMALY_INDICATORS = {
+    "price_up_volume_down": {"price_change": "pct_chg", "volume_ratio": "vol_change_ratio"},
+    "main_force_outflow": {"net_amount": "net_amount", "net_amount_rate": "net_amount_rate"},
+    "mfi_extreme": {"mfi": "mfi"}
+}
+
+
+def _anomaly_flags(df: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """对当日截面整列判断 StockVolumePriceService._analyze_single_stock 的三条规则
+
+    返回 ({异常类型: 是否触发}, {异常类型: 强度})，缺失数据的规则不触发；
+    同时为 df 添加 vol_change_ratio 列（当日成交量 / 前一交易日成交量）。
+    """
+    def column(name: str) -> np.ndarray:
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(np.float64)
+
+    pct_chg, vol, pre_vol = column('pct_chg'), column('vol'), column('pre_vol')
+    net_amount, net_rate, mfi = column('net_amount'), np.abs(column('net_amount_rate')), column('mfi')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vol_change = np.where(pre_vol > 0, vol / pre_vol, np.nan)
+        flags = {
+            "price_up_volume_down": (pct_chg > PRICE_UP_PCT) & (vol < pre_vol * VOLUME_SHRINK_RATIO),
+            "main_force_outflow": (net_amount < OUTFLOW_NET_AMOUNT) & (net_rate > OUTFLOW_NET_RATE),
+            "mfi_extreme": (mfi < MFI_LOW) | (mfi > MFI_HIGH)
+        }
+        # 强度：超出阈值的程度，归一化到 [0, 1]
+        strength = {
+            "price_up_volume_down": (np.clip((pct_chg - PRICE_UP_PCT) / 8, 0, 1) +
+                                     np.clip(1 - vol_change / VOLUME_SHRINK_RATIO, 0, 1)) / 2,
+            "main_force_outflow": np.clip((net_rate - OUTFLOW_NET_RATE) / (100 - OUTFLOW_NET_RATE), 0, 1),
+            "mfi_extreme": np.clip(np.fmax(MFI_LOW - mfi, mfi - MFI_HIGH) / MFI_LOW, 0, 1)
+        }
+    df['vol_change_ratio'] = vol_change
+    return flags, strength
+
 class MarketVolumePriceService:
-    def __init__(self, db: Session = None):
-        self.db = next(get_db()) if db is None else db
+    def __init__(self, db: AsyncSession = None):
+        # 未传入会话时，每次查询临时从异步连接池取连接
+        self.db = db
     
-    def get_market_volume_data(self, trade_date: str):
+    async def get_market_volume_data(self, trade_date: str):
         """获取市场量价数据"""
         logger.info("Getting market volume data for date: {}", trade_date)
         try:
@@ -20,32 +112,20 @@ class MarketVolumePriceService:
             
             # 先检查一些样本数据
             debug_query = text("""
-                WITH volume_stats AS (
-                    SELECT 
-                        d.ts_code,
-                        s.name,
-                        d.vol,
-                        d.amount,
-                        AVG(d.vol) OVER (PARTITION BY d.ts_code ORDER BY d.trade_date DESC ROWS BETWEEN 1 FOLLOWING AND 5 FOLLOWING) as avg_vol_5
-                    FROM stock_daily d
-                    JOIN stock_basic s ON d.ts_code = s.ts_code
-                    WHERE d.trade_date = :trade_date
-                )
                 SELECT 
-                    ts_code,
-                    name,
-                    vol,
-                    avg_vol_5,
-                    CASE 
-                        WHEN vol = 0 OR avg_vol_5 = 0 THEN 0 
-                        ELSE vol::float / NULLIF(avg_vol_5, 0) 
-                    END as volume_ratio
-                FROM volume_stats
-                WHERE vol > 0 AND avg_vol_5 > 0
-                ORDER BY volume_ratio DESC
+                    v.ts_code,
+                    s.name,
+                    v.vol,
+                    v.avg_vol_5,
+                    v.volume_ratio_5 as volume_ratio
+                FROM stock_volume_stats v
+                JOIN stock_basic s ON v.ts_code = s.ts_code
+                WHERE v.trade_date = :trade_date
+                AND v.vol > 0 AND v.avg_vol_5 > 0
+                ORDER BY v.volume_ratio_5 DESC
                 LIMIT 10
             """)
-            debug_result = self.db.execute(debug_query, {"trade_date": formatted_date})
+            debug_result = await execute(debug_query, {"trade_date": formatted_date}, self.db)
             debug_data = debug_result.fetchall()
             logger.info("Sample data for debugging:")
             for row in debug_data:
@@ -61,7 +141,7 @@ class MarketVolumePriceService:
                         SUM(vol * 100) as total_volume,
                         SUM(amount) as total_amount
                     FROM stock_daily
-                    WHERE trade_date <= :trade_date
+                    WHERE trade_date BETWEEN :start_date AND :trade_date
                     GROUP BY trade_date
                     ORDER BY trade_date DESC
                     LIMIT 20
@@ -72,7 +152,10 @@ class MarketVolumePriceService:
                 FROM daily_stats
                 ORDER BY trade_date DESC
             """)
-            result = self.db.execute(query, {"trade_date": formatted_date})
+            # 近 20 个交易日的起始日由交易日历计算，GROUP BY 只扫描这 20 天
+            window = {"trade_date": formatted_date,
+                      "start_date": trade_calendar.window_start(formatted_date, 19)}
+            result = await execute(query, window, self.db)
             market_data = result.fetchone()
             logger.debug("Market data: total_volume={}, total_amount={}", 
                         market_data.total_volume, market_data.total_amount)
@@ -84,12 +167,12 @@ class MarketVolumePriceService:
                     trade_date,
                     SUM(vol) as total_volume
                 FROM stock_daily
-                WHERE trade_date <= :trade_date
+                WHERE trade_date BETWEEN :start_date AND :trade_date
                 GROUP BY trade_date
                 ORDER BY trade_date DESC
                 LIMIT 20
             """)
-            result = self.db.execute(query, {"trade_date": formatted_date})
+            result = await execute(query, window, self.db)
             daily_data = result.fetchall()
             
             volumes = [row.total_volume for row in daily_data]
@@ -103,114 +186,22 @@ class MarketVolumePriceService:
             volume_ratio = volumes[0] / avg_volume_5 if avg_volume_5 else None
             logger.debug("Volume ratio: {}", volume_ratio)
             
-            # 确保 volume_condition 有默认值
-            if 'volume_condition' not in locals():
-                volume_condition = 'volume_ratio_5 >= 1.5'  # 默认使用5日均量比率
-
-            logger.debug("Using volume condition: {}", volume_condition)
-            query = text("""
-                WITH base_stats AS (
-                    SELECT
-                        d.ts_code,
-                        d.vol * 100 as volume,
-                        d.close,
-                        d.pct_chg,
-                        d.amount,
-                        s.name,
-                        AVG(d.vol * 100) OVER (PARTITION BY d.ts_code ORDER BY d.trade_date DESC ROWS BETWEEN 1 FOLLOWING AND 5 FOLLOWING) as avg_vol_5,
-                        AVG(d.vol * 100) OVER (PARTITION BY d.ts_code ORDER BY d.trade_date DESC ROWS BETWEEN 9 FOLLOWING AND 18 FOLLOWING) as avg_vol_10,
-                        AVG(d.vol * 100) OVER (PARTITION BY d.ts_code ORDER BY d.trade_date DESC ROWS BETWEEN 19 FOLLOWING AND 38 FOLLOWING) as avg_vol_20,
-                        AVG(d.vol * 100) OVER (PARTITION BY d.ts_code ORDER BY d.trade_date DESC ROWS BETWEEN 59 FOLLOWING AND 118 FOLLOWING) as avg_vol_60
-                    FROM stock_daily d
-                    JOIN stock_basic s ON d.ts_code = s.ts_code
-                    WHERE d.trade_date = :trade_date
-                ),
-                volume_stats AS (
-                    SELECT
-                        ts_code,
-                        name,
-                        close,
-                        pct_chg,
-                        volume,
-                        amount,
-                        volume / NULLIF(avg_vol_5, 0) as volume_ratio_5,
-                        volume / NULLIF(avg_vol_10, 0) as volume_ratio_10,Execution failed for task ':app:processReleaseResources'.
-> A failure occurred while executing com.android.build.gradle.internal.res.LinkApplicationAndroidResourcesTask$TaskAction
-   > Android resource linking failed
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:245: error: resource attr/colorPrimaryVariant (aka com.example.martin1e:attr/colorPrimaryVariant) not found.
-     error: resource style/Theme.MaterialComponents.DayNight.DarkActionBar (aka com.example.martin1e:style/Theme.MaterialComponents.DayNight.DarkActionBar) not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:237: error: style attribute 'attr/colorPrimary (aka com.example.martin1e:attr/colorPrimary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:238: error: style attribute 'attr/colorPrimaryVariant (aka com.example.martin1e:attr/colorPrimaryVariant)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:239: error: style attribute 'attr/colorOnPrimary (aka com.example.martin1e:attr/colorOnPrimary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:241: error: style attribute 'attr/colorSecondary (aka com.example.martin1e:attr/colorSecondary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:242: error: style attribute 'attr/colorSecondaryVariant (aka com.example.martin1e:attr/colorSecondaryVariant)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:243: error: style attribute 'attr/colorOnSecondary (aka com.example.martin1e:attr/colorOnSecondary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values/values.xml:245: error: resource attr/colorPrimaryVariant (aka com.example.martin1e:attr/colorPrimaryVariant) not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:13: error: resource attr/colorPrimaryVariant (aka com.example.martin1e:attr/colorPrimaryVariant) not found.
-     error: resource style/Theme.MaterialComponents.DayNight.DarkActionBar (aka com.example.martin1e:style/Theme.MaterialComponents.DayNight.DarkActionBar) not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:5: error: style attribute 'attr/colorPrimary (aka com.example.martin1e:attr/colorPrimary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:6: error: style attribute 'attr/colorPrimaryVariant (aka com.example.martin1e:attr/colorPrimaryVariant)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:7: error: style attribute 'attr/colorOnPrimary (aka com.example.martin1e:attr/colorOnPrimary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:9: error: style attribute 'attr/colorSecondary (aka com.example.martin1e:attr/colorSecondary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:10: error: style attribute 'attr/colorSecondaryVariant (aka com.example.martin1e:attr/colorSecondaryVariant)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:11: error: style attribute 'attr/colorOnSecondary (aka com.example.martin1e:attr/colorOnSecondary)' not found.
-     com.example.martin1e.app-mergeReleaseResources-38:/values-night-v8/values-night-v8.xml:13: error: resource attr/colorPrimaryVariant (aka com.example.martin1e:attr/colorPrimaryVariant) not found.
-     error: failed linking references.
-
-* Try:
-> Run with --stacktrace option to get the stack trace.
-> Run with --info or --debug option to get more log output.
-> Run with --scan to get full insights.
-> Get more help at https://help.gradle.org.
-BUILD FAILED in 30s
-31 actionable tasks: 31 executed
-                        volume / NULLIF(avg_vol_20, 0) as volume_ratio_20,
-                        volume / NULLIF(avg_vol_60, 0) as volume_ratio_60
-                    FROM base_stats
-                )
-                SELECT
-                    ts_code as code,
-                    name,
-                    close as price,
-                    pct_chg as change_percent,
-                    volume,
-                    amount,
-                    volume_ratio_5,
-                    volume_ratio_10,
-                    volume_ratio_20,
-                    volume_ratio_60
-                FROM volume_stats
-                WHERE """ + volume_condition + """
-                ORDER BY ABS(pct_chg) DESC
-                LIMIT 100
-            """)
-            result = self.db.execute(query, {"trade_date": formatted_date})
-            volume_distribution = result.fetchall()
-            logger.debug("Volume distribution calculated with {} ranges", len(volume_distribution))
-            
             # 计算成交量分布
             logger.debug("Calculating volume distribution")
             volume_distribution_query = text("""
-                WITH base_stats AS (
-                    SELECT
-                        d.ts_code,
-                        d.vol * 100 as volume,
-                        AVG(d.vol * 100) OVER (PARTITION BY d.ts_code ORDER BY d.trade_date DESC ROWS BETWEEN 4 FOLLOWING AND 8 FOLLOWING) as avg_vol_5
-                    FROM stock_daily d
-                    WHERE d.trade_date = :trade_date
-                ),
-                ratios AS (
+                WITH ratios AS (
                     SELECT
                         CASE
-                            WHEN avg_vol_5 > 0 AND volume / avg_vol_5 >= 2 THEN '2倍以上'
-                            WHEN avg_vol_5 > 0 AND volume / avg_vol_5 >= 1.5 THEN '1.5-2倍'
-                            WHEN avg_vol_5 > 0 AND volume / avg_vol_5 >= 1 THEN '1-1.5倍'
-                            WHEN avg_vol_5 > 0 AND volume / avg_vol_5 >= 0.5 THEN '0.5-1倍'
-                            WHEN avg_vol_5 > 0 THEN '0.5倍以下'
+                            WHEN volume_ratio_5 >= 2 THEN '2倍以上'
+                            WHEN volume_ratio_5 >= 1.5 THEN '1.5-2倍'
+                            WHEN volume_ratio_5 >= 1 THEN '1-1.5倍'
+                            WHEN volume_ratio_5 >= 0.5 THEN '0.5-1倍'
+                            WHEN volume_ratio_5 IS NOT NULL THEN '0.5倍以下'
                             ELSE '未分类'
                         END as range
-                    FROM base_stats
-                    WHERE avg_vol_5 > 0
+                    FROM stock_volume_stats
+                    WHERE trade_date = :trade_date
+                    AND avg_vol_5 > 0
                 ),
                 all_ranges AS (
                     SELECT unnest(ARRAY[
@@ -238,7 +229,7 @@ BUILD FAILED in 30s
                         WHEN '未分类' THEN 6
                     END
             """)
-            volume_distribution_result = self.db.execute(volume_distribution_query, {"trade_date": formatted_date})
+            volume_distribution_result = await execute(volume_distribution_query, {"trade_date": formatted_date}, self.db)
             volume_distribution = volume_distribution_result.fetchall()
 
             # 将volumeDistribution添加到返回的数据中
@@ -257,7 +248,7 @@ BUILD FAILED in 30s
             logger.error("Error in get_market_volume_data: {}", str(e))
             raise
     
-    def get_anomaly_stocks(self, trade_date: str, type: str):
+    async def get_anomaly_stocks(self, trade_date: str, type: str):
         """获取异常股票列表"""
         logger.info("Getting anomaly stocks for date: {}, type: {}", trade_date, type)
         try:
@@ -281,29 +272,19 @@ BUILD FAILED in 30s
             
             logger.debug("Using volume condition: {}", volume_condition)
             query = text("""
-                WITH base_stats AS (
+                WITH volume_stats AS (
                     SELECT
                         d.ts_code,
-                        d.vol * 100 as volume,
+                        s.name,
                         d.close,
                         d.pct_chg,
+                        d.vol * 100 as volume,
                         d.amount,
-                        s.name,
-                        AVG(d.vol * 100) OVER (PARTITION BY d.ts_code ORDER BY d.trade_date DESC ROWS BETWEEN 1 FOLLOWING AND 5 FOLLOWING) as avg_vol_5
+                        v.volume_ratio_5 as volume_ratio
                     FROM stock_daily d
+                    JOIN stock_volume_stats v ON d.ts_code = v.ts_code AND v.trade_date = :trade_date
                     JOIN stock_basic s ON d.ts_code = s.ts_code
                     WHERE d.trade_date = :trade_date
-                ),
-                volume_stats AS (
-                    SELECT
-                        ts_code,
-                        name,
-                        close,
-                        pct_chg,
-                        volume,
-                        amount,
-                        volume / NULLIF(avg_vol_5, 0) as volume_ratio
-                    FROM base_stats
                 )
                 SELECT
                     ts_code as code,
@@ -319,7 +300,7 @@ BUILD FAILED in 30s
                 LIMIT 100
             """)
             
-            result = self.db.execute(query, {"trade_date": formatted_date})
+            result = await execute(query, {"trade_date": formatted_date}, self.db)
             stocks = result.fetchall()
             logger.debug("Found {} anomaly stocks", len(stocks))
             
@@ -341,3 +322,64 @@ BUILD FAILED in 30s
         except Exception as e:
             logger.error("Error in get_anomaly_stocks: {}", str(e))
             raise
+
+    async def get_market_volume_price_anomalies(self, trade_date: str, anomaly_types: Optional[List[str]] = None,
+                                                limit: int = 50, sort_by: str = "anomaly_score"):
+        """全市场量价异常股票筛选
+
+        一次读取当日全部股票的截面数据，整列判断量价背离、主力资金流出、MFI 极值三条规则
+        （与个股量价分析的规则一致），按严重程度加权计算综合 anomaly_score，
+        再用 argpartition 取排序字段最大的前 limit 只，不对全部股票排序。
+
+        Args:
+            trade_date: 交易日期
+            anomaly_types: 只保留触发其中任一类型的股票，默认全部类型
+            limit: 返回的股票数
+            sort_by: 排序字段（降序），见 ANOMALY_SORT_FIELDS
+        """
+        logger.info("Getting market volume price anomalies for date: {}", trade_date)
+        types = list(dict.fromkeys(anomaly_types or ANOMALY_TYPES))
+        invalid = [t for t in types if t not in ANOMALY_TYPES]
+        if invalid:
+            raise ValueError(f"Invalid anomaly types: {', '.join(invalid)}. "
+                             f"Must be among: {', '.join(ANOMALY_TYPES)}")
+        if sort_by not in ANOMALY_SORT_FIELDS:
+            raise ValueError(f"Invalid sort field: {sort_by}. Must be one of: {', '.join(ANOMALY_SORT_FIELDS)}")
+
+        formatted_date = trade_date.replace('-', '')
+        df = await read_sql(ANOMALY_CROSS_SECTION_QUERY, {"trade_date": formatted_date}, self.db)
+        if df.empty:
+            return {"trade_date": formatted_date, "total": 0, "counts": {t: 0 for t in types}, "stocks": []}
+
+        flags, strength = _anomaly_flags(df)
+        score = np.zeros(len(df))
+        for anomaly_type, (_, severity) in ANOMALY_TYPES.items():
+            score += np.where(flags[anomaly_type],
+                              SEVERITY_WEIGHTS[severity] * (1 + np.nan_to_num(strength[anomaly_type])), 0)
+        df['anomaly_score'] = score
+
+        selected = np.logical_or.reduce([flags[t] for t in types])
+        candidates = np.flatnonzero(selected)
+        order_by = pd.to_numeric(df[sort_by], errors='coerce').to_numpy(np.float64)[candidates]
+        top = candidates[top_k(order_by, limit)]
+
+        stocks = serialize_frame(df.iloc[top], ANOMALY_STOCK_FIELDS)
+        for stock, row in zip(stocks, top):
+            stock["anomalies"] = [
+                {
+                    "type": anomaly_type,
+                    "description": description,
+                    "severity": severity,
+                    "indicators": {name: stock[col] for name, col in ANOMALY_INDICATORS[anomaly_type].items()}
+                }
+                for anomaly_type, (description, severity) in ANOMALY_TYPES.items()
+                if flags[anomaly_type][row]
+            ]
+
+        logger.info("Found {} anomaly stocks for date: {}", len(candidates), trade_date)
+        return {
+            "trade_date": formatted_date,
+            "total": int(len(candidates)),
+            "counts": {t: int(flags[t].sum()) for t in types},
+            "stocks": stocks
+        }
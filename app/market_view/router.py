@@ -2,12 +2,14 @@ from fastapi import APIRouter, Query, Body, HTTPException, Depends
 from typing import Optional, List, Dict, Any
 from .service import MarketReviewService
 from .stock_compare_service import StockCompareService
+from . import screener
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.responses import FastRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
 class StockCompareRequest(BaseModel):
     ts_code1: str
@@ -15,10 +17,39 @@ class StockCompareRequest(BaseModel):
     start_date: str
     end_date: str
 
+class BatchCompareRequest(BaseModel):
+    ts_codes: List[str]
+    start_date: str
+    end_date: str
+    fields: Optional[List[str]] = None
+
+class WeeklyPatternBatchRequest(BaseModel):
+    ts_codes: Optional[List[str]] = None
+    industry: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+class ScreenRequest(BaseModel):
+    trade_date: str
+    expression: Optional[str] = None
+    preset: Optional[str] = None
+    sort_by: str = "pct_chg"
+    descending: bool = True
+    limit: int = 50
+    fields: Optional[List[str]] = None
+
 @router.get("/overview")
 async def get_market_overview(trade_date: str = Query(..., description="交易日期，格式：YYYYMMDD")):
     return await MarketReviewService.get_market_overview(trade_date)
 
+@router.get("/breadth")
+async def get_market_breadth(
+    start_date: str = Query(..., description="开始日期，格式：YYYYMMDD"),
+    end_date: str = Query(..., description="结束日期，格式：YYYYMMDD"),
+    board: str = Query('all', description="板块：all/sh_main/sz_main/gem/star/bse")
+):
+    return await MarketReviewService.get_market_breadth(start_date, end_date, board)
+
 @router.get("/sector-flow")
 async def get_sector_flow(trade_date: str = Query(..., description="交易日期，格式：YYYYMMDD")):
     return await MarketReviewService.get_sector_flow(trade_date)
@@ -61,6 +92,34 @@ async def get_limit_history(
 ):
     return await MarketReviewService.get_limit_history(ts_code, trade_date)
 
+@router.get("/stock/correlation/{ts_code}")
+async def get_correlated_stocks(
+    ts_code: str,
+    trade_date: str = Query(..., description="交易日期，格式：YYYYMMDD"),
+    window: int = Query(60, ge=5, le=750, description="收益率窗口（交易日数）"),
+    top_k: int = Query(20, ge=1, le=500),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="desc: 相关性最高，asc: 最低")
+):
+    """全市场与指定股票收益率相关性最高/最低的股票"""
+    try:
+        return await StockCompareService.get_correlated_stocks(ts_code, trade_date, window, top_k, order == "desc")
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/index-beta/{index_code}")
+async def get_index_betas(
+    index_code: str,
+    trade_date: str = Query(..., description="交易日期，格式：YYYYMMDD"),
+    window: int = Query(60, ge=5, le=750, description="收益率窗口（交易日数）"),
+    top_k: int = Query(50, ge=1, le=6000),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="desc: beta 最高，asc: 最低")
+):
+    """全市场股票对指数的 beta"""
+    try:
+        return await StockCompareService.get_index_betas(index_code, trade_date, window, top_k, order == "desc")
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @router.get("/stock/volume-analysis/{ts_code}")
 async def get_volume_analysis(
     ts_code: str,
@@ -69,7 +128,7 @@ async def get_volume_analysis(
     return await MarketReviewService.get_volume_analysis(ts_code, trade_date)
 
 @router.get("/stock/weekly-analysis")
-def get_weekly_analysis(
+async def get_weekly_analysis(
     ts_code: str,
     start_date: str = Query(default=None),
     end_date: str = Query(default=None)
@@ -88,14 +147,14 @@ def get_weekly_analysis(
     elif not end_date:
         end_date = datetime.now().strftime("%Y%m%d")
         
-    return StockCompareService.get_weekly_analysis(ts_code, start_date, end_date)
+    return await StockCompareService.get_weekly_analysis(ts_code, start_date, end_date)
 
 @router.get("/stock/weekly-pattern/{ts_code}")
-def get_stock_weekly_pattern(
+async def get_stock_weekly_pattern(
     ts_code: str,
     start_date: str = Query(None, description="开始日期，格式：YYYYMMDD"),
     end_date: str = Query(None, description="结束日期，格式：YYYYMMDD"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取股票周度交易规律分析
     
@@ -105,16 +164,59 @@ def get_stock_weekly_pattern(
         end_date: 结束日期 (可选，格式：YYYYMMDD)
     """
     service = StockCompareService(db)
-    return service.get_weekly_pattern(ts_code, start_date, end_date)
+    return await service.get_weekly_pattern(ts_code, start_date, end_date)
+
+@router.post("/stock/weekly-pattern/batch")
+async def get_weekly_pattern_batch(
+    request: WeeklyPatternBatchRequest = Body(..., description="批量周度规律请求参数")
+):
+    """批量获取多只股票（或整个行业）的周度交易规律"""
+    try:
+        return await StockCompareService.get_weekly_pattern_batch(
+            request.ts_codes, request.industry, request.start_date, request.end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/stock/compare")
-def compare_stocks(
+async def compare_stocks(
     request: StockCompareRequest = Body(..., description="股票比较请求参数")
 ):
     """比较两只股票的量价走势"""
-    return StockCompareService.get_stock_comparison(
+    return await StockCompareService.get_stock_comparison(
         request.ts_code1,
         [request.ts_code2] if request.ts_code2 != request.ts_code1 else [],
         request.start_date,
         request.end_date
     )
+
+@router.post("/stock/compare/batch")
+async def compare_stocks_batch(
+    request: BatchCompareRequest = Body(..., description="批量股票对比请求参数")
+):
+    """批量对比多只股票的走势，按交易日对齐后列式输出"""
+    try:
+        return await StockCompareService.get_batch_comparison(
+            request.ts_codes, request.start_date, request.end_date, request.fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/screener/fields")
+async def get_screener_fields():
+    """表达式选股可用的字段、函数和预置条件"""
+    return screener.describe()
+
+@router.post("/screener")
+async def screen_stocks(
+    request: ScreenRequest = Body(..., description="表达式选股请求参数"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按表达式筛选当日全市场股票，例如 pct_chg > 5 and vol / avg_vol_5 > 2 and turnover_rate < 10"""
+    try:
+        return await screener.screen(
+            request.trade_date, request.expression, request.preset, request.sort_by,
+            request.descending, request.limit, request.fields, db
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
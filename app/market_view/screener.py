@@ -0,0 +1,402 @@
+"""表达式选股
+
+用一个受限的小型表达式语言描述筛选条件，例如::
+
+    pct_chg > 5 and vol / avg_vol_5 > 2 and turnover_rate < 10
+
+表达式用 Python 语法解析（ast），只允许白名单内的节点：数值常量、字段名、
+算术运算 (+ - * / % **)、比较（可链式 0 < x < 5）、and / or / not 以及少量函数；
+属性访问、下标、字符串、lambda 等一律拒绝。编译结果是作用在当日全市场截面
+列向量上的 NumPy 运算，一次求值得到全部股票的结果，不再为每种筛选手写 SQL。
+
+缺失值（NaN）参与比较、作为 and / or / not 的操作数时结果均为 False，即缺少某个
+字段数据的股票不会被选中。例外：not 作用于比较时只对比较结果取反，
+not (pct_chg > 5) 对 pct_chg 缺失的股票为真，需要时配合 isnull() 排除。
+"""
+import ast
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import read_sql
+from app.utils.ranking import top_k
+from app.utils.serializer import Field, NULLABLE_FLOAT, STR, serialize_frame
+
+logger = logger.bind(module=__name__)
+
+# 表达式最大长度与最大节点数
+MAX_EXPRESSION_LENGTH = 500
+MAX_EXPRESSION_NODES = 200
+
+# 单次返回的最大股票数
+MAX_LIMIT = 500
+
+
+class ScreenField(NamedTuple):
+    table: str        # 表别名，见 TABLE_JOINS
+    column: str       # 列表达式
+    description: str
+
+
+# 表别名 -> 关联方式（d 为 stock_daily，始终存在）
+TABLE_JOINS = {
+    "v": "LEFT JOIN stock_volume_stats v ON v.ts_code = d.ts_code AND v.trade_date = :trade_date",
+    "m": "LEFT JOIN moneyflow_dc m ON m.ts_code = d.ts_code AND m.trade_date = :trade_date",
+    "mf": "LEFT JOIN moneyflow mf ON mf.ts_code = d.ts_code AND mf.trade_date = :trade_date",
+    "f": "LEFT JOIN stk_factor_pro f ON f.ts_code = d.ts_code AND f.trade_date = :trade_date",
+}
+
+# 可在表达式中使用的字段
+FIELDS: Dict[str, ScreenField] = {
+    # 日线行情
+    "open": ScreenField("d", "d.open", "开盘价"),
+    "high": ScreenField("d", "d.high", "最高价"),
+    "low": ScreenField("d", "d.low", "最低价"),
+    "close": ScreenField("d", "d.close", "收盘价"),
+    "pre_close": ScreenField("d", "d.pre_close", "昨收价"),
+    "change": ScreenField("d", "d.change", "涨跌额"),
+    "pct_chg": ScreenField("d", "d.pct_chg", "涨跌幅（%）"),
+    "vol": ScreenField("d", "d.vol", "成交量（手）"),
+    "amount": ScreenField("d", "d.amount", "成交额（千元）"),
+    # 成交量统计
+    "pre_vol": ScreenField("v", "v.pre_vol", "前一交易日成交量"),
+    "pre_amount": ScreenField("v", "v.pre_amount", "前一交易日成交额"),
+    "avg_vol_5": ScreenField("v", "v.avg_vol_5", "前5日均量"),
+    "avg_vol_10": ScreenField("v", "v.avg_vol_10", "前10日均量"),
+    "avg_vol_20": ScreenField("v", "v.avg_vol_20", "前20日均量"),
+    "avg_vol_60": ScreenField("v", "v.avg_vol_60", "前60日均量"),
+    "volume_ratio_5": ScreenField("v", "v.volume_ratio_5", "5日量比"),
+    "volume_ratio_10": ScreenField("v", "v.volume_ratio_10", "10日量比"),
+    "volume_ratio_20": ScreenField("v", "v.volume_ratio_20", "20日量比"),
+    "volume_ratio_60": ScreenField("v", "v.volume_ratio_60", "60日量比"),
+    # 资金流向（东方财富）
+    "net_amount": ScreenField("m", "m.net_amount", "主力净流入额"),
+    "net_amount_rate": ScreenField("m", "m.net_amount_rate", "主力净流入占比（%）"),
+    "buy_elg_amount": ScreenField("m", "m.buy_elg_amount", "超大单净流入额"),
+    "buy_lg_amount": ScreenField("m", "m.buy_lg_amount", "大单净流入额"),
+    "buy_md_amount": ScreenField("m", "m.buy_md_amount", "中单净流入额"),
+    "buy_sm_amount": ScreenField("m", "m.buy_sm_amount", "小单净流入额"),
+    "buy_elg_amount_rate": ScreenField("m", "m.buy_elg_amount_rate", "超大单净流入占比（%）"),
+    "buy_lg_amount_rate": ScreenField("m", "m.buy_lg_amount_rate", "大单净流入占比（%）"),
+    # 资金流向（tushare moneyflow）
+    "net_mf_amount": ScreenField("mf", "mf.net_mf_amount", "净流入额（万元）"),
+    "elg_net_vol": ScreenField("mf", "mf.buy_elg_vol - mf.sell_elg_vol", "特大单净买入量（手）"),
+    "lg_net_vol": ScreenField("mf", "mf.buy_lg_vol - mf.sell_lg_vol", "大单净买入量（手）"),
+    "md_net_vol": ScreenField("mf", "mf.buy_md_vol - mf.sell_md_vol", "中单净买入量（手）"),
+    "sm_net_vol": ScreenField("mf", "mf.buy_sm_vol - mf.sell_sm_vol", "小单净买入量（手）"),
+    # 技术因子（stk_factor_pro，不复权）
+    "turnover_rate": ScreenField("f", "f.turnover_rate", "换手率（%）"),
+    "turnover_rate_f": ScreenField("f", "f.turnover_rate_f", "自由流通股换手率（%）"),
+    "volume_ratio": ScreenField("f", "f.volume_ratio", "量比"),
+    "ma_5": ScreenField("f", "f.ma_bfq_5", "5日均线"),
+    "ma_10": ScreenField("f", "f.ma_bfq_10", "10日均线"),
+    "ma_20": ScreenField("f", "f.ma_bfq_20", "20日均线"),
+    "ma_60": ScreenField("f", "f.ma_bfq_60", "60日均线"),
+    "macd_dif": ScreenField("f", "f.macd_dif_bfq", "MACD DIF"),
+    "macd_dea": ScreenField("f", "f.macd_dea_bfq", "MACD DEA"),
+    "macd": ScreenField("f", "f.macd_bfq", "MACD 柱"),
+    "kdj_k": ScreenField("f", "f.kdj_k_bfq", "KDJ K"),
+    "kdj_d": ScreenField("f", "f.kdj_d_bfq", "KDJ D"),
+    "kdj_j": ScreenField("f", "f.kdj_bfq", "KDJ J"),
+    "rsi_6": ScreenField("f", "f.rsi_bfq_6", "RSI 6"),
+    "rsi_12": ScreenField("f", "f.rsi_bfq_12", "RSI 12"),
+    "rsi_24": ScreenField("f", "f.rsi_bfq_24", "RSI 24"),
+    "boll_upper": ScreenField("f", "f.boll_upper_bfq", "布林上轨"),
+    "boll_mid": ScreenField("f", "f.boll_mid_bfq", "布林中轨"),
+    "boll_lower": ScreenField("f", "f.boll_lower_bfq", "布林下轨"),
+    "mfi": ScreenField("f", "f.mfi_qfq", "MFI"),
+}
+
+# 常用筛选（与 get_anomaly_stocks 的成交量异常类型条件一致）
+PRESETS = {
+    "volume_up": "volume_ratio_5 >= 1.5 and pct_chg > 0",
+    "volume_down": "volume_ratio_5 >= 1.5 and pct_chg < 0",
+    "volume_decrease_up": "volume_ratio_5 <= 0.5 and pct_chg > 0",
+    "volume_decrease_down": "volume_ratio_5 <= 0.5 and pct_chg < 0",
+}
+
+# ---------------------------------------------------------------- 表达式编译
+
+Columns = Dict[str, np.ndarray]
+Evaluator = Callable[[Columns], Any]
+
+
+def _truth(value: Any) -> np.ndarray:
+    """数值按非 0 且非 NaN 视为真"""
+    value = np.asarray(value)
+    if value.dtype == bool:
+        return value
+    value = value.astype(np.float64)
+    return (value != 0) & ~np.isnan(value)
+
+
+def _falsy(value: Any) -> np.ndarray:
+    """not 运算：数值按等于 0 视为真，NaN 仍为假"""
+    value = np.asarray(value)
+    if value.dtype == bool:
+        return ~value
+    return value.astype(np.float64) == 0
+
+
+def _coalesce(value: Any, default: Any) -> np.ndarray:
+    return np.where(np.isnan(value), default, value)
+
+
+# 函数名 -> (实现, 最少参数个数, 最多参数个数)
+FUNCTIONS: Dict[str, tuple] = {
+    "abs": (np.abs, 1, 1),
+    "sqrt": (np.sqrt, 1, 1),
+    "log": (np.log, 1, 1),
+    "min": (lambda *args: np.minimum.reduce(np.broadcast_arrays(*args)), 2, 8),
+    "max": (lambda *args: np.maximum.reduce(np.broadcast_arrays(*args)), 2, 8),
+    "isnull": (lambda x: np.isnan(np.asarray(x, dtype=np.float64)), 1, 1),
+    "coalesce": (_coalesce, 2, 2),
+}
+
+BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.Mod: np.fmod,
+    ast.Pow: np.power,
+}
+
+COMPARE_OPERATORS = {
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+
+def _float(value: Any) -> Any:
+    """算术运算的操作数统一为浮点（布尔按 0/1）"""
+    value = np.asarray(value)
+    return value.astype(np.float64) if value.dtype != np.float64 else value
+
+
+class Expression:
+    """编译后的表达式，evaluate(columns) 返回全部股票的结果向量"""
+
+    def __init__(self, source: str, evaluator: Evaluator, fields: List[str]):
+        self.source = source
+        self.fields = fields
+        self._evaluator = evaluator
+
+    def evaluate(self, columns: Columns, size: int) -> np.ndarray:
+        with np.errstate(all="ignore"):
+            result = np.asarray(self._evaluator(columns))
+        return np.broadcast_to(result, (size,))
+
+    def mask(self, columns: Columns, size: int) -> np.ndarray:
+        """筛选条件：结果为真的股票"""
+        return _truth(self.evaluate(columns, size))
+
+    def values(self, columns: Columns, size: int) -> np.ndarray:
+        """排序键：结果转为浮点"""
+        return _float(self.evaluate(columns, size))
+
+
+class _Compiler:
+    def __init__(self):
+        self.fields: List[str] = []
+        self.nodes = 0
+
+    def compile(self, node: ast.AST) -> Evaluator:
+        self.nodes += 1
+        if self.nodes > MAX_EXPRESSION_NODES:
+            raise ValueError(f"表达式过于复杂（超过 {MAX_EXPRESSION_NODES} 个节点）")
+        method = getattr(self, f"_{type(node).__name__}", None)
+        if method is None:
+            raise ValueError(f"表达式不支持的语法：{type(node).__name__}")
+        return method(node)
+
+    def _Expression(self, node: ast.Expression) -> Evaluator:
+        return self.compile(node.body)
+
+    def _Constant(self, node: ast.Constant) -> Evaluator:
+        if not isinstance(node.value, (bool, int, float)):
+            raise ValueError(f"表达式只支持数值常量：{node.value!r}")
+        try:
+            value = float(node.value)
+        except OverflowError:
+            raise ValueError(f"数值常量超出范围：{str(node.value)[:20]}...")
+        return lambda columns: value
+
+    def _Name(self, node: ast.Name) -> Evaluator:
+        name = node.id
+        if name not in FIELDS:
+            raise ValueError(f"未知字段：{name}")
+        if name not in self.fields:
+            self.fields.append(name)
+        return lambda columns: columns[name]
+
+    def _UnaryOp(self, node: ast.UnaryOp) -> Evaluator:
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda columns: _falsy(operand(columns))
+        if isinstance(node.op, ast.USub):
+            return lambda columns: -_float(operand(columns))
+        if isinstance(node.op, ast.UAdd):
+            return lambda columns: _float(operand(columns))
+        raise ValueError(f"表达式不支持的运算符：{type(node.op).__name__}")
+
+    def _BinOp(self, node: ast.BinOp) -> Evaluator:
+        func = BINARY_OPERATORS.get(type(node.op))
+        if func is None:
+            raise ValueError(f"表达式不支持的运算符：{type(node.op).__name__}")
+        left, right = self.compile(node.left), self.compile(node.right)
+        return lambda columns: func(_float(left(columns)), _float(right(columns)))
+
+    def _BoolOp(self, node: ast.BoolOp) -> Evaluator:
+        operands = [self.compile(value) for value in node.values]
+        reduce = np.logical_and.reduce if isinstance(node.op, ast.And) else np.logical_or.reduce
+        return lambda columns: reduce(np.broadcast_arrays(*(_truth(op(columns)) for op in operands)))
+
+    def _Compare(self, node: ast.Compare) -> Evaluator:
+        funcs = []
+        for op in node.ops:
+            func = COMPARE_OPERATORS.get(type(op))
+            if func is None:
+                raise ValueError(f"表达式不支持的比较：{type(op).__name__}")
+            funcs.append(func)
+        operands = [self.compile(node.left)] + [self.compile(c) for c in node.comparators]
+
+        def evaluate(columns: Columns) -> np.ndarray:
+            values = [_float(op(columns)) for op in operands]
+            result = funcs[0](values[0], values[1])
+            for i in range(1, len(funcs)):
+                result = result & funcs[i](values[i], values[i + 1])
+            # != 对 NaN 为真，统一按缺失值处理为假
+            for value in values:
+                result = result & ~np.isnan(value)
+            return result
+        return evaluate
+
+    def _Call(self, node: ast.Call) -> Evaluator:
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else type(node.func).__name__
+            raise ValueError(f"未知函数：{name}，可用函数：{', '.join(FUNCTIONS)}")
+        if node.keywords:
+            raise ValueError("函数不支持关键字参数")
+        func, min_args, max_args = FUNCTIONS[node.func.id]
+        if not min_args <= len(node.args) <= max_args:
+            raise ValueError(f"函数 {node.func.id} 的参数个数应为 {min_args}-{max_args}")
+        args = [self.compile(arg) for arg in node.args]
+        return lambda columns: func(*(_float(arg(columns)) for arg in args))
+
+
+def compile_expression(source: str) -> Expression:
+    """解析并编译表达式，语法错误、未知字段或不允许的语法抛出 ValueError"""
+    source = (source or "").strip()
+    if not source:
+        raise ValueError("表达式不能为空")
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"表达式长度不能超过 {MAX_EXPRESSION_LENGTH}")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"表达式语法错误：{e.msg}")
+    compiler = _Compiler()
+    evaluator = compiler.compile(tree)
+    return Expression(source, evaluator, compiler.fields)
+
+
+# ---------------------------------------------------------------- 截面数据
+
+
+def cross_section_query(fields: Sequence[str]):
+    """只关联 fields 涉及的表、只读取 fields 列的当日截面查询"""
+    tables = {FIELDS[name].table for name in fields}
+    columns = "".join(f",\n        {FIELDS[name].column} as {name}" for name in fields)
+    joins = "".join(f"\n    {TABLE_JOINS[alias]}" for alias in TABLE_JOINS if alias in tables)
+    return text(f"""
+    SELECT
+        d.ts_code,
+        s.name,
+        s.industry{columns}
+    FROM stock_daily d
+    LEFT JOIN stock_basic s ON s.ts_code = d.ts_code{joins}
+    WHERE d.trade_date = :trade_date
+    """)
+
+
+async def load_cross_section(trade_date: str, fields: Sequence[str],
+                             db: Optional[AsyncSession] = None) -> pd.DataFrame:
+    return await read_sql(cross_section_query(fields), {"trade_date": trade_date}, db)
+
+
+def _columns(df: pd.DataFrame, fields: Sequence[str]) -> Columns:
+    return {name: pd.to_numeric(df[name], errors="coerce").to_numpy(np.float64) for name in fields}
+
+
+# ---------------------------------------------------------------- 选股
+
+
+async def screen(trade_date: str, expression: Optional[str] = None, preset: Optional[str] = None,
+                 sort_by: str = "pct_chg", descending: bool = True, limit: int = 50,
+                 fields: Optional[List[str]] = None,
+                 db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+    """按表达式筛选 trade_date 全市场股票，按 sort_by（字段或表达式）排序取前 limit 只
+
+    返回匹配总数及前 limit 只股票的代码、名称、行业、排序值和表达式涉及的字段值。
+    """
+    if preset is not None:
+        if preset not in PRESETS:
+            raise ValueError(f"Invalid preset: {preset}. Must be one of: {', '.join(PRESETS)}")
+        expression = f"({PRESETS[preset]}) and ({expression})" if expression else PRESETS[preset]
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit 应在 1-{MAX_LIMIT} 之间")
+    unknown = [name for name in fields or [] if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段：{', '.join(unknown)}")
+
+    condition = compile_expression(expression)
+    order = compile_expression(sort_by)
+    output = list(dict.fromkeys(condition.fields + order.fields + list(fields or [])))
+
+    formatted_date = trade_date.replace('-', '')
+    logger.info("Screening {} with: {}", formatted_date, condition.source)
+    df = await load_cross_section(formatted_date, output, db)
+    result = {
+        "trade_date": formatted_date,
+        "expression": condition.source,
+        "sort_by": order.source,
+        "total": 0,
+        "stocks": []
+    }
+    if df.empty:
+        return result
+
+    columns = _columns(df, output)
+    selected = np.flatnonzero(condition.mask(columns, len(df)))
+    # 排序值为 NaN 的股票计入 total，但不出现在 stocks 中
+    keys = order.values(columns, len(df))
+    top = selected[top_k(keys[selected], limit, descending)]
+
+    frame = df.iloc[top].copy()
+    frame["sort_value"] = keys[top]
+    stocks = serialize_frame(frame, [
+        Field('ts_code', 'ts_code', STR),
+        Field('name', 'name', STR),
+        Field('industry', 'industry', STR),
+        Field('sort_value', 'sort_value', NULLABLE_FLOAT),
+        *(Field(name, name, NULLABLE_FLOAT) for name in output)
+    ])
+    logger.info("Screen matched {} stocks for date: {}", len(selected), formatted_date)
+    result.update(total=int(len(selected)), stocks=stocks)
+    return result
+
+
+def describe() -> Dict[str, Any]:
+    """可用字段、函数和预置条件说明"""
+    return {
+        "fields": [{"name": name, "description": field.description} for name, field in FIELDS.items()],
+        "functions": list(FUNCTIONS),
+        "presets": PRESETS
+    }
@@ -1,11 +1,175 @@
+import asyncio
+import json
 from typing import List, Dict, Any, Optional
 from datetime import date
-from app.core.database import engine
+from app.core.database import async_engine, read_sql
+from app.core.cache import cached
+from app.core.config import settings
+from app.market_view.market_breadth_service import (
+    OVERVIEW_BOARDS, combine_boards, get_breadth, get_breadth_series
+)
+from app.utils.serializer import Field, FLOAT, INT, RAW, STR, YI, clean_records, serialize_frame
 import pandas as pd
 import numpy as np
 from loguru import logger
 from sqlalchemy import text
 
+# 复盘数据缓存键前缀
+CACHE_PREFIX = "market_review"
+
+INDEX_NAMES = {
+    '000001.SH': '上证指数',
+    '399001.SZ': '深证成指',
+    '399006.SZ': '创业板指',
+    '000016.SH': '上证50',
+    '000905.SH': '中证500',
+    '399005.SZ': '中小板指'
+}
+
+# 各接口的输出字段（金额统一转换为亿元）
+INDEX_FIELDS = [
+    Field('ts_code', 'code', STR),
+    Field('name', 'name', STR),
+    Field('total_mv', scale=YI),
+    Field('float_mv', scale=YI),
+    Field('turnover_rate'),
+    Field('turnover_rate_f', 'turnoverRateF'),
+    Field('pe'),
+    Field('pe_ttm'),
+    Field('pb')
+]
+
+SECTOR_FLOW_FIELDS = [
+    Field('ts_code', kind=STR),
+    Field('name', kind=STR),
+    Field('close'),
+    Field('pct_change'),
+    Field('net_amount', scale=YI),
+    Field('net_amount_rate'),
+    Field('buy_elg_amount', scale=YI),
+    Field('buy_elg_amount_rate'),
+    Field('buy_lg_amount', scale=YI),
+    Field('buy_lg_amount_rate'),
+    Field('buy_md_amount', scale=YI),
+    Field('buy_md_amount_rate'),
+    Field('buy_sm_amount', scale=YI),
+    Field('buy_sm_amount_rate'),
+    Field('buy_sm_amount_stock', 'hotStock', STR),
+    Field('rank', kind=INT)
+]
+
+TOP_LIST_FIELDS = [
+    Field('ts_code', kind=STR),
+    Field('name', kind=STR),
+    Field('close'),
+    Field('pct_change', 'change'),
+    Field('turnover_rate'),
+    Field('amount', scale=YI),
+    Field('reason', kind=STR),
+    Field('net_rate'),
+    Field('net_amount', scale=YI),
+    Field('amount', 'totalTurnover', scale=YI)
+]
+
+# 预聚合查询额外返回的席位字段
+TOP_LIST_SEAT_FIELDS = [
+    Field('buy_amount', scale=YI),
+    Field('sell_amount', scale=YI),
+    Field('net_buy_amount', scale=YI),
+    Field('buy_inst', kind=RAW),
+    Field('sell_inst', kind=RAW)
+]
+
+# 龙虎榜 + 机构席位：席位在数据库内按股票分组聚合为 JSON 数组
+# （float8 转文本为最短表示，与 Python 端的 round(x, 2) 输出一致）
+TOP_LIST_AGGREGATE_SQL = """
+WITH seats AS (
+    SELECT
+        ts_code,
+        json_agg(exalter || '(' || round((buy_rate * 100)::numeric, 2)::float8 || '%)'
+                 ORDER BY buy DESC) FILTER (WHERE side = 0) AS buy_inst,
+        json_agg(exalter || '(' || round((sell_rate * 100)::numeric, 2)::float8 || '%)'
+                 ORDER BY sell DESC) FILTER (WHERE side = 1) AS sell_inst,
+        COALESCE(SUM(buy) FILTER (WHERE side = 0), 0) AS buy_amount,
+        COALESCE(SUM(sell) FILTER (WHERE side = 1), 0) AS sell_amount,
+        COALESCE(SUM(net_buy), 0) AS net_buy_amount
+    FROM top_inst
+    WHERE trade_date = :trade_date
+    GROUP BY ts_code
+)
+SELECT
+    t.ts_code,
+    t.name,
+    t.close,
+    t.pct_change,
+    t.turnover_rate,
+    t.amount,
+    t.reason,
+    t.net_rate,
+    t.net_amount,
+    s.buy_amount,
+    s.sell_amount,
+    s.net_buy_amount,
+    s.buy_inst,
+    s.sell_inst
+FROM top_list t
+LEFT JOIN seats s ON s.ts_code = t.ts_code
+WHERE t.trade_date = :trade_date
+"""
+
+
+def _empty_seats() -> Dict[str, Any]:
+    return {"buyInst": [], "sellInst": [], "buyAmount": 0.0, "sellAmount": 0.0, "netBuyAmount": 0.0}
+
+
+def _json_list(value: Any) -> List[Any]:
+    """json_agg 结果：驱动未解码时为字符串，无席位时为 None"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+LIMIT_UP_FIELDS = [
+    Field('ts_code', 'stockCode', STR),
+    Field('name', 'stockName', STR),
+    Field('lu_time', 'limitUpTime', STR),
+    Field('lu_desc', 'limitUpReason', STR),
+    Field('turnover_rate'),
+    Field('amount'),
+    Field('status', kind=STR),
+    Field('theme', kind=STR),
+    Field('net_change'),
+    Field('bid_amount'),
+    Field('bid_turnover'),
+    Field('free_float'),
+    Field('limit_times', kind=INT),
+    Field('up_stat', kind=STR)
+]
+
+CONCEPT_FIELDS = [
+    Field('ts_code', kind=STR),
+    Field('name', 'conceptName', STR),
+    Field('stock_count', kind=INT),
+    Field('z_t_num', 'limitUpCount', INT),
+    Field('up_num', 'upCount', INT),
+    Field('leading_stocks', 'leadingStocks', RAW),
+    Field('hot_num', kind=INT),
+    Field('description', kind=STR)
+]
+
+CONCEPT_STOCK_FIELDS = [
+    Field('ts_code', 'ts_code', STR),
+    Field('name', 'name', STR),
+    Field('pct_chg', 'pct_chg', FLOAT),
+    Field('amount', 'amount', FLOAT),
+    Field('turnover_rate', 'turnover_rate', FLOAT),
+    Field('status', 'status', STR),
+    Field('lu_time', 'lu_time', STR),
+    Field('lu_desc', 'lu_desc', STR)
+]
+
 class MarketReviewService:
     @staticmethod
     def process_float(value: Any) -> float:
@@ -20,16 +184,10 @@ class MarketReviewService:
     @staticmethod
     def process_dataframe(df: pd.DataFrame) -> List[Dict[str, Any]]:
         """处理 DataFrame，确保所有数值都是 JSON 兼容的"""
-        records = df.to_dict('records')
-        for record in records:
-            for key, value in record.items():
-                if isinstance(value, (float, np.float64, np.float32)):
-                    record[key] = MarketReviewService.process_float(value)
-                elif pd.isna(value):
-                    record[key] = None
-        return records
+        return clean_records(df)
 
     @staticmethod
+    @cached(CACHE_PREFIX)
     async def get_market_overview(trade_date: str) -> Dict[str, Any]:
         """获取市场概览数据"""
         logger.info("Getting market overview data for date: {}", trade_date)
@@ -60,7 +218,7 @@ class MarketReviewService:
             )
             """
             
-            df = pd.read_sql(index_sql, engine, params={'trade_date': trade_date})
+            df = await read_sql(index_sql, {'trade_date': trade_date})
             
             if df.empty:
                 logger.warning("No market data found for date: {}", trade_date)
@@ -72,56 +230,17 @@ class MarketReviewService:
                 }
             
             # 处理指数
-            indices = []
-            for _, row in df.iterrows():
-                index_data = {
-                    "code": row['ts_code'],
-                    "name": {
-                        '000001.SH': '上证指数',
-                        '399001.SZ': '深证成指',
-                        '399006.SZ': '创业板指',
-                        '000016.SH': '上证50',
-                        '000905.SH': '中证500',
-                        '399005.SZ': '中小板指'
-                    }.get(row['ts_code'], row['ts_code']),
-                    "totalMv": float(row['total_mv'] / 100000000),  # 转换为亿元
-                    "floatMv": float(row['float_mv'] / 100000000),  # 转换为亿元
-                    "turnoverRate": float(row['turnover_rate']),
-                    "turnoverRateF": float(row['turnover_rate_f']),
-                    "pe": float(row['pe']),
-                    "peTtm": float(row['pe_ttm']),
-                    "pb": float(row['pb'])
-                }
-                indices.append(index_data)
-            
-            # 获取上涨下跌家数和成交额（从 stock_daily 表）
-            stock_sql = """
-            SELECT 
-                COUNT(CASE WHEN pct_chg > 0 THEN 1 END) as up_count,
-                COUNT(CASE WHEN pct_chg < 0 THEN 1 END) as down_count,
-                SUM(amount) / 100000 as total_amount  -- amount单位是千元，除以100000转换为亿元
-            FROM stock_daily
-            WHERE trade_date = :trade_date
-            AND (
-                ts_code LIKE :code_prefix_1 
-                OR ts_code LIKE :code_prefix_2 
-                OR ts_code LIKE :code_prefix_3
-            )
-            """
-            stock_params = {
-                'trade_date': trade_date,
-                'code_prefix_1': '60%',  # 上海主板
-                'code_prefix_2': '00%',  # 深圳主板
-                'code_prefix_3': '30%'   # 创业板
-            }
+            df['name'] = df['ts_code'].map(INDEX_NAMES).fillna(df['ts_code'])
+            indices = serialize_frame(df, INDEX_FIELDS)
             
-            stock_df = pd.read_sql(stock_sql, engine, params=stock_params)
+            # 上涨下跌家数和成交额（沪深主板 + 创业板），取自 market_breadth 汇总表
+            breadth = combine_boards(await get_breadth(trade_date), OVERVIEW_BOARDS)
             
             result = {
                 "indices": indices,
-                "upCount": int(stock_df['up_count'].iloc[0]),
-                "downCount": int(stock_df['down_count'].iloc[0]),
-                "totalAmount": float(stock_df['total_amount'].iloc[0])  # 已经在SQL中转换为亿元
+                "upCount": int(breadth['up_count']),
+                "downCount": int(breadth['down_count']),
+                "totalAmount": float(breadth['total_amount']) / 100000  # amount单位是千元，除以100000转换为亿元
             }
             
             logger.debug("Processed data: {}", result)
@@ -131,6 +250,23 @@ class MarketReviewService:
             raise
 
     @staticmethod
+    async def get_market_breadth(start_date: str, end_date: str, board: str = 'all') -> List[Dict[str, Any]]:
+        """获取区间内的每日市场宽度（涨跌家数、涨跌停家数、成交额）"""
+        logger.info("Getting market breadth from {} to {} for board: {}", start_date, end_date, board)
+        rows = await get_breadth_series(start_date.replace('-', ''), end_date.replace('-', ''), board)
+        return [{
+            "tradeDate": row['trade_date'],
+            "totalCount": row['total_count'],
+            "upCount": row['up_count'],
+            "downCount": row['down_count'],
+            "flatCount": row['flat_count'],
+            "limitUpCount": row['limit_up_count'],
+            "limitDownCount": row['limit_down_count'],
+            "totalAmount": float(row['total_amount'] or 0) / 100000
+        } for row in rows]
+
+    @staticmethod
+    @cached(CACHE_PREFIX)
     async def get_sector_flow(trade_date: str) -> List[Dict[str, Any]]:
         """获取板块资金流向"""
         logger.info("Getting sector flow data for date: {}", trade_date)
@@ -161,34 +297,14 @@ class MarketReviewService:
             logger.debug("Executing SQL: {}", sql)
             logger.debug("Parameters: {{'trade_date': {}}}", trade_date)
             
-            df = pd.read_sql(sql, engine, params={'trade_date': trade_date})
+            df = await read_sql(sql, {'trade_date': trade_date})
             logger.debug("Query result shape: {}", df.shape)
             if df.empty:
                 logger.warning("No sector flow data found for date: {}", trade_date)
                 return []
             
             # 处理数据，确保所有值都 JSON 兼容的，并转换金额单位为亿元
-            result = []
-            for _, row in df.iterrows():
-                processed_row = {
-                    "tsCode": row['ts_code'],
-                    "name": row['name'],
-                    "close": float(row['close']) if pd.notnull(row['close']) else 0.0,
-                    "pctChange": float(row['pct_change']) if pd.notnull(row['pct_change']) else 0.0,
-                    "netAmount": float(row['net_amount'] / 100000000) if pd.notnull(row['net_amount']) else 0.0,  # 转换为亿元
-                    "netAmountRate": float(row['net_amount_rate']) if pd.notnull(row['net_amount_rate']) else 0.0,
-                    "buyElgAmount": float(row['buy_elg_amount'] / 100000000) if pd.notnull(row['buy_elg_amount']) else 0.0,
-                    "buyElgAmountRate": float(row['buy_elg_amount_rate']) if pd.notnull(row['buy_elg_amount_rate']) else 0.0,
-                    "buyLgAmount": float(row['buy_lg_amount'] / 100000000) if pd.notnull(row['buy_lg_amount']) else 0.0,
-                    "buyLgAmountRate": float(row['buy_lg_amount_rate']) if pd.notnull(row['buy_lg_amount_rate']) else 0.0,
-                    "buyMdAmount": float(row['buy_md_amount'] / 100000000) if pd.notnull(row['buy_md_amount']) else 0.0,
-                    "buyMdAmountRate": float(row['buy_md_amount_rate']) if pd.notnull(row['buy_md_amount_rate']) else 0.0,
-                    "buySmAmount": float(row['buy_sm_amount'] / 100000000) if pd.notnull(row['buy_sm_amount']) else 0.0,
-                    "buySmAmountRate": float(row['buy_sm_amount_rate']) if pd.notnull(row['buy_sm_amount_rate']) else 0.0,
-                    "hotStock": row['buy_sm_amount_stock'] if pd.notnull(row['buy_sm_amount_stock']) else "",
-                    "rank": int(row['rank']) if pd.notnull(row['rank']) else 0
-                }
-                result.append(processed_row)
+            result = serialize_frame(df, SECTOR_FLOW_FIELDS)
             
             logger.debug("Processed data: {}", result)
             return result
@@ -197,10 +313,23 @@ class MarketReviewService:
             raise
 
     @staticmethod
+    @cached(CACHE_PREFIX)
     async def get_top_list(trade_date: str) -> List[Dict[str, Any]]:
-        """获取龙虎榜数据"""
+        """获取龙虎榜数据
+
+        机构席位按 ts_code 一次分组后与龙虎榜合并；配置 TOP_LIST_SQL_AGGREGATE
+        时由 Postgres 直接返回按股票聚合好的席位 JSON 数组。
+        """
         logger.info("Getting top list data for date: {}", trade_date)
         try:
+            params = {'trade_date': trade_date}
+            if settings.TOP_LIST_SQL_AGGREGATE:
+                df = await read_sql(TOP_LIST_AGGREGATE_SQL, params)
+                if df.empty:
+                    logger.warning("No top list data found for date: {}", trade_date)
+                    return []
+                return MarketReviewService._serialize_aggregated_top_list(df)
+
             # 1. 先获取基础数据
             base_sql = """
             SELECT 
@@ -236,66 +365,30 @@ class MarketReviewService:
             END DESC
             """
             
-            params = {'trade_date': trade_date}
             logger.debug("Executing SQL queries")
             
             # 执行查询
-            df_base = pd.read_sql(base_sql, engine, params=params)
-            df_inst = pd.read_sql(inst_sql, engine, params=params)
+            df_base = await read_sql(base_sql, params)
+            df_inst = await read_sql(inst_sql, params)
             
             if df_base.empty:
                 logger.warning("No top list data found for date: {}", trade_date)
                 return []
             
-            # 处理数据
-            result = []
-            for _, row in df_base.iterrows():
-                try:
-                    # 获取该股票的机构交易数据
-                    stock_inst = df_inst[df_inst['ts_code'] == row['ts_code']]
-                    
-                    # 处理买入机构
-                    buy_insts = stock_inst[stock_inst['side'] == 0]
-                    buy_inst_list = [
-                        f"{inst['exalter']}({round(inst['buy_rate']*100, 2)}%)"
-                        for _, inst in buy_insts.iterrows()
-                    ] if not buy_insts.empty else []
-                    
-                    # 处理卖出机构
-                    sell_insts = stock_inst[stock_inst['side'] == 1]
-                    sell_inst_list = [
-                        f"{inst['exalter']}({round(inst['sell_rate']*100, 2)}%)"
-                        for _, inst in sell_insts.iterrows()
-                    ] if not sell_insts.empty else []
-                    
-                    # 计算汇总数据
-                    buy_amount = buy_insts['buy'].sum() if not buy_insts.empty else 0
-                    sell_amount = sell_insts['sell'].sum() if not sell_insts.empty else 0
-                    net_buy_amount = stock_inst['net_buy'].sum() if not stock_inst.empty else 0
-                    
-                    processed_row = {
-                        "tsCode": str(row['ts_code']),
-                        "name": str(row['name']) if pd.notnull(row['name']) else "",
-                        "close": float(row['close']) if pd.notnull(row['close']) else 0.0,
-                        "change": float(row['pct_change']) if pd.notnull(row['pct_change']) else 0.0,
-                        "turnoverRate": float(row['turnover_rate']) if pd.notnull(row['turnover_rate']) else 0.0,
-                        "amount": float(row['amount'] / 100000000),
-                        "reason": str(row['reason']) if pd.notnull(row['reason']) else "",
-                        "buyAmount": float(buy_amount / 100000000),
-                        "sellAmount": float(sell_amount / 100000000),
-                        "netBuyAmount": float(net_buy_amount / 100000000),
-                        "buyInst": buy_inst_list,
-                        "sellInst": sell_inst_list,
-                        "netRate": float(row['net_rate']) if pd.notnull(row['net_rate']) else 0.0,
-                        "netAmount": float(row['net_amount'] / 100000000) if pd.notnull(row['net_amount']) else 0.0,
-                        "totalTurnover": float(row['amount'] / 100000000) if pd.notnull(row['amount']) else 0.0
-                    }
-                    result.append(processed_row)
-                    logger.debug("Successfully processed row {}", _)
-                except Exception as e:
-                    logger.error("Error processing row {}: {}", _, str(e))
-                    logger.error("Problematic row data: {}", row)
-                    continue
+            # 处理数据：席位分组后按 ts_code 合并
+            seats = MarketReviewService._group_top_inst(df_inst)
+            result = serialize_frame(df_base, TOP_LIST_FIELDS)
+            for row in result:
+                stock_seats = seats.get(row['tsCode'])
+                if stock_seats is None:
+                    stock_seats = _empty_seats()
+                row.update({
+                    "buyAmount": stock_seats["buyAmount"] / YI,
+                    "sellAmount": stock_seats["sellAmount"] / YI,
+                    "netBuyAmount": stock_seats["netBuyAmount"] / YI,
+                    "buyInst": stock_seats["buyInst"],
+                    "sellInst": stock_seats["sellInst"]
+                })
             
             logger.debug("Successfully processed {} records", len(result))
             return result
@@ -306,6 +399,52 @@ class MarketReviewService:
             raise
 
     @staticmethod
+    def _group_top_inst(df_inst: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+        """一次遍历按 ts_code 和买卖方向分组机构席位
+
+        保持查询结果的顺序（买入按买入额、卖出按卖出额降序），
+        金额中的空值按 0 计入汇总。
+        """
+        seats: Dict[str, Dict[str, Any]] = {}
+        if df_inst.empty:
+            return seats
+
+        side = pd.to_numeric(df_inst['side'], errors='coerce').to_numpy()
+        buy = np.nan_to_num(pd.to_numeric(df_inst['buy'], errors='coerce').to_numpy(dtype=float))
+        sell = np.nan_to_num(pd.to_numeric(df_inst['sell'], errors='coerce').to_numpy(dtype=float))
+        net_buy = np.nan_to_num(pd.to_numeric(df_inst['net_buy'], errors='coerce').to_numpy(dtype=float))
+        # 买入席位取 buy_rate，卖出席位取 sell_rate
+        rate = np.where(side == 0,
+                        pd.to_numeric(df_inst['buy_rate'], errors='coerce').to_numpy(dtype=float),
+                        pd.to_numeric(df_inst['sell_rate'], errors='coerce').to_numpy(dtype=float))
+
+        for ts_code, s, exalter, r, b, sl, nb in zip(
+            df_inst['ts_code'].tolist(), side.tolist(), df_inst['exalter'].tolist(),
+            rate.tolist(), buy.tolist(), sell.tolist(), net_buy.tolist()
+        ):
+            stock_seats = seats.get(ts_code)
+            if stock_seats is None:
+                stock_seats = seats[ts_code] = _empty_seats()
+            if s == 0:
+                stock_seats["buyInst"].append(f"{exalter}({round(r * 100, 2)}%)")
+                stock_seats["buyAmount"] += b
+            elif s == 1:
+                stock_seats["sellInst"].append(f"{exalter}({round(r * 100, 2)}%)")
+                stock_seats["sellAmount"] += sl
+            stock_seats["netBuyAmount"] += nb
+        return seats
+
+    @staticmethod
+    def _serialize_aggregated_top_list(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """输出 Postgres 预聚合的龙虎榜结果"""
+        result = serialize_frame(df, TOP_LIST_FIELDS + TOP_LIST_SEAT_FIELDS)
+        for row in result:
+            row["buyInst"] = _json_list(row["buyInst"])
+            row["sellInst"] = _json_list(row["sellInst"])
+        return result
+
+    @staticmethod
+    @cached(CACHE_PREFIX)
     async def get_limit_up(
         trade_date: str,
         limit_times: Optional[int] = None,
@@ -350,41 +489,14 @@ class MarketReviewService:
                 
             logger.info("Executing SQL with params: {}", params)
             
-            with engine.connect() as conn:
-                result = conn.execute(sql, params)
-                rows = result.fetchall()
+            df = await read_sql(sql, params)
             
-            if not rows:
+            if df.empty:
                 logger.warning("No limit up data found for date: {} with filters", trade_date)
                 return []
             
             # 处理数据
-            result = []
-            for row in rows:
-                try:
-                    processed_row = {
-                        "stockCode": str(row.ts_code),
-                        "stockName": str(row.name) if row.name else "",
-                        "limitUpTime": str(row.lu_time) if row.lu_time else "",
-                        "limitUpReason": str(row.lu_desc) if row.lu_desc else "",
-                        "turnoverRate": MarketReviewService.process_float(row.turnover_rate),
-                        "amount": MarketReviewService.process_float(row.amount),
-                        "status": str(row.status) if row.status else "",
-                        "theme": str(row.theme) if row.theme else "",
-                        "netChange": MarketReviewService.process_float(row.net_change),
-                        "bidAmount": MarketReviewService.process_float(row.bid_amount),
-                        "bidTurnover": MarketReviewService.process_float(row.bid_turnover),
-                        "freeFloat": MarketReviewService.process_float(row.free_float),
-                        "limitTimes": int(row.limit_times) if row.limit_times else 0,
-                        "upStat": str(row.up_stat) if row.up_stat else ""
-                    }
-                    result.append(processed_row)
-                    logger.debug("Successfully processed limit up row")
-                except Exception as e:
-                    logger.error("Error processing limit up row: {}", str(e))
-                    logger.error("Problematic row: {}", row)
-                    continue
-            
+            result = serialize_frame(df, LIMIT_UP_FIELDS)
             logger.debug("Successfully processed {} limit up stocks", len(result))
             return result
         except Exception as e:
@@ -393,6 +505,7 @@ class MarketReviewService:
             raise
 
     @staticmethod
+    @cached(CACHE_PREFIX)
     async def get_technical(trade_date: str) -> List[Dict[str, Any]]:
         """获取技术指标数据"""
         logger.info(f"Getting technical data for date: {trade_date}")
@@ -430,14 +543,15 @@ class MarketReviewService:
             logger.debug(f"Executing SQL: {sql}")
             logger.debug(f"Parameters: {{'trade_date': {trade_date}}}")
             
-            df = pd.read_sql(sql, engine, params={'trade_date': trade_date})
+            df = await read_sql(sql, {'trade_date': trade_date})
             logger.debug(f"Query result shape: {df.shape}")
-            return df.to_dict('records')
+            return clean_records(df)
         except Exception as e:
             logger.error(f"Error getting technical data: {str(e)}")
             raise
 
     @staticmethod
+    @cached(CACHE_PREFIX)
     async def get_concepts(trade_date: str) -> List[Dict[str, Any]]:
         """获取概念题材数据"""
         logger.info("Getting concept data for date: {}", trade_date)
@@ -457,7 +571,7 @@ class MarketReviewService:
             logger.debug("With parameters: {}", {'trade_date': trade_date})
             
             # 先测试基础查询是否正常
-            df_base = pd.read_sql(base_sql, engine, params={'trade_date': trade_date})
+            df_base = await read_sql(base_sql, {'trade_date': trade_date})
             logger.debug("Base query result shape: {}", df_base.shape)
             
             if df_base.empty:
@@ -478,37 +592,22 @@ class MarketReviewService:
             """
             
             logger.debug("Executing cons SQL: {}", cons_sql)
-            df_cons = pd.read_sql(cons_sql, engine, params={'trade_date': trade_date})
+            df_cons = await read_sql(cons_sql, {'trade_date': trade_date})
             logger.debug("Cons query result shape: {}", df_cons.shape)
             
             # 3. 合并数据
             df = pd.merge(df_base, df_cons, on='ts_code', how='left')
             logger.debug("Merged DataFrame shape: {}", df.shape)
             
-            # 4. 处理数据
-            result = []
-            for _, row in df.iterrows():
-                try:
-                    processed_row = {
-                        "tsCode": str(row['ts_code']),
-                        "conceptName": str(row['name']),
-                        "stockCount": int(row['stock_count']) if pd.notnull(row['stock_count']) else 0,
-                        "limitUpCount": int(row['z_t_num']) if pd.notnull(row['z_t_num']) else 0,
-                        "upCount": int(row['up_num']) if pd.notnull(row['up_num']) else 0,
-                        "leadingStocks": str(row['cons_list']).split(',') if pd.notnull(row['cons_list']) else [],
-                        "hotNum": int(row['hot_num']) if pd.notnull(row['hot_num']) else 0,
-                        "description": str(row['description']) if pd.notnull(row['description']) else ""
-                    }
-                    result.append(processed_row)
-                    logger.debug("Successfully processed concept row")
-                except Exception as e:
-                    logger.error("Error processing concept row: {}", str(e))
-                    logger.error("Problematic row: {}", row.to_dict())
-                    continue
-            
-            # 5. 排序并限制返回数量
-            result.sort(key=lambda x: (-x['limitUpCount'], -x['upCount']))
-            result = result[:30]
+            # 4. 排序并限制返回数量（缺失的涨停数/上涨数按 0 参与排序）
+            df[['z_t_num', 'up_num']] = df[['z_t_num', 'up_num']].apply(pd.to_numeric, errors='coerce').fillna(0)
+            df = df.sort_values(['z_t_num', 'up_num'], ascending=False, kind='stable').head(30)
+            
+            # 5. 处理数据
+            df['leading_stocks'] = [
+                cons.split(',') if isinstance(cons, str) else [] for cons in df['cons_list']
+            ]
+            result = serialize_frame(df, CONCEPT_FIELDS)
             
             logger.debug("Successfully processed {} concepts", len(result))
             return result
@@ -519,29 +618,49 @@ class MarketReviewService:
             raise
 
     @staticmethod
+    @cached(CACHE_PREFIX, cache_if=lambda review: not review.get("partial"))
     async def get_daily_review(trade_date: str) -> Dict[str, Any]:
-        """获取完整的每日复盘数据"""
-        try:
-            overview = await MarketReviewService.get_market_overview(trade_date)
-            sector_flow = await MarketReviewService.get_sector_flow(trade_date)
-            top_list = await MarketReviewService.get_top_list(trade_date)
-            concepts = await MarketReviewService.get_concepts(trade_date)
-            limit_up = await MarketReviewService.get_limit_up(trade_date)
-            technical = await MarketReviewService.get_technical(trade_date)
-            
-            return {
-                "date": trade_date,
-                "market_overview": overview,
-                "sector_flow": sector_flow,
-                "top_list": top_list,
-                "concepts": concepts,
-                "limit_up": limit_up,
-                "technical": technical
-            }
-        except Exception as e:
-            raise Exception(f"Error generating daily review: {str(e)}")
+        """获取完整的每日复盘数据
+
+        各部分并发执行，每部分单独设置超时；个别部分失败或超时时返回其余部分，
+        失败部分置为 None 并在 errors 中说明原因（部分结果不写入缓存）。
+        """
+        sections = {
+            "market_overview": MarketReviewService.get_market_overview,
+            "sector_flow": MarketReviewService.get_sector_flow,
+            "top_list": MarketReviewService.get_top_list,
+            "concepts": MarketReviewService.get_concepts,
+            "limit_up": MarketReviewService.get_limit_up,
+            "technical": MarketReviewService.get_technical
+        }
+        results = await asyncio.gather(*[
+            asyncio.wait_for(section(trade_date), timeout=settings.DAILY_REVIEW_SECTION_TIMEOUT)
+            for section in sections.values()
+        ], return_exceptions=True)
+
+        review = {"date": trade_date}
+        errors = {}
+        for name, result in zip(sections, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.error("Daily review section {} timed out for date: {}", name, trade_date)
+                errors[name] = "timeout"
+                review[name] = None
+            elif isinstance(result, Exception):
+                logger.error("Daily review section {} failed for date {}: {}", name, trade_date, str(result))
+                errors[name] = str(result)
+                review[name] = None
+            else:
+                review[name] = result
+
+        if len(errors) == len(sections):
+            raise Exception(f"Error generating daily review: {errors}")
+
+        review["partial"] = bool(errors)
+        review["errors"] = errors
+        return review
 
     @staticmethod
+    @cached(CACHE_PREFIX)
     async def get_concept_stocks(trade_date: str, code: str) -> List[Dict[str, Any]]:
         """获取概念成分股数据"""
         logger.info("Getting concept stocks for date: {} concept code: {}", trade_date, code)
@@ -573,27 +692,13 @@ class MarketReviewService:
                 'concept_code': code
             }
             
-            df = pd.read_sql(stocks_sql, engine, params=params)
+            df = await read_sql(stocks_sql, params)
             logger.debug("Found {} stocks for concept", len(df))
             
             if df.empty:
                 return []
             
-            result = []
-            for _, row in df.iterrows():
-                processed_row = {
-                    "ts_code": str(row['ts_code']),
-                    "name": str(row['name']) if pd.notnull(row['name']) else "",
-                    "pct_chg": float(row['pct_chg']) if pd.notnull(row['pct_chg']) else 0.0,
-                    "amount": float(row['amount']) if pd.notnull(row['amount']) else 0.0,
-                    "turnover_rate": float(row['turnover_rate']) if pd.notnull(row['turnover_rate']) else 0.0,
-                    "status": str(row['status']) if pd.notnull(row['status']) else "",
-                    "lu_time": str(row['lu_time']) if pd.notnull(row['lu_time']) else "",
-                    "lu_desc": str(row['lu_desc']) if pd.notnull(row['lu_desc']) else ""
-                }
-                result.append(processed_row)
-            
-            return result
+            return serialize_frame(df, CONCEPT_STOCK_FIELDS)
             
         except Exception as e:
             logger.error("Error getting concept stocks: {}", str(e))
@@ -627,8 +732,8 @@ class MarketReviewService:
             WHERE l.ts_code = :ts_code AND l.trade_date = :trade_date
             """)
             
-            with engine.connect() as conn:
-                result = conn.execute(sql, {"ts_code": ts_code, "trade_date": trade_date})
+            async with async_engine.connect() as conn:
+                result = await conn.execute(sql, {"ts_code": ts_code, "trade_date": trade_date})
                 row = result.fetchone()
                 
             if not row:
@@ -667,8 +772,8 @@ class MarketReviewService:
             WHERE ts_code = :ts_code AND trade_date = :trade_date
             """)
             
-            with engine.connect() as conn:
-                result = conn.execute(limit_times_sql, {"ts_code": ts_code, "trade_date": trade_date})
+            async with async_engine.connect() as conn:
+                result = await conn.execute(limit_times_sql, {"ts_code": ts_code, "trade_date": trade_date})
                 row = result.fetchone()
                 
             if not row or not row.limit_times:
@@ -690,8 +795,8 @@ class MarketReviewService:
             LIMIT :limit_times
             """)
             
-            with engine.connect() as conn:
-                result = conn.execute(history_sql, {
+            async with async_engine.connect() as conn:
+                result = await conn.execute(history_sql, {
                     "ts_code": ts_code, 
                     "trade_date": trade_date,
                     "limit_times": limit_times
@@ -725,8 +830,8 @@ class MarketReviewService:
             LIMIT 30
             """)
             
-            with engine.connect() as conn:
-                result = conn.execute(sql, {"ts_code": ts_code, "trade_date": trade_date})
+            async with async_engine.connect() as conn:
+                result = await conn.execute(sql, {"ts_code": ts_code, "trade_date": trade_date})
                 rows = result.fetchall()
             
             if not rows:
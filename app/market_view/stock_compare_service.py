@@ -1,24 +1,282 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 import pandas as pd
 import numpy as np
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import execute, fetch_all, read_sql
+from app.core.trade_calendar import trade_calendar
+from app.core.cache import cached
+from app.market_view import correlation
+from app.market_view.daily_bar_store import get_daily_bar_store, to_int_date
+from app.utils.serializer import Field, FLOAT, INT, RAW, column_values, serialize_frame
+from app.utils import ranking
+
+# 相关性/beta 结果缓存键前缀
+CACHE_PREFIX = "stock_compare"
+
+# 对比接口使用的日线字段及输出名称
+COMPARE_FIELDS = [
+    "open", "high", "low", "close", "vol", "amount", "pct_chg",
+    "turnover_rate_f", "volume_ratio", "brar_ar_bfq", "brar_br_bfq", "psy_bfq", "psyma_bfq"
+]
+COMPARE_FIELD_NAMES = {
+    "vol": "volume",
+    "turnover_rate_f": "turnover_rate",
+    "brar_ar_bfq": "brar_ar",
+    "brar_br_bfq": "brar_br",
+    "psy_bfq": "psy",
+    "psyma_bfq": "psyma",
+}
+
+# 批量对比可选的日线字段（stock_daily 列名）
+BATCH_COMPARE_FIELDS = ("open", "high", "low", "close", "vol", "amount", "pct_chg")
+
+
+def _align(dates: np.ndarray, values: Dict[str, np.ndarray], axis: np.ndarray) -> Dict[str, np.ndarray]:
+    """将 (股票 × dates) 矩阵对齐到交易日历 axis，缺失的日期为 NaN"""
+    positions = np.searchsorted(dates, axis)
+    positions = np.minimum(positions, max(len(dates) - 1, 0))
+    found = (dates[positions] == axis) if len(dates) else np.zeros(len(axis), dtype=bool)
+    aligned = {}
+    for field, matrix in values.items():
+        result = np.full((matrix.shape[0], len(axis)), np.nan)
+        result[:, found] = matrix[:, positions[found]]
+        aligned[field] = result
+    return aligned
+
+
+def _forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """按行向后填充 NaN（停牌日沿用最近一个交易日的值），首个有效值之前保持 NaN"""
+    index = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return matrix[np.arange(matrix.shape[0])[:, None], index]
+
+
+# 星期规律分析的数值列（缺失、无效值按 0 处理）
+PATTERN_NUMERIC_COLUMNS = [
+    'open', 'high', 'low', 'close', 'vol', 'amount', 'pct_chg',
+    'net_amount', 'net_amount_rate', 'buy_elg_amount', 'buy_lg_amount',
+    'buy_md_amount', 'buy_sm_amount', 'buy_elg_amount_rate',
+    'buy_lg_amount_rate', 'buy_md_amount_rate', 'buy_sm_amount_rate'
+]
+
+# 资金流向输出名 -> moneyflow_dc 列
+PATTERN_MONEY_FLOW = {
+    "net_amount": "net_amount",
+    "super_large": "buy_elg_amount",
+    "large": "buy_lg_amount",
+    "medium": "buy_md_amount",
+    "small": "buy_sm_amount"
+}
+
+# 周度分析每日明细：输出名 -> 列
+WEEKLY_DETAIL_FIELDS = [
+    Field('trade_date', 'trade_date', RAW),
+    Field('open', 'open', RAW),
+    Field('high', 'high', RAW),
+    Field('low', 'low', RAW),
+    Field('close', 'close', RAW),
+    Field('volume', 'volume', RAW),
+    Field('pct_chg', 'pct_chg', RAW),
+    Field('turnover_rate_f', 'turnover_rate', RAW),
+    Field('volume_ratio', 'volume_ratio', RAW),
+    Field('brar_ar_bfq', 'brar_ar', RAW),
+    Field('brar_br_bfq', 'brar_br', RAW),
+    Field('psy_bfq', 'psy', RAW),
+    Field('psyma_bfq', 'psyma', RAW),
+    Field('net_mf_amount', 'net_flow', RAW)
+]
+
+
+def _add_week_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """添加 weekday（与 PostgreSQL DOW 一致，周一 = 1）和 ISO 年-周（IYYY-IW）列"""
+    dates = pd.to_datetime(df['trade_date'].astype(str).str.replace('-', '', regex=False), format='%Y%m%d')
+    iso = dates.dt.isocalendar()
+    df['weekday'] = ((dates.dt.dayofweek + 1) % 7).astype(int)
+    df['yearweek'] = iso['year'].astype(str) + '-' + iso['week'].astype(str).str.zfill(2)
+    return df
+
+
+def _grouped(df: pd.DataFrame, by: List[str]):
+    """by 为空时整体作为一组"""
+    return df.groupby(by, sort=False) if by else df.groupby(np.zeros(len(df), dtype=int))
+
+
+def _period_summaries(df: pd.DataFrame, by: List[str]) -> Dict[Any, Dict[str, Any]]:
+    """区间整体统计：{分组键: 统计}，by 为空时键为 0"""
+    stats = _grouped(df.assign(up=df['pct_chg'] > 0, down=df['pct_chg'] < 0), by).agg(
+        total_days=('pct_chg', 'size'),
+        up_days=('up', 'sum'),
+        down_days=('down', 'sum'),
+        avg_daily_vol=('vol', 'mean'),
+        avg_daily_amount=('amount', 'mean'),
+        max_up=('pct_chg', 'max'),
+        max_down=('pct_chg', 'min')
+    )
+    stats['win_rate'] = stats['up_days'] / stats['total_days'] * 100
+    columns = {
+        'total_days': column_values(stats['total_days'], INT),
+        'up_days': column_values(stats['up_days'], INT),
+        'down_days': column_values(stats['down_days'], INT),
+        'avg_daily_vol': column_values(stats['avg_daily_vol']),
+        'avg_daily_amount': column_values(stats['avg_daily_amount']),
+        'max_up': column_values(stats['max_up']),
+        'max_down': column_values(stats['max_down']),
+        'win_rate': column_values(stats['win_rate'])
+    }
+    return {key: dict(zip(columns, values)) for key, *values in zip(stats.index.tolist(), *columns.values())}
+
+
+def _weekday_patterns(df: pd.DataFrame, by: List[str]) -> Dict[Any, List[Dict[str, Any]]]:
+    """周一至周五各自的涨跌、成交和资金流向特征：{分组键: [各星期统计]}"""
+    workdays = df[df['weekday'].between(1, 5)]
+    keys = by + ['weekday'] if by else ['weekday']
+    stats = workdays.assign(up=workdays['pct_chg'] > 0, down=workdays['pct_chg'] < 0).groupby(keys).agg(
+        trading_count=('pct_chg', 'size'),
+        up_count=('up', 'sum'),
+        down_count=('down', 'sum'),
+        avg_chg=('pct_chg', 'mean'),
+        max_up=('pct_chg', 'max'),
+        max_down=('pct_chg', 'min'),
+        avg_vol=('vol', 'mean'),
+        avg_amount=('amount', 'mean'),
+        **{name: (col, 'mean') for name, col in PATTERN_MONEY_FLOW.items()}
+    ).reset_index()
+
+    group_keys = stats[by[0]].tolist() if by else [0] * len(stats)
+    int_columns = ['weekday', 'trading_count', 'up_count', 'down_count']
+    float_columns = ['avg_chg', 'max_up', 'max_down', 'avg_vol', 'avg_amount']
+    columns = {col: column_values(stats[col], INT) for col in int_columns}
+    columns.update({col: column_values(stats[col]) for col in float_columns})
+    flows = {name: column_values(stats[name]) for name in PATTERN_MONEY_FLOW}
+
+    result: Dict[Any, List[Dict[str, Any]]] = {} if by else {0: []}
+    for i, key in enumerate(group_keys):
+        pattern = {col: values[i] for col, values in columns.items()}
+        pattern["money_flow"] = {name: values[i] for name, values in flows.items()}
+        result.setdefault(key, []).append(pattern)
+    return result
+
+
+def _weekly_trends(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """单只股票逐周的涨跌、成交和资金流向汇总及每日明细"""
+    grouped = df.groupby('yearweek')
+    stats = grouped.agg(
+        avg_chg=('pct_chg', 'mean'),
+        total_vol=('vol', 'sum'),
+        total_amount=('amount', 'sum'),
+        **{name: (col, 'sum') for name, col in PATTERN_MONEY_FLOW.items()}
+    )
+    daily = [
+        {"date": date, "weekday": weekday, "pct_chg": pct_chg, "amount": amount}
+        for date, weekday, pct_chg, amount in zip(
+            df['trade_date'].tolist(), column_values(df['weekday'], INT),
+            column_values(df['pct_chg']), column_values(df['amount'])
+        )
+    ]
+    positions = grouped.indices
+    columns = {col: column_values(stats[col]) for col in ['avg_chg', 'total_vol', 'total_amount']}
+    flows = {name: column_values(stats[name]) for name in PATTERN_MONEY_FLOW}
+    trends = []
+    for i, yearweek in enumerate(stats.index.tolist()):
+        trend = {"yearweek": str(yearweek)}
+        trend.update({col: values[i] for col, values in columns.items()})
+        trend["money_flow"] = {name: values[i] for name, values in flows.items()}
+        trend["daily_stats"] = [daily[j] for j in positions[yearweek]]
+        trends.append(trend)
+    return trends
+
+
+def _weekly_analysis(df: pd.DataFrame) -> Dict[str, Any]:
+    """按 年-周 × 星期 一次分组聚合，生成 {年-周: {weekdays, summary}}"""
+    df = _add_week_columns(df)
+    for col in ('pct_chg', 'volume', 'turnover_rate_f', 'volume_ratio', 'net_mf_amount',
+                'small_flow', 'medium_flow', 'large_flow', 'extra_large_flow'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.assign(up=df['pct_chg'] > 0, down=df['pct_chg'] < 0)
+    grouped = df.groupby(['yearweek', 'weekday'])
+    stats = grouped.agg(
+        day_count=('pct_chg', 'size'),
+        up_days=('up', 'sum'),
+        down_days=('down', 'sum'),
+        avg_pct_chg=('pct_chg', 'mean'),
+        avg_volume=('volume', 'mean'),
+        avg_turnover=('turnover_rate_f', 'mean'),
+        avg_volume_ratio=('volume_ratio', 'mean'),
+        avg_net_flow=('net_mf_amount', 'mean'),
+        small_flow=('small_flow', 'mean'),
+        medium_flow=('medium_flow', 'mean'),
+        large_flow=('large_flow', 'mean'),
+        extra_large_flow=('extra_large_flow', 'mean')
+    )
+    # 空值按 0 输出
+    values = {col: column_values(stats[col], INT if col in ('day_count', 'up_days', 'down_days') else FLOAT)
+              for col in stats.columns}
+    details = serialize_frame(df, WEEKLY_DETAIL_FIELDS)
+    positions = grouped.indices
+
+    weekly_analysis: Dict[str, Any] = {}
+    for i, (year_week, weekday) in enumerate(stats.index.tolist()):
+        week = weekly_analysis.setdefault(year_week, {
+            "weekdays": {},
+            "summary": {
+                "up_days": 0,
+                "down_days": 0,
+                "total_days": 0,
+                "avg_volume": 0,
+                "avg_turnover": 0,
+                "avg_net_flow": 0
+            }
+        })
+        week["weekdays"][weekday] = {
+            "day_count": values['day_count'][i],
+            "up_days": values['up_days'][i],
+            "down_days": values['down_days'][i],
+            "avg_pct_chg": values['avg_pct_chg'][i],
+            "avg_volume": values['avg_volume'][i],
+            "avg_turnover": values['avg_turnover'][i],
+            "avg_volume_ratio": values['avg_volume_ratio'][i],
+            "avg_net_flow": values['avg_net_flow'][i],
+            "flow_distribution": {
+                "small": values['small_flow'][i],
+                "medium": values['medium_flow'][i],
+                "large": values['large_flow'][i],
+                "extra_large": values['extra_large_flow'][i]
+            },
+            "daily_details": [details[j] for j in positions[(year_week, weekday)]]
+        }
+        summary = week["summary"]
+        summary["up_days"] += values['up_days'][i]
+        summary["down_days"] += values['down_days'][i]
+        summary["total_days"] += values['day_count'][i]
+        summary["avg_volume"] += values['avg_volume'][i]
+        summary["avg_turnover"] += values['avg_turnover'][i]
+        summary["avg_net_flow"] += values['avg_net_flow'][i]
+
+    # 计算周平均值
+    for week in weekly_analysis.values():
+        summary = week["summary"]
+        if summary["total_days"] > 0:
+            summary["avg_volume"] /= summary["total_days"]
+            summary["avg_turnover"] /= summary["total_days"]
+            summary["avg_net_flow"] /= summary["total_days"]
+    return weekly_analysis
+
 
 class StockCompareService:
-    def __init__(self, db: Session = None):
-        self.db = next(get_db()) if db is None else db
+    def __init__(self, db: AsyncSession = None):
+        self.db = db
 
     @classmethod
-    def get_stock_info(cls, ts_code: str):
+    async def get_stock_info(cls, ts_code: str):
         """获取股票基本信息"""
-        db = next(get_db())
         stock_info_query = text("""
             SELECT ts_code, name, industry, market
             FROM stock_basic 
             WHERE ts_code = :ts_code
         """)
-        stock_info_row = db.execute(stock_info_query, {"ts_code": ts_code}).fetchone()
+        stock_info_row = (await execute(stock_info_query, {"ts_code": ts_code})).fetchone()
         stock_info = {
             "ts_code": stock_info_row.ts_code,
             "name": stock_info_row.name,
@@ -28,108 +286,86 @@ class StockCompareService:
         return stock_info
 
     @classmethod
-    def get_stock_comparison(cls, ts_code: str, compare_codes: List[str], start_date: str, end_date: str):
+    def _get_daily_from_store(cls, ts_code: str, start_date: str, end_date: str):
+        """从日线列式存储读取对比所需的日线数据，存储不可用时返回 None"""
+        store = get_daily_bar_store()
+        if store is None or not store.covers(end_date) or not store.has(ts_code):
+            return None
+
+        window = store.window(ts_code, start_date, end_date)
+        daily_list = window.records(COMPARE_FIELDS, rename=COMPARE_FIELD_NAMES)
+        close = window["close"][window.valid]
+        relative_chg = ((close - close[0]) / close[0] * 100).tolist() if len(close) else []
+        for daily_dict, chg in zip(daily_list, relative_chg):
+            daily_dict["relative_chg"] = chg
+        return daily_list
+
+    @classmethod
+    async def _get_daily_list(cls, ts_code: str, start_date: str, end_date: str):
+        """获取单只股票的日线数据及相对涨跌幅"""
+        daily_list = cls._get_daily_from_store(ts_code, start_date, end_date)
+        if daily_list is not None:
+            return daily_list
+
+        rows = (await execute(
+            text("""
+                SELECT d.trade_date, d.open, d.high, d.low, d.close, 
+                       d.vol, d.amount, d.pct_chg,
+                       f.turnover_rate_f, f.volume_ratio, 
+                       f.brar_ar_bfq, f.brar_br_bfq, f.psy_bfq, f.psyma_bfq
+                FROM stock_daily d
+                LEFT JOIN stk_factor_pro f ON d.ts_code = f.ts_code AND d.trade_date = f.trade_date
+                WHERE d.ts_code = :ts_code 
+                AND d.trade_date BETWEEN :start_date AND :end_date
+                ORDER BY d.trade_date
+            """),
+            {"ts_code": ts_code, "start_date": start_date, "end_date": end_date}
+        )).fetchall()
+
+        # 计算相对涨跌幅
+        daily_list = []
+        base_price = None
+        for row in rows:
+            daily_dict = {
+                "trade_date": row.trade_date,
+                "open": float(row.open),
+                "high": float(row.high),
+                "low": float(row.low),
+                "close": float(row.close),
+                "volume": float(row.vol),
+                "amount": float(row.amount),
+                "pct_chg": float(row.pct_chg),
+                "turnover_rate": float(row.turnover_rate_f) if row.turnover_rate_f else None,
+                "volume_ratio": float(row.volume_ratio) if row.volume_ratio else None,
+                "brar_ar": float(row.brar_ar_bfq) if row.brar_ar_bfq else None,
+                "brar_br": float(row.brar_br_bfq) if row.brar_br_bfq else None,
+                "psy": float(row.psy_bfq) if row.psy_bfq else None,
+                "psyma": float(row.psyma_bfq) if row.psyma_bfq else None
+            }
+            
+            if base_price is None:
+                base_price = daily_dict["close"]
+                daily_dict["relative_chg"] = 0
+            else:
+                daily_dict["relative_chg"] = (daily_dict["close"] - base_price) / base_price * 100
+            
+            daily_list.append(daily_dict)
+        return daily_list
+
+    @classmethod
+    async def get_stock_comparison(cls, ts_code: str, compare_codes: List[str], start_date: str, end_date: str):
         """获取股票对比数据"""
         try:
-            db = next(get_db())
-            
             # 基准股票数据
-            base_stock = cls.get_stock_info(ts_code)
-            base_daily = db.execute(
-                text("""
-                    SELECT d.trade_date, d.open, d.high, d.low, d.close, 
-                           d.vol, d.amount, d.pct_chg,
-                           f.turnover_rate_f, f.volume_ratio, 
-                           f.brar_ar_bfq, f.brar_br_bfq, f.psy_bfq, f.psyma_bfq
-                    FROM stock_daily d
-                    LEFT JOIN stk_factor_pro f ON d.ts_code = f.ts_code AND d.trade_date = f.trade_date
-                    WHERE d.ts_code = :ts_code 
-                    AND d.trade_date BETWEEN :start_date AND :end_date
-                    ORDER BY d.trade_date
-                """),
-                {"ts_code": ts_code, "start_date": start_date, "end_date": end_date}
-            ).fetchall()
-
-            # 计算基准股票的相对涨跌幅
-            base_daily_list = []
-            base_price = None
-            for row in base_daily:
-                daily_dict = {
-                    "trade_date": row.trade_date,
-                    "open": float(row.open),
-                    "high": float(row.high),
-                    "low": float(row.low),
-                    "close": float(row.close),
-                    "volume": float(row.vol),
-                    "amount": float(row.amount),
-                    "pct_chg": float(row.pct_chg),
-                    "turnover_rate": float(row.turnover_rate_f) if row.turnover_rate_f else None,
-                    "volume_ratio": float(row.volume_ratio) if row.volume_ratio else None,
-                    "brar_ar": float(row.brar_ar_bfq) if row.brar_ar_bfq else None,
-                    "brar_br": float(row.brar_br_bfq) if row.brar_br_bfq else None,
-                    "psy": float(row.psy_bfq) if row.psy_bfq else None,
-                    "psyma": float(row.psyma_bfq) if row.psyma_bfq else None
-                }
-                
-                if base_price is None:
-                    base_price = daily_dict["close"]
-                    daily_dict["relative_chg"] = 0
-                else:
-                    daily_dict["relative_chg"] = (daily_dict["close"] - base_price) / base_price * 100
-                
-                base_daily_list.append(daily_dict)
-
-            base_stock["daily"] = base_daily_list
+            base_stock = await cls.get_stock_info(ts_code)
+            base_stock["daily"] = await cls._get_daily_list(ts_code, start_date, end_date)
             base_stock["limit"] = []
 
             # 获取对比股票数据
             compare_stocks = []
             for compare_code in compare_codes:
-                compare_stock = cls.get_stock_info(compare_code)
-                compare_daily = db.execute(
-                    text("""
-                        SELECT d.trade_date, d.open, d.high, d.low, d.close, 
-                               d.vol, d.amount, d.pct_chg,
-                               f.turnover_rate_f, f.volume_ratio, 
-                               f.brar_ar_bfq, f.brar_br_bfq, f.psy_bfq, f.psyma_bfq
-                        FROM stock_daily d
-                        LEFT JOIN stk_factor_pro f ON d.ts_code = f.ts_code AND d.trade_date = f.trade_date
-                        WHERE d.ts_code = :ts_code 
-                        AND d.trade_date BETWEEN :start_date AND :end_date
-                        ORDER BY d.trade_date
-                    """),
-                    {"ts_code": compare_code, "start_date": start_date, "end_date": end_date}
-                ).fetchall()
-
-                compare_daily_list = []
-                compare_price = None
-                for row in compare_daily:
-                    daily_dict = {
-                        "trade_date": row.trade_date,
-                        "open": float(row.open),
-                        "high": float(row.high),
-                        "low": float(row.low),
-                        "close": float(row.close),
-                        "volume": float(row.vol),
-                        "amount": float(row.amount),
-                        "pct_chg": float(row.pct_chg),
-                        "turnover_rate": float(row.turnover_rate_f) if row.turnover_rate_f else None,
-                        "volume_ratio": float(row.volume_ratio) if row.volume_ratio else None,
-                        "brar_ar": float(row.brar_ar_bfq) if row.brar_ar_bfq else None,
-                        "brar_br": float(row.brar_br_bfq) if row.brar_br_bfq else None,
-                        "psy": float(row.psy_bfq) if row.psy_bfq else None,
-                        "psyma": float(row.psyma_bfq) if row.psyma_bfq else None
-                    }
-                    
-                    if compare_price is None:
-                        compare_price = daily_dict["close"]
-                        daily_dict["relative_chg"] = 0
-                    else:
-                        daily_dict["relative_chg"] = (daily_dict["close"] - compare_price) / compare_price * 100
-                    
-                    compare_daily_list.append(daily_dict)
-
-                compare_stock["daily"] = compare_daily_list
+                compare_stock = await cls.get_stock_info(compare_code)
+                compare_stock["daily"] = await cls._get_daily_list(compare_code, start_date, end_date)
                 compare_stock["limit"] = []
                 compare_stocks.append(compare_stock)
 
@@ -143,146 +379,209 @@ class StockCompareService:
             raise e
 
     @classmethod
-    def get_weekly_analysis(cls, ts_code: str, start_date: str, end_date: str):
+    async def _get_batch_matrix(cls, ts_codes: List[str], fields: List[str], start_date: str,
+                                end_date: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """读取多只股票的 (股票 × 交易日) 矩阵：优先日线存储，否则一次 ANY(:codes) 查询"""
+        store = get_daily_bar_store()
+        if store is not None and store.covers(end_date) and all(store.has(code) for code in ts_codes):
+            dates, values = store.matrix(ts_codes, fields, start_date, end_date)
+            return dates.astype(np.int64), values
+
+        df = await read_sql(text(f"""
+            SELECT ts_code, trade_date, {", ".join(fields)}
+            FROM stock_daily
+            WHERE ts_code = ANY(:codes)
+            AND trade_date BETWEEN :start_date AND :end_date
+        """), {"codes": ts_codes, "start_date": start_date, "end_date": end_date})
+
+        trade_dates = df["trade_date"].map(to_int_date).to_numpy(dtype=np.int64)
+        dates = np.unique(trade_dates)
+        rows = pd.Index(ts_codes).get_indexer(df["ts_code"])
+        cols = np.searchsorted(dates, trade_dates)
+        values = {}
+        for field in fields:
+            matrix = np.full((len(ts_codes), len(dates)), np.nan)
+            matrix[rows, cols] = pd.to_numeric(df[field], errors="coerce").to_numpy(np.float64)
+            values[field] = matrix
+        return dates, values
+
+    @classmethod
+    async def get_batch_comparison(cls, ts_codes: Sequence[str], start_date: str, end_date: str,
+                                   fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """批量对比多只股票的走势（列式输出）
+
+        所有股票对齐到同一组交易日：停牌日 suspended 为 True，relative_chg 沿用停牌前的值；
+        上市前（区间内首个交易日之前）的日期为 None。relative_chg 为相对区间内首个收盘价的涨跌幅（%）。
+        series 中每个字段为 (股票 × 交易日) 的二维数组，行顺序与 codes 一致。
+        """
+        codes = list(dict.fromkeys(code.strip().upper() for code in ts_codes if code and code.strip()))
+        if not codes:
+            raise ValueError("ts_codes 不能为空")
+        if len(codes) > settings.COMPARE_MAX_CODES:
+            raise ValueError(f"最多同时对比 {settings.COMPARE_MAX_CODES} 只股票")
+        fields = list(dict.fromkeys(fields or ("close", "pct_chg")))
+        invalid = [field for field in fields if field not in BATCH_COMPARE_FIELDS]
+        if invalid:
+            raise ValueError(f"不支持的字段: {', '.join(invalid)}")
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+
+        dates, values = await cls._get_batch_matrix(codes, list(dict.fromkeys(["close"] + fields)),
+                                                    start_date, end_date)
+
+        # 交易日历中的交易日 + 实际有数据的日期；日历为工作日近似时只保留有数据的日期
+        axis = dates
+        if trade_calendar.authoritative:
+            calendar_dates = np.array(trade_calendar.range(start_date, end_date), dtype=np.int64)
+            axis = np.union1d(calendar_dates, dates)
+        values = _align(dates, values, axis)
+
+        close = values["close"]
+        traded = ~np.isnan(close)
+        listed = np.logical_or.accumulate(traded, axis=1)
+        filled = _forward_fill(close)
+        first = np.take_along_axis(close, traded.argmax(axis=1)[:, None], axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relative_chg = (filled / first - 1) * 100
+
+        info_rows = await fetch_all(text("""
+            SELECT ts_code, name, industry, market
+            FROM stock_basic
+            WHERE ts_code = ANY(:codes)
+        """), {"codes": codes})
+        info = {row["ts_code"]: row for row in info_rows}
+
+        return {
+            "dates": axis.astype(str).tolist(),
+            "codes": codes,
+            "stocks": [info.get(code, {"ts_code": code, "name": None, "industry": None, "market": None})
+                       for code in codes],
+            "suspended": listed & ~traded,
+            "series": {
+                "relative_chg": relative_chg,
+                **{field: values[field] for field in fields}
+            }
+        }
+
+    @classmethod
+    async def _stock_names(cls, ts_codes: List[str]) -> Dict[str, Any]:
+        rows = await fetch_all(text("""
+            SELECT ts_code, name, industry
+            FROM stock_basic
+            WHERE ts_code = ANY(:codes)
+        """), {"codes": ts_codes})
+        return {row["ts_code"]: row for row in rows}
+
+    @classmethod
+    async def _ranked_stats(cls, matrix: "correlation.ReturnsMatrix", stats: "correlation.PairwiseStats",
+                            order_by: np.ndarray, top_k: int, descending: bool,
+                            exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        if exclude is not None:
+            order_by = order_by.copy()
+            order_by[matrix.codes == exclude] = np.nan
+        index = ranking.top_k(order_by, top_k, descending)
+        codes = matrix.codes[index].tolist()
+        names = await cls._stock_names(codes)
+        return [{
+            "ts_code": code,
+            "name": names.get(code, {}).get("name"),
+            "industry": names.get(code, {}).get("industry"),
+            "correlation": corr,
+            "beta": beta,
+            "observations": n
+        } for code, corr, beta, n in zip(
+            codes, stats.correlation[index].tolist(), stats.beta[index].tolist(),
+            stats.observations[index].tolist()
+        )]
+
+    @classmethod
+    @cached(CACHE_PREFIX)
+    async def get_correlated_stocks(cls, ts_code: str, trade_date: str, window: int = 60,
+                                    top_k: int = 20, descending: bool = True) -> Dict[str, Any]:
+        """全市场与 ts_code 收益率相关性最高（descending=False 时最低）的 top_k 只股票
+
+        以截至 trade_date 的 window 个交易日的日收益率计算，同时给出各股票对 ts_code 的 beta。
+        """
+        matrix = await correlation.get_returns_matrix(trade_date, window)
+        target = matrix.row(ts_code)
+        if target is None:
+            raise ValueError(f"{ts_code} 在 {trade_date} 前 {window} 个交易日内无行情数据")
+        stats = correlation.pairwise_stats(matrix.returns, target, correlation.min_periods(window))
+        start_date, end_date = correlation.window_bounds(trade_date, window)
+        return {
+            "ts_code": ts_code,
+            "start_date": start_date,
+            "end_date": end_date,
+            "window": window,
+            "stocks": await cls._ranked_stats(matrix, stats, stats.correlation, top_k,
+                                              descending, exclude=ts_code)
+        }
+
+    @classmethod
+    @cached(CACHE_PREFIX)
+    async def get_index_betas(cls, index_code: str, trade_date: str, window: int = 60,
+                              top_k: int = 50, descending: bool = True) -> Dict[str, Any]:
+        """全市场股票对指数 index_code 的 beta，返回 beta 最高（descending=False 时最低）的 top_k 只
+
+        指数收益率取自 index_daily；index_code 为个股代码时以该股票为基准。
+        """
+        matrix = await correlation.get_returns_matrix(trade_date, window)
+        target = await correlation.get_index_returns(index_code, matrix)
+        if target is None:
+            raise ValueError(f"{index_code} 在 {trade_date} 前 {window} 个交易日内无行情数据")
+        stats = correlation.pairwise_stats(matrix.returns, target, correlation.min_periods(window))
+        start_date, end_date = correlation.window_bounds(trade_date, window)
+        return {
+            "index_code": index_code,
+            "start_date": start_date,
+            "end_date": end_date,
+            "window": window,
+            "count": int(np.count_nonzero(~np.isnan(stats.beta))),
+            "median_beta": float(np.nanmedian(stats.beta)) if np.any(~np.isnan(stats.beta)) else None,
+            "stocks": await cls._ranked_stats(matrix, stats, stats.beta, top_k, descending,
+                                              exclude=index_code)
+        }
+
+    @classmethod
+    async def get_weekly_analysis(cls, ts_code: str, start_date: str, end_date: str):
         """获取股票的周度分析数据"""
         try:
-            db = next(get_db())
-            
             # 获取股票基本信息
-            stock_info = cls.get_stock_info(ts_code)
+            stock_info = await cls.get_stock_info(ts_code)
             
-            # 查询日线数据，包括技术指标和资金流向
-            daily_data = db.execute(
-                text("""
-                    WITH daily_stats AS (
-                        SELECT 
-                            d.trade_date,
-                            d.open,
-                            d.high,
-                            d.low,
-                            d.close,
-                            d.vol as volume,
-                            d.amount,
-                            d.pct_chg,
-                            EXTRACT(DOW FROM TO_DATE(d.trade_date, 'YYYYMMDD')) as day_of_week,
-                            TO_CHAR(TO_DATE(d.trade_date, 'YYYYMMDD'), 'IYYY-IW') as year_week,
-                            f.turnover_rate_f,
-                            f.volume_ratio,
-                            f.brar_ar_bfq,
-                            f.brar_br_bfq,
-                            f.psy_bfq,
-                            f.psyma_bfq,
-                            m.net_mf_amount,
-                            m.buy_sm_vol,
-                            m.sell_sm_vol,
-                            m.buy_md_vol,
-                            m.sell_md_vol,
-                            m.buy_lg_vol,
-                            m.sell_lg_vol,
-                            m.buy_elg_vol,
-                            m.sell_elg_vol
-                        FROM stock_daily d
-                        LEFT JOIN stk_factor_pro f ON d.ts_code = f.ts_code AND d.trade_date = f.trade_date
-                        LEFT JOIN moneyflow m ON d.ts_code = m.ts_code AND d.trade_date = m.trade_date
-                        WHERE d.ts_code = :ts_code 
-                        AND d.trade_date BETWEEN :start_date AND :end_date
-                    )
-                    SELECT 
-                        year_week,
-                        day_of_week,
-                        COUNT(*) as day_count,
-                        SUM(CASE WHEN pct_chg > 0 THEN 1 ELSE 0 END) as up_days,
-                        SUM(CASE WHEN pct_chg < 0 THEN 1 ELSE 0 END) as down_days,
-                        AVG(pct_chg) as avg_pct_chg,
-                        AVG(volume) as avg_volume,
-                        AVG(turnover_rate_f) as avg_turnover,
-                        AVG(volume_ratio) as avg_volume_ratio,
-                        AVG(net_mf_amount) as avg_net_flow,
-                        AVG(buy_sm_vol - sell_sm_vol) as small_flow,
-                        AVG(buy_md_vol - sell_md_vol) as medium_flow,
-                        AVG(buy_lg_vol - sell_lg_vol) as large_flow,
-                        AVG(buy_elg_vol - sell_elg_vol) as extra_large_flow,
-                        json_agg(json_build_object(
-                            'trade_date', trade_date,
-                            'open', open,
-                            'high', high,
-                            'low', low,
-                            'close', close,
-                            'volume', volume,
-                            'pct_chg', pct_chg,
-                            'turnover_rate', turnover_rate_f,
-                            'volume_ratio', volume_ratio,
-                            'brar_ar', brar_ar_bfq,
-                            'brar_br', brar_br_bfq,
-                            'psy', psy_bfq,
-                            'psyma', psyma_bfq,
-                            'net_flow', net_mf_amount
-                        ) ORDER BY trade_date) as daily_details
-                    FROM daily_stats
-                    GROUP BY year_week, day_of_week
-                    ORDER BY year_week, day_of_week
-                """),
-                {"ts_code": ts_code, "start_date": start_date, "end_date": end_date}
-            ).fetchall()
-
-            # 处理查询结果
-            weekly_analysis = {}
-            for row in daily_data:
-                year_week = row.year_week
-                if year_week not in weekly_analysis:
-                    weekly_analysis[year_week] = {
-                        "weekdays": {},
-                        "summary": {
-                            "up_days": 0,
-                            "down_days": 0,
-                            "total_days": 0,
-                            "avg_volume": 0,
-                            "avg_turnover": 0,
-                            "avg_net_flow": 0
-                        }
-                    }
-                
-                day_data = {
-                    "day_count": row.day_count,
-                    "up_days": row.up_days,
-                    "down_days": row.down_days,
-                    "avg_pct_chg": float(row.avg_pct_chg) if row.avg_pct_chg else 0,
-                    "avg_volume": float(row.avg_volume) if row.avg_volume else 0,
-                    "avg_turnover": float(row.avg_turnover) if row.avg_turnover else 0,
-                    "avg_volume_ratio": float(row.avg_volume_ratio) if row.avg_volume_ratio else 0,
-                    "avg_net_flow": float(row.avg_net_flow) if row.avg_net_flow else 0,
-                    "flow_distribution": {
-                        "small": float(row.small_flow) if row.small_flow else 0,
-                        "medium": float(row.medium_flow) if row.medium_flow else 0,
-                        "large": float(row.large_flow) if row.large_flow else 0,
-                        "extra_large": float(row.extra_large_flow) if row.extra_large_flow else 0
-                    },
-                    "daily_details": row.daily_details
-                }
-                
-                weekday = row.day_of_week
-                weekly_analysis[year_week]["weekdays"][weekday] = day_data
-                
-                # 更新周汇总数据
-                summary = weekly_analysis[year_week]["summary"]
-                summary["up_days"] += row.up_days
-                summary["down_days"] += row.down_days
-                summary["total_days"] += row.day_count
-                summary["avg_volume"] += float(row.avg_volume) if row.avg_volume else 0
-                summary["avg_turnover"] += float(row.avg_turnover) if row.avg_turnover else 0
-                summary["avg_net_flow"] += float(row.avg_net_flow) if row.avg_net_flow else 0
-
-            # 计算周平均值
-            for week_data in weekly_analysis.values():
-                summary = week_data["summary"]
-                if summary["total_days"] > 0:
-                    summary["avg_volume"] /= summary["total_days"]
-                    summary["avg_turnover"] /= summary["total_days"]
-                    summary["avg_net_flow"] /= summary["total_days"]
+            # 查询日线数据，包括技术指标和资金流向（按 年-周 × 星期 的汇总在内存中一次分组完成）
+            df = await read_sql(text("""
+                SELECT 
+                    d.trade_date,
+                    d.open,
+                    d.high,
+                    d.low,
+                    d.close,
+                    d.vol as volume,
+                    d.amount,
+                    d.pct_chg,
+                    f.turnover_rate_f,
+                    f.volume_ratio,
+                    f.brar_ar_bfq,
+                    f.brar_br_bfq,
+                    f.psy_bfq,
+                    f.psyma_bfq,
+                    m.net_mf_amount,
+                    m.buy_sm_vol - m.sell_sm_vol as small_flow,
+                    m.buy_md_vol - m.sell_md_vol as medium_flow,
+                    m.buy_lg_vol - m.sell_lg_vol as large_flow,
+                    m.buy_elg_vol - m.sell_elg_vol as extra_large_flow
+                FROM stock_daily d
+                LEFT JOIN stk_factor_pro f ON d.ts_code = f.ts_code AND d.trade_date = f.trade_date
+                LEFT JOIN moneyflow m ON d.ts_code = m.ts_code AND d.trade_date = m.trade_date
+                WHERE d.ts_code = :ts_code 
+                AND d.trade_date BETWEEN :start_date AND :end_date
+                ORDER BY d.trade_date
+            """), {"ts_code": ts_code, "start_date": start_date, "end_date": end_date})
 
             return {
                 "stock_info": stock_info,
-                "weekly_analysis": weekly_analysis
+                "weekly_analysis": _weekly_analysis(df) if not df.empty else {}
             }
 
         except Exception as e:
@@ -290,151 +589,110 @@ class StockCompareService:
             raise e
 
     @classmethod
-    def get_weekly_pattern(cls, ts_code: str, start_date: str = None, end_date: str = None):
+    async def _load_pattern_frame(cls, ts_codes: List[str], start_date: Optional[str] = None,
+                                  end_date: Optional[str] = None) -> pd.DataFrame:
+        """一次查询多只股票的日线及资金流向数据（按股票、交易日排序）"""
+        date_condition = ""
+        params: Dict[str, Any] = {"codes": ts_codes}
+        if start_date and end_date:
+            date_condition = "AND d.trade_date::varchar BETWEEN :start_date AND :end_date"
+            params.update({"start_date": start_date, "end_date": end_date})
+
+        df = await read_sql(text(f"""
+            SELECT 
+                d.ts_code,
+                d.trade_date,
+                d.open, d.high, d.low, d.close,
+                d.vol, d.amount, d.pct_chg,
+                m.net_amount,
+                m.net_amount_rate,
+                m.buy_elg_amount,
+                m.buy_lg_amount,
+                m.buy_md_amount,
+                m.buy_sm_amount,
+                m.buy_elg_amount_rate,
+                m.buy_lg_amount_rate,
+                m.buy_md_amount_rate,
+                m.buy_sm_amount_rate
+            FROM stock_daily d
+            LEFT JOIN moneyflow_dc m ON d.ts_code = m.ts_code AND d.trade_date::varchar = m.trade_date::varchar
+            WHERE d.ts_code = ANY(:codes) {date_condition}
+            ORDER BY d.ts_code, d.trade_date
+        """), params)
+        if df.empty:
+            return df
+        # 缺失值、无效数值按 0 处理
+        for col in PATTERN_NUMERIC_COLUMNS:
+            values = pd.to_numeric(df[col], errors='coerce').astype(float)
+            df[col] = values.where(np.isfinite(values), 0.0)
+        df['trade_date'] = df['trade_date'].astype(str)
+        return _add_week_columns(df)
+
+    @classmethod
+    async def get_weekly_pattern(cls, ts_code: str, start_date: str = None, end_date: str = None):
         """获取股票周度交易规律分析"""
         try:
-            db = next(get_db())
-            
-            # 构建查询条件
-            date_condition = ""
-            params = {"ts_code": ts_code}
-            if start_date and end_date:
-                date_condition = "AND d.trade_date::varchar BETWEEN :start_date AND :end_date"
-                params.update({"start_date": start_date, "end_date": end_date})
-            
-            # 获取每日交易数据和资金流向数据
-            query = text(f"""
-                SELECT 
-                    d.trade_date,
-                    d.open, d.high, d.low, d.close,
-                    d.vol, d.amount, d.pct_chg,
-                    EXTRACT(DOW FROM d.trade_date::date) as weekday,
-                    TO_CHAR(d.trade_date::date, 'IYYY-IW') as yearweek,
-                    m.net_amount,
-                    m.net_amount_rate,
-                    m.buy_elg_amount,
-                    m.buy_lg_amount,
-                    m.buy_md_amount,
-                    m.buy_sm_amount,
-                    m.buy_elg_amount_rate,
-                    m.buy_lg_amount_rate,
-                    m.buy_md_amount_rate,
-                    m.buy_sm_amount_rate
-                FROM stock_daily d
-                LEFT JOIN moneyflow_dc m ON d.ts_code = m.ts_code AND d.trade_date::varchar = m.trade_date::varchar
-                WHERE d.ts_code = :ts_code {date_condition}
-                ORDER BY d.trade_date
-            """)
-            
-            rows = db.execute(query, params).fetchall()
-            if not rows:
+            df = await cls._load_pattern_frame([ts_code], start_date, end_date)
+            if df.empty:
                 return {"error": "No data found"}
             
-            # 将 SQLAlchemy Row 对象转换为字典列表
-            data = []
-            for row in rows:
-                row_dict = {}
-                for column in row._mapping:
-                    row_dict[column] = row._mapping[column]
-                data.append(row_dict)
-            
-            # 转换为DataFrame进行分析
-            df = pd.DataFrame(data)
-            
-            # 处理无效的浮点数值
-            def clean_float(x):
-                if pd.isna(x) or (isinstance(x, (int, float)) and np.isinf(x)):
-                    return 0.0
-                try:
-                    return float(x)
-                except:
-                    return 0.0
-            
-            # 确保数值类型列是有效的 float
-            numeric_columns = ['open', 'high', 'low', 'close', 'vol', 'amount', 'pct_chg', 
-                             'net_amount', 'net_amount_rate', 'buy_elg_amount', 'buy_lg_amount', 
-                             'buy_md_amount', 'buy_sm_amount', 'buy_elg_amount_rate', 
-                             'buy_lg_amount_rate', 'buy_md_amount_rate', 'buy_sm_amount_rate']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(clean_float)
-            
-            # 确保日期列是字符串
-            df['trade_date'] = df['trade_date'].astype(str)
-            
-            # 1. 计算每个交易日的统计特征
-            weekly_patterns = []
-            for weekday in range(1, 6):  # 1-5 对应周一到周五
-                day_data = df[df['weekday'] == weekday]
-                if len(day_data) == 0:
-                    continue
-                
-                pattern = {
-                    "weekday": int(weekday),
-                    "trading_count": int(len(day_data)),
-                    "up_count": int(len(day_data[day_data['pct_chg'] > 0])),
-                    "down_count": int(len(day_data[day_data['pct_chg'] < 0])),
-                    "avg_chg": clean_float(day_data['pct_chg'].mean()),
-                    "max_up": clean_float(day_data['pct_chg'].max()),
-                    "max_down": clean_float(day_data['pct_chg'].min()),
-                    "avg_vol": clean_float(day_data['vol'].mean()),
-                    "avg_amount": clean_float(day_data['amount'].mean()),
-                    "money_flow": {
-                        "net_amount": clean_float(day_data['net_amount'].mean()) if 'net_amount' in day_data else 0.0,
-                        "super_large": clean_float(day_data['buy_elg_amount'].mean()) if 'buy_elg_amount' in day_data else 0.0,
-                        "large": clean_float(day_data['buy_lg_amount'].mean()) if 'buy_lg_amount' in day_data else 0.0,
-                        "medium": clean_float(day_data['buy_md_amount'].mean()) if 'buy_md_amount' in day_data else 0.0,
-                        "small": clean_float(day_data['buy_sm_amount'].mean()) if 'buy_sm_amount' in day_data else 0.0
-                    }
-                }
-                weekly_patterns.append(pattern)
-            
-            # 2. 计算周度趋势
-            weekly_trends = []
-            for yearweek, week_data in df.groupby('yearweek'):
-                trend = {
-                    "yearweek": str(yearweek),
-                    "avg_chg": clean_float(week_data['pct_chg'].mean()),
-                    "total_vol": clean_float(week_data['vol'].sum()),
-                    "total_amount": clean_float(week_data['amount'].sum()),
-                    "money_flow": {
-                        "net_amount": clean_float(week_data['net_amount'].sum()) if 'net_amount' in week_data else 0.0,
-                        "super_large": clean_float(week_data['buy_elg_amount'].sum()) if 'buy_elg_amount' in week_data else 0.0,
-                        "large": clean_float(week_data['buy_lg_amount'].sum()) if 'buy_lg_amount' in week_data else 0.0,
-                        "medium": clean_float(week_data['buy_md_amount'].sum()) if 'buy_md_amount' in week_data else 0.0,
-                        "small": clean_float(week_data['buy_sm_amount'].sum()) if 'buy_sm_amount' in week_data else 0.0
-                    },
-                    "daily_stats": []
-                }
-                
-                # 添加每日统计
-                for _, day_data in week_data.iterrows():
-                    trend["daily_stats"].append({
-                        "date": str(day_data['trade_date']),
-                        "weekday": int(day_data['weekday']),
-                        "pct_chg": clean_float(day_data['pct_chg']),
-                        "amount": clean_float(day_data['amount'])
-                    })
-                
-                weekly_trends.append(trend)
-            
-            # 3. 计算整体统计
-            period_summary = {
-                "total_days": int(len(df)),
-                "up_days": int(len(df[df['pct_chg'] > 0])),
-                "down_days": int(len(df[df['pct_chg'] < 0])),
-                "avg_daily_vol": clean_float(df['vol'].mean()),
-                "avg_daily_amount": clean_float(df['amount'].mean()),
-                "max_up": clean_float(df['pct_chg'].max()),
-                "max_down": clean_float(df['pct_chg'].min()),
-                "win_rate": clean_float(len(df[df['pct_chg'] > 0]) / len(df) * 100)
-            }
-            
             return {
-                "period_summary": period_summary,
-                "weekly_patterns": weekly_patterns,
-                "weekly_trends": weekly_trends
+                "period_summary": _period_summaries(df, [])[0],
+                "weekly_patterns": _weekday_patterns(df, [])[0],
+                "weekly_trends": _weekly_trends(df)
             }
             
         except Exception as e:
             return {"error": str(e)}
+
+    @classmethod
+    async def get_weekly_pattern_batch(cls, ts_codes: Optional[Sequence[str]] = None,
+                                       industry: Optional[str] = None, start_date: str = None,
+                                       end_date: str = None) -> Dict[str, Any]:
+        """批量计算多只股票（或整个行业）的星期规律
+
+        一次查询取出全部股票的数据，按 (股票, 星期) 一次分组聚合；
+        overall 为所有股票合并后的星期规律。
+        """
+        codes = list(dict.fromkeys(code.strip().upper() for code in ts_codes or [] if code and code.strip()))
+        if industry:
+            rows = await fetch_all(text("""
+                SELECT ts_code
+                FROM stock_basic
+                WHERE industry = :industry
+                AND list_status = 'L'
+                ORDER BY ts_code
+            """), {"industry": industry})
+            codes.extend(row["ts_code"] for row in rows if row["ts_code"] not in codes)
+        if not codes:
+            raise ValueError("请指定股票代码或行业")
+        if len(codes) > settings.COMPARE_MAX_CODES:
+            raise ValueError(f"最多同时分析 {settings.COMPARE_MAX_CODES} 只股票")
+
+        df = await cls._load_pattern_frame(codes, start_date, end_date)
+        names = await cls._stock_names(codes)
+        stocks = []
+        if not df.empty:
+            summaries = _period_summaries(df, ['ts_code'])
+            patterns = _weekday_patterns(df, ['ts_code'])
+            for code in codes:
+                if code not in summaries:
+                    continue
+                stocks.append({
+                    "ts_code": code,
+                    "name": names.get(code, {}).get("name"),
+                    "period_summary": summaries[code],
+                    "weekly_patterns": patterns.get(code, [])
+                })
+
+        return {
+            "industry": industry,
+            "start_date": start_date,
+            "end_date": end_date,
+            "stock_count": len(stocks),
+            "overall": {
+                "period_summary": _period_summaries(df, [])[0] if not df.empty else None,
+                "weekly_patterns": _weekday_patterns(df, [])[0] if not df.empty else []
+            },
+            "stocks": stocks
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import itertools
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.database import fetch_all, fetch_one
+
+try:
+    from pypinyin import Style, pinyin
+except ImportError:  # 未安装 pypinyin 时不支持拼音首字母搜索
+    pinyin = None
+
+logger = logger.bind(module=__name__)
+
+STOCK_BASIC_QUERY = """
+    SELECT ts_code, symbol, name, area, industry, market, list_date, list_status, is_hs
+    FROM stock_basic
+"""
+
+# stock_basic 变更检测：行数 + 最后更新时间
+SIGNATURE_QUERY = "SELECT COUNT(*) as count, MAX(updated_at) as updated_at FROM stock_basic"
+
+# 子串匹配的类型（排在精确匹配和各类前缀匹配之后，数值越小排名越靠前）
+CODE_SUBSTRING, NAME_SUBSTRING, INITIALS_SUBSTRING = range(3)
+
+# 多音字组合上限（如 "重庆银行" 同时索引 zqyh / cqyh）
+MAX_INITIALS_VARIANTS = 8
+
+
+def _normalize(text: Optional[str]) -> str:
+    """全角转半角、转小写，去掉 *、空格等非字母数字字符（*ST → st）"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(ch for ch in text if ch.isalnum())
+
+
+def name_initials(name: str) -> List[str]:
+    """名称的拼音首字母（多音字展开为多个候选），如 平安银行 → ['payh']"""
+    if pinyin is None or not name:
+        return []
+    readings = pinyin(unicodedata.normalize('NFKC', name), style=Style.FIRST_LETTER,
+                      heteronym=True, errors='default')
+    parts = [sorted({_normalize(r) for r in options}) or [''] for options in readings]
+    variants = []
+    for combo in itertools.islice(itertools.product(*parts), MAX_INITIALS_VARIANTS):
+        variant = ''.join(combo)
+        if variant and variant not in variants:
+            variants.append(variant)
+    return variants
+
+
+class _PrefixIndex:
+    """有序键数组，前缀查询为两次二分查找"""
+
+    def __init__(self, items: List[Tuple[str, int]]):
+        items.sort()
+        self.keys = [key for key, _ in items]
+        self.ids = [stock_id for _, stock_id in items]
+
+    def match(self, query: str) -> Tuple[List[int], List[int]]:
+        """返回 (完全相同, 以 query 开头但不相同) 的股票"""
+        lo = bisect_left(self.keys, query)
+        mid = bisect_right(self.keys, query)
+        hi = bisect_left(self.keys, query + '\uffff')
+        return self.ids[lo:mid], self.ids[mid:hi]
+
+
+class StockSearchIndex:
+    """股票代码/名称/拼音首字母的内存搜索索引
+
+    - 前缀匹配：代码、名称、拼音首字母各一个有序数组，二分查找
+    - 子串匹配：单字和双字 n-gram 倒排表，取各 n-gram 倒排表交集后校验
+    结果按 精确 > 代码前缀 > 名称前缀 > 首字母前缀 > 代码子串 > 名称子串 > 首字母子串 排序，
+    同类中上市状态正常的排在前面。stock_basic 变更（行数或 updated_at 变化）后自动重建。
+    """
+
+    def __init__(self):
+        self.stocks: List[Dict[str, Any]] = []
+        self._fields: List[Tuple[List[str], str, List[str]]] = []
+        self._codes = self._names = self._initials = _PrefixIndex([])
+        self._grams: Dict[str, Set[int]] = {}
+        self._order: List[int] = []
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def build(self, rows: List[Dict[str, Any]]) -> None:
+        vars(self).update(self._prepare(rows))
+
+    @staticmethod
+    def _prepare(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """由 stock_basic 行构建全部索引结构（不修改实例，可在线程池中执行）"""
+        stocks, fields = [], []
+        codes, names, initials = [], [], []
+        grams: Dict[str, Set[int]] = {}
+        for stock_id, row in enumerate(rows):
+            list_date = row.get('list_date')
+            if isinstance(list_date, date):
+                list_date = list_date.strftime('%Y%m%d')
+            stocks.append({
+                'ts_code': row['ts_code'],
+                'symbol': row['symbol'],
+                'name': row['name'],
+                'area': row.get('area'),
+                'industry': row.get('industry'),
+                'market': row.get('market'),
+                'list_date': list_date,
+                'is_hs': row.get('is_hs'),
+                '_listed': row.get('list_status') in (None, 'L')
+            })
+            stock_codes = [c for c in {_normalize(row['ts_code']), _normalize(row['symbol'])} if c]
+            name = _normalize(row['name'])
+            stock_initials = name_initials(row['name'] or '')
+            fields.append((stock_codes, name, stock_initials))
+
+            codes.extend((code, stock_id) for code in stock_codes)
+            if name:
+                names.append((name, stock_id))
+            initials.extend((variant, stock_id) for variant in stock_initials)
+            for key in stock_codes + [name] + stock_initials:
+                for i in range(len(key)):
+                    grams.setdefault(key[i], set()).add(stock_id)
+                    if i + 1 < len(key):
+                        grams.setdefault(key[i:i + 2], set()).add(stock_id)
+
+        # 同类匹配内的排序：上市状态正常优先，其次名称短、代码小
+        ordered = sorted(range(len(stocks)), key=lambda i: (
+            not stocks[i]['_listed'], len(fields[i][1]), stocks[i]['ts_code']
+        ))
+        order = [0] * len(stocks)
+        for position, stock_id in enumerate(ordered):
+            order[stock_id] = position
+        logger.info("Stock search index built: {} stocks, {} grams", len(stocks), len(grams))
+        return {
+            'stocks': stocks,
+            '_fields': fields,
+            '_codes': _PrefixIndex(codes),
+            '_names': _PrefixIndex(names),
+            '_initials': _PrefixIndex(initials),
+            '_grams': grams,
+            '_order': order
+        }
+
+    async def refresh(self, force: bool = False) -> None:
+        """按 STOCK_SEARCH_REFRESH 间隔检查 stock_basic 是否变更，变更时重建索引"""
+        now = time.monotonic()
+        if not force and self.stocks and now - self._checked_at < settings.STOCK_SEARCH_REFRESH:
+            return
+        async with self._lock:
+            if not force and self.stocks and now - self._checked_at < settings.STOCK_SEARCH_REFRESH:
+                return
+            row = await fetch_one(SIGNATURE_QUERY)
+            signature = (row['count'], row['updated_at']) if row else None
+            if force or not self.stocks or signature != self._signature:
+                # 拼音展开耗时较长，在线程池中构建，完成后在事件循环内一次性替换
+                rows = await fetch_all(STOCK_BASIC_QUERY)
+                vars(self).update(await run_in_threadpool(self._prepare, rows))
+                self._signature = signature
+            self._checked_at = time.monotonic()
+
+    def _substring(self, query: str) -> Set[int]:
+        if len(query) == 1:
+            return set(self._grams.get(query, ()))
+        postings = [self._grams.get(query[i:i + 2]) for i in range(len(query) - 1)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {stock_id for stock_id in candidates
+                if any(query in key for key in self._keys(stock_id))}
+
+    def _keys(self, stock_id: int) -> List[str]:
+        codes, name, initials = self._fields[stock_id]
+        return codes + [name] + initials
+
+    def _substring_rank(self, stock_id: int, query: str) -> int:
+        codes, name, _ = self._fields[stock_id]
+        if any(query in code for code in codes):
+            return CODE_SUBSTRING
+        if query in name:
+            return NAME_SUBSTRING
+        return INITIALS_SUBSTRING
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        query = _normalize(query)
+        if not query or not self.stocks:
+            return []
+
+        code_exact, code_prefix = self._codes.match(query)
+        name_exact, name_prefix = self._names.match(query)
+        initials_exact, initials_prefix = self._initials.match(query)
+        tiers = [code_exact + name_exact + initials_exact, code_prefix, name_prefix, initials_prefix]
+
+        results: List[int] = []
+        seen: Set[int] = set()
+
+        def take(candidates) -> None:
+            candidates = {i for i in candidates if i not in seen}
+            best = heapq.nsmallest(limit - len(results), candidates, key=self._order.__getitem__)
+            results.extend(best)
+            seen.update(best)
+
+        for tier in tiers:
+            if len(results) >= limit:
+                break
+            take(tier)
+
+        # 前缀匹配不足时再做子串匹配
+        if len(results) < limit:
+            substring_tiers: Dict[int, List[int]] = {}
+            for stock_id in self._substring(query) - seen:
+                substring_tiers.setdefault(self._substring_rank(stock_id, query), []).append(stock_id)
+            for rank in sorted(substring_tiers):
+                if len(results) >= limit:
+                    break
+                take(substring_tiers[rank])
+
+        return [{k: v for k, v in self.stocks[i].items() if k != '_listed'} for i in results]
+
+
+stock_search_index = StockSearchIndex()
+
+
+async def search_stocks(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    await stock_search_index.refresh()
+    return stock_search_index.search(query, limit)
@@ -1,20 +1,162 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import date
-from app.core.database import engine
+from app.core.database import read_sql
+from app.market_view.daily_bar_store import get_daily_bar_store
+from app.market_view import indicators
 import pandas as pd
 import numpy as np
+from app.utils.serializer import Field, NULLABLE_FLOAT, STR, serialize_columns
 from loguru import logger
+from app.core.config import settings
+from app.core.trade_calendar import trade_calendar
+
+# 可直接从日线列式存储读取的行情字段
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'pct_chg', 'vol', 'amount', 'turnover_rate', 'turnover_rate_f']
+
+# 仍需从 stk_factor_pro 读取的指标列
+INDICATOR_COLUMNS = [
+    'ma_bfq_5', 'ma_bfq_10', 'ma_bfq_20', 'ma_bfq_60',
+    'macd_bfq', 'macd_dif_bfq', 'macd_dea_bfq',
+    'boll_upper_bfq', 'boll_mid_bfq', 'boll_lower_bfq',
+    'kdj_k_bfq', 'kdj_d_bfq', 'kdj_bfq',
+    'rsi_bfq_6', 'rsi_bfq_12', 'rsi_bfq_24',
+    'atr_bfq', 'bias1_bfq', 'bias2_bfq', 'bias3_bfq'
+]
+
+# 接口输出的数值列（保留原列名，NaN 输出 None）
+INDICATOR_OUTPUT_FIELDS = [Field('trade_date', 'trade_date', STR)] + [
+    Field(col, col, NULLABLE_FLOAT)
+    for col in BAR_FIELDS + INDICATOR_COLUMNS + ['macd_divergence']
+]
 
 class TechnicalAnalysisService:
     @staticmethod
-    def process_float(value: Any) -> float:
-        """处理浮点数，将非法值转换为0"""
-        try:
-            if pd.isna(value) or np.isinf(value):
-                return 0.0
-            return float(value)
-        except:
-            return 0.0
+    async def _load_from_store(ts_code: str, end_date: str, period: int) -> Optional[pd.DataFrame]:
+        """行情字段从日线列式存储读取，只向 stk_factor_pro 查询指标列
+
+        存储不可用或尚未包含 end_date 时返回 None。
+        """
+        store = get_daily_bar_store()
+        if store is None or not store.covers(end_date) or not store.has(ts_code):
+            return None
+
+        bars = store.tail(ts_code, end_date, period).to_frame(BAR_FIELDS)
+        if bars.empty:
+            return bars
+
+        sql = f"""
+        SELECT trade_date, {", ".join(INDICATOR_COLUMNS)}
+        FROM stk_factor_pro
+        WHERE ts_code = :ts_code
+        AND trade_date BETWEEN :start_date AND :end_date
+        """
+        indicators = await read_sql(sql, {
+            'ts_code': ts_code,
+            'start_date': bars['trade_date'].iloc[0],
+            'end_date': bars['trade_date'].iloc[-1]
+        })
+        indicators['trade_date'] = indicators['trade_date'].astype(str).str.replace('-', '')
+        return bars.merge(indicators, on='trade_date', how='left')
+
+    @staticmethod
+    async def _load_from_database(ts_code: str, end_date: str, period: int) -> pd.DataFrame:
+        """从 stock_daily 读取行情，关联 stk_factor_pro 的指标数据"""
+        # 如果未指定结束日期，获取最新交易日
+        if not end_date:
+            latest_date_sql = """
+            SELECT MAX(trade_date) as latest_date 
+            FROM stock_daily 
+            WHERE ts_code = :ts_code
+            """
+            latest_date_df = await read_sql(latest_date_sql, {'ts_code': ts_code})
+            end_date = latest_date_df['latest_date'].iloc[0]
+
+        sql = f"""
+        WITH date_range AS (
+            SELECT trade_date
+            FROM stock_daily
+            WHERE ts_code = :ts_code
+            AND trade_date <= :end_date
+            ORDER BY trade_date DESC
+            LIMIT :period
+        )
+        SELECT 
+            d.trade_date,
+            d.open, d.high, d.low, d.close, d.pct_chg,
+            d.vol, d.amount,
+            f.turnover_rate, f.turnover_rate_f,
+            {", ".join(f"f.{col}" for col in INDICATOR_COLUMNS)}
+        FROM stock_daily d
+        LEFT JOIN stk_factor_pro f ON f.ts_code = d.ts_code AND f.trade_date = d.trade_date
+        WHERE d.ts_code = :ts_code 
+        AND d.trade_date IN (SELECT trade_date FROM date_range)
+        ORDER BY d.trade_date ASC
+        """
+        
+        df = await read_sql(sql, {
+            'ts_code': ts_code,
+            'end_date': end_date,
+            'period': period
+        })
+        df['trade_date'] = df['trade_date'].astype(str).str.replace('-', '')
+        return df
+
+    @staticmethod
+    async def _fill_missing_indicators(ts_code: str, df: pd.DataFrame) -> pd.DataFrame:
+        """stk_factor_pro 中缺失的交易日（或整只股票缺失）由原生指标引擎按日线计算补齐"""
+        missing = df[INDICATOR_COLUMNS].isna().all(axis=1).to_numpy()
+        if not missing.any():
+            return df
+
+        dates = df['trade_date'].to_numpy()
+        native = await indicators.compute_indicators(
+            [ts_code], indicators.parse_specs(indicators.STK_FACTOR_SPECS),
+            dates[missing][0], dates[missing][-1]
+        )
+        positions = pd.Index(native['dates'].astype(str)).get_indexer(dates[missing])
+        found = positions >= 0
+        rows = np.flatnonzero(missing)[found]
+        for column, key in indicators.STK_FACTOR_COLUMNS.items():
+            df.loc[df.index[rows], column] = native['values'][key][0, positions[found]]
+        logger.info(f"Computed {len(rows)} days of indicators natively for {ts_code}")
+        return df
+
+    @staticmethod
+    async def get_custom_indicators(
+        ts_codes: Optional[List[str]],
+        specs: List[str],
+        start_date: str,
+        end_date: str
+    ) -> Dict[str, Any]:
+        """按任意参数计算指标（ts_codes 为空时计算全市场）
+
+        Args:
+            ts_codes: 股票代码列表
+            specs: 指标及参数，如 ["ma:30", "macd:12,26,9", "boll:20,2"]
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            列式结果：{"dates", "codes", "indicators": {输出列: (股票数, 交易日数) 数组}}
+        """
+        if ts_codes is not None and len(ts_codes) > settings.COMPARE_MAX_CODES:
+            raise ValueError(f"最多同时计算 {settings.COMPARE_MAX_CODES} 只股票")
+        # 全市场按 (股票数 × 交易日数) 展开矩阵，区间上限更严
+        max_days = (settings.CUSTOM_INDICATOR_MARKET_MAX_DAYS if ts_codes is None
+                    else settings.CUSTOM_INDICATOR_MAX_DAYS)
+        days = trade_calendar.count(start_date.replace('-', ''), end_date.replace('-', ''))
+        if days > max_days:
+            scope = "全市场" if ts_codes is None else "指定股票"
+            raise ValueError(f"{scope}最多计算 {max_days} 个交易日，请求区间包含 {days} 个交易日")
+        parsed = indicators.parse_specs(specs)
+        result = await indicators.compute_indicators(ts_codes, parsed, start_date, end_date)
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'dates': result['dates'].astype(str).tolist(),
+            'codes': result['codes'].tolist(),
+            'indicators': result['values']
+        }
 
     @staticmethod
     async def get_technical_indicators(
@@ -31,115 +173,86 @@ class TechnicalAnalysisService:
         """
         logger.info(f"Getting technical indicators for stock: {ts_code}, period: {period} days")
         try:
-            # 如果未指定结束日期，获取最新交易日
-            if not end_date:
-                latest_date_sql = """
-                SELECT MAX(trade_date) as latest_date 
-                FROM stk_factor_pro 
-                WHERE ts_code = %(ts_code)s
-                """
-                latest_date_df = pd.read_sql(latest_date_sql, engine, params={'ts_code': ts_code})
-                end_date = latest_date_df['latest_date'].iloc[0]
-
-            sql = """
-            WITH date_range AS (
-                SELECT trade_date
-                FROM stk_factor_pro
-                WHERE ts_code = %(ts_code)s
-                AND trade_date <= %(end_date)s
-                ORDER BY trade_date DESC
-                LIMIT %(period)s
-            )
-            SELECT 
-                trade_date,
-                -- 趋势指标
-                ma_bfq_5, ma_bfq_10, ma_bfq_20, ma_bfq_60,
-                macd_bfq, macd_dif_bfq, macd_dea_bfq,
-                boll_upper_bfq, boll_mid_bfq, boll_lower_bfq,
-                -- KDJ指标
-                kdj_k_bfq, kdj_d_bfq, kdj_bfq,
-                -- RSI指标
-                rsi_bfq_6, rsi_bfq_12, rsi_bfq_24,
-                -- 成交量指标
-                vol, amount, turnover_rate, turnover_rate_f,
-                -- 波动指标
-                atr_bfq,
-                bias1_bfq, bias2_bfq, bias3_bfq,
-                -- 其他基础数据
-                open, high, low, close,
-                pct_chg
-            FROM stk_factor_pro
-            WHERE ts_code = %(ts_code)s 
-            AND trade_date IN (SELECT trade_date FROM date_range)
-            ORDER BY trade_date ASC
-            """
-            
-            df = pd.read_sql(sql, engine, params={
-                'ts_code': ts_code,
-                'end_date': end_date,
-                'period': period
-            })
+            df = await TechnicalAnalysisService._load_from_store(ts_code, end_date, period)
+            if df is None:
+                df = await TechnicalAnalysisService._load_from_database(ts_code, end_date, period)
             
             if df.empty:
                 logger.warning(f"No technical data found for stock {ts_code}")
                 return {}
+            df = await TechnicalAnalysisService._fill_missing_indicators(ts_code, df)
             
-            # 将日期列转换为字符串格式
-            df['trade_date'] = df['trade_date'].astype(str)
+            # 整列计算趋势/信号标签，数值列 NaN 输出 None
+            def above(a: str, b: str) -> np.ndarray:
+                return (df[a] > df[b]).to_numpy()
+
+            labels = {
+                'short_term': np.where(above('close', 'ma_bfq_5'), 'up', 'down').tolist(),
+                'medium_term': np.where(above('close', 'ma_bfq_20'), 'up', 'down').tolist(),
+                'long_term': np.where(above('close', 'ma_bfq_60'), 'up', 'down').tolist(),
+                'golden_cross': (above('ma_bfq_5', 'ma_bfq_10') & above('ma_bfq_10', 'ma_bfq_20')).tolist(),
+                'death_cross': (above('ma_bfq_10', 'ma_bfq_5') & above('ma_bfq_20', 'ma_bfq_10')).tolist(),
+                'macd_trend': np.where((df['macd_bfq'] > 0).to_numpy(), 'up', 'down').tolist(),
+                'kdj_signal': np.select(
+                    [(df['kdj_bfq'] > 80).to_numpy(), (df['kdj_bfq'] < 20).to_numpy()],
+                    ['overbought', 'oversold'], 'neutral'
+                ).tolist()
+            }
+            df['macd_divergence'] = df['macd_dif_bfq'] - df['macd_dea_bfq']
+            columns = {**serialize_columns(df, INDICATOR_OUTPUT_FIELDS), **labels}
             
-            # 处理每一天的技术指标
-            daily_analysis = []
-            for _, row in df.iterrows():
-                analysis = {
-                    'trade_date': row['trade_date'],
+            daily_analysis = [
+                {
+                    'trade_date': v['trade_date'],
                     'trend': {
-                        'short_term': 'up' if row['close'] > row['ma_bfq_5'] else 'down',
-                        'medium_term': 'up' if row['close'] > row['ma_bfq_20'] else 'down',
-                        'long_term': 'up' if row['close'] > row['ma_bfq_60'] else 'down',
+                        'short_term': v['short_term'],
+                        'medium_term': v['medium_term'],
+                        'long_term': v['long_term'],
                         'ma_cross': {
-                            'golden_cross': row['ma_bfq_5'] > row['ma_bfq_10'] and row['ma_bfq_10'] > row['ma_bfq_20'],
-                            'death_cross': row['ma_bfq_5'] < row['ma_bfq_10'] and row['ma_bfq_10'] < row['ma_bfq_20']
+                            'golden_cross': v['golden_cross'],
+                            'death_cross': v['death_cross']
                         }
                     },
                     'macd': {
-                        'trend': 'up' if row['macd_bfq'] > 0 else 'down',
-                        'divergence': row['macd_dif_bfq'] - row['macd_dea_bfq'],
-                        'macd': row['macd_bfq'],
-                        'dif': row['macd_dif_bfq'],
-                        'dea': row['macd_dea_bfq']
+                        'trend': v['macd_trend'],
+                        'divergence': v['macd_divergence'],
+                        'macd': v['macd_bfq'],
+                        'dif': v['macd_dif_bfq'],
+                        'dea': v['macd_dea_bfq']
                     },
                     'kdj': {
-                        'k': row['kdj_k_bfq'],
-                        'd': row['kdj_d_bfq'],
-                        'j': row['kdj_bfq'],
-                        'signal': 'overbought' if row['kdj_bfq'] > 80 else 'oversold' if row['kdj_bfq'] < 20 else 'neutral'
+                        'k': v['kdj_k_bfq'],
+                        'd': v['kdj_d_bfq'],
+                        'j': v['kdj_bfq'],
+                        'signal': v['kdj_signal']
                     },
                     'rsi': {
-                        'rsi6': row['rsi_bfq_6'],
-                        'rsi12': row['rsi_bfq_12'],
-                        'rsi24': row['rsi_bfq_24']
+                        'rsi6': v['rsi_bfq_6'],
+                        'rsi12': v['rsi_bfq_12'],
+                        'rsi24': v['rsi_bfq_24']
                     },
                     'volatility': {
-                        'atr': row['atr_bfq'],
-                        'bias1': row['bias1_bfq'],
-                        'bias2': row['bias2_bfq'],
-                        'bias3': row['bias3_bfq']
+                        'atr': v['atr_bfq'],
+                        'bias1': v['bias1_bfq'],
+                        'bias2': v['bias2_bfq'],
+                        'bias3': v['bias3_bfq']
                     },
                     'price': {
-                        'open': row['open'],
-                        'high': row['high'],
-                        'low': row['low'],
-                        'close': row['close'],
-                        'change_pct': row['pct_chg']
+                        'open': v['open'],
+                        'high': v['high'],
+                        'low': v['low'],
+                        'close': v['close'],
+                        'change_pct': v['pct_chg']
                     },
                     'volume': {
-                        'volume': row['vol'],
-                        'amount': row['amount'],
-                        'turnover_rate': row['turnover_rate'],
-                        'turnover_rate_free': row['turnover_rate_f']
+                        'volume': v['vol'],
+                        'amount': v['amount'],
+                        'turnover_rate': v['turnover_rate'],
+                        'turnover_rate_free': v['turnover_rate_f']
                     }
                 }
-                daily_analysis.append(analysis)
+                for v in (dict(zip(columns, row)) for row in zip(*columns.values()))
+            ]
             
             return {
                 'ts_code': ts_code,
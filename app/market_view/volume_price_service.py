@@ -1,13 +1,30 @@
 from typing import List
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import fetch_all, fetch_one
+from app.market_view.daily_bar_store import get_daily_bar_store
 from loguru import logger
 
 logger = logger.bind(module=__name__)
 
+# 量价异常规则阈值（个股分析与全市场筛选共用）
+PRICE_UP_PCT = 2              # 量价背离：涨幅超过 2%
+VOLUME_SHRINK_RATIO = 0.8     # 量价背离：成交量低于前一交易日的 80%
+OUTFLOW_NET_AMOUNT = -1000    # 主力流出：净流入额低于 -1000 万元
+OUTFLOW_NET_RATE = 30         # 主力流出：净占比绝对值超过 30%
+MFI_LOW, MFI_HIGH = 20, 80    # MFI 极值
+
+# 异常类型 -> (描述, 严重程度)
+ANOMALY_TYPES = {
+    "price_up_volume_down": ("价格上涨但成交量萎缩", "medium"),
+    "main_force_outflow": ("主力资金大幅流出", "high"),
+    "mfi_extreme": ("资金流量指标处于极值", "medium")
+}
+
 class StockVolumePriceService:
-    def __init__(self, db: Session = None):
-        self.db = next(get_db()) if db is None else db
+    def __init__(self, db: AsyncSession = None):
+        # 未传入会话时，每次查询临时从异步连接池取连接
+        self.db = db
     
     async def get_stock_volume_price_analysis(self, ts_codes: List[str], trade_date: str):
         """获取指定股票的量价分析"""
@@ -50,27 +67,24 @@ class StockVolumePriceService:
             raise
 
     async def _get_basic_data(self, ts_codes: List[str], trade_date: str):
-        """获取基础量价数据（包括历史数据用于对比）"""
+        """获取基础量价数据（前一日及均量取自 stock_volume_stats）"""
         query = """
-        WITH hist_data AS (
-            SELECT 
-                ts_code,
-                trade_date,
-                close,
-                vol,
-                amount,
-                pct_chg,
-                LAG(vol, 1) OVER (PARTITION BY ts_code ORDER BY trade_date) as pre_vol,
-                LAG(amount, 1) OVER (PARTITION BY ts_code ORDER BY trade_date) as pre_amount,
-                AVG(vol) OVER (PARTITION BY ts_code ORDER BY trade_date ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING) as avg_vol_5d
-            FROM stock_daily
-            WHERE ts_code = ANY(:ts_codes)
-            AND trade_date <= :trade_date
-            ORDER BY trade_date DESC
-        )
-        SELECT * FROM hist_data WHERE trade_date = :trade_date
+        SELECT 
+            d.ts_code,
+            d.trade_date,
+            d.close,
+            d.vol,
+            d.amount,
+            d.pct_chg,
+            v.pre_vol,
+            v.pre_amount,
+            v.avg_vol_5 as avg_vol_5d
+        FROM stock_daily d
+        LEFT JOIN stock_volume_stats v ON d.ts_code = v.ts_code AND v.trade_date = :trade_date
+        WHERE d.ts_code = ANY(:ts_codes)
+        AND d.trade_date = :trade_date
         """
-        result = await self.db.fetch_all(query, {"ts_codes": ts_codes, "trade_date": trade_date})
+        result = await fetch_all(query, {"ts_codes": ts_codes, "trade_date": trade_date}, self.db)
         return {row['ts_code']: row for row in result} if result else {}
 
     async def _get_money_flow(self, ts_codes: List[str], trade_date: str):
@@ -80,7 +94,7 @@ class StockVolumePriceService:
         WHERE ts_code = ANY(:ts_codes)
         AND trade_date = :trade_date
         """
-        result = await self.db.fetch_all(query, {"ts_codes": ts_codes, "trade_date": trade_date})
+        result = await fetch_all(query, {"ts_codes": ts_codes, "trade_date": trade_date}, self.db)
         return {row['ts_code']: row for row in result} if result else {}
 
     async def _get_technical_data(self, ts_codes: List[str], trade_date: str):
@@ -99,7 +113,7 @@ class StockVolumePriceService:
         WHERE ts_code = ANY(:ts_codes)
         AND trade_date = :trade_date
         """
-        result = await self.db.fetch_all(query, {"ts_codes": ts_codes, "trade_date": trade_date})
+        result = await fetch_all(query, {"ts_codes": ts_codes, "trade_date": trade_date}, self.db)
         return {row['ts_code']: row for row in result} if result else {}
 
     def _analyze_single_stock(self, basic_data, flow_data, tech_data):
@@ -110,11 +124,12 @@ class StockVolumePriceService:
         anomalies = []
         
         # 1. 检查量价背离
-        if basic_data['pct_chg'] > 2 and basic_data['vol'] < basic_data['pre_vol'] * 0.8:
+        if basic_data['pct_chg'] > PRICE_UP_PCT and basic_data['vol'] < basic_data['pre_vol'] * VOLUME_SHRINK_RATIO:
+            description, severity = ANOMALY_TYPES["price_up_volume_down"]
             anomalies.append({
                 "type": "price_up_volume_down",
-                "description": "价格上涨但成交量萎缩",
-                "severity": "medium",
+                "description": description,
+                "severity": severity,
                 "indicators": {
                     "price_change": basic_data['pct_chg'],
                     "volume_ratio": basic_data['vol'] / basic_data['pre_vol']
@@ -122,11 +137,12 @@ class StockVolumePriceService:
             })
         
         # 2. 检查资金流向异常
-        if flow_data['net_amount'] < -1000 and abs(flow_data['net_amount_rate']) > 30:
+        if flow_data['net_amount'] < OUTFLOW_NET_AMOUNT and abs(flow_data['net_amount_rate']) > OUTFLOW_NET_RATE:
+            description, severity = ANOMALY_TYPES["main_force_outflow"]
             anomalies.append({
                 "type": "main_force_outflow",
-                "description": "主力资金大幅流出",
-                "severity": "high",
+                "description": description,
+                "severity": severity,
                 "indicators": {
                     "net_amount": flow_data['net_amount'],
                     "net_amount_rate": flow_data['net_amount_rate']
@@ -134,11 +150,12 @@ class StockVolumePriceService:
             })
         
         # 3. 检查技术指标异常
-        if tech_data['mfi_qfq'] < 20 or tech_data['mfi_qfq'] > 80:
+        if tech_data['mfi_qfq'] < MFI_LOW or tech_data['mfi_qfq'] > MFI_HIGH:
+            description, severity = ANOMALY_TYPES["mfi_extreme"]
             anomalies.append({
                 "type": "mfi_extreme",
-                "description": "资金流量指标处于极值",
-                "severity": "medium",
+                "description": description,
+                "severity": severity,
                 "indicators": {
                     "mfi": tech_data['mfi_qfq']
                 }
@@ -153,7 +170,7 @@ class StockVolumePriceService:
             trade_date = date.replace('-', '')
             
             # 从数据库获取股票基本信息
-            query = f"""
+            query = """
                 SELECT
                     ts_code,
                     name,
@@ -162,22 +179,21 @@ class StockVolumePriceService:
                     pct_chg as change_percent,
                     turnover_rate
                 FROM daily_basic
-                WHERE ts_code = '{code}'
-                AND trade_date = '{trade_date}'
+                WHERE ts_code = :ts_code
+                AND trade_date = :trade_date
             """
-            result = await self.db.execute(query)
-            stock_info = result.fetchone()
+            stock_info = await fetch_one(query, {"ts_code": code, "trade_date": trade_date}, self.db)
             
             if not stock_info:
                 return None
                 
             return {
-                "code": stock_info.ts_code,
-                "name": stock_info.name,
-                "currentPrice": stock_info.current_price,
-                "priceChange": stock_info.price_change,
-                "changePercent": stock_info.change_percent,
-                "turnoverRate": stock_info.turnover_rate
+                "code": stock_info['ts_code'],
+                "name": stock_info['name'],
+                "currentPrice": stock_info['current_price'],
+                "priceChange": stock_info['price_change'],
+                "changePercent": stock_info['change_percent'],
+                "turnoverRate": stock_info['turnover_rate']
             }
         except Exception as e:
             logger.error(f"Error in get_stock_info: {str(e)}")
@@ -189,8 +205,13 @@ class StockVolumePriceService:
             # 将YYYY-MM-DD格式转换为YYYYMMDD
             end_date = date.replace('-', '')
             
+            # 优先从日线列式存储读取
+            store = get_daily_bar_store()
+            if store is not None and store.covers(end_date) and store.has(code):
+                return self._build_volume_price_data(store.tail(code, end_date, 60))
+            
             # 获取前60个交易日的数据
-            query = f"""
+            query = """
                 SELECT
                     trade_date,
                     open,
@@ -200,19 +221,18 @@ class StockVolumePriceService:
                     vol as volume,
                     amount
                 FROM stock_daily
-                WHERE ts_code = '{code}'
-                AND trade_date <= '{end_date}'
+                WHERE ts_code = :ts_code
+                AND trade_date <= :end_date
                 ORDER BY trade_date DESC
                 LIMIT 60
             """
-            result = await self.db.execute(query)
-            daily_data = result.fetchall()
+            daily_data = await fetch_all(query, {"ts_code": code, "end_date": end_date}, self.db)
             
             if not daily_data:
                 return None
             
             # 计算均量
-            volumes = [row.volume for row in daily_data]
+            volumes = [row['volume'] for row in daily_data]
             avg_volume_5 = sum(volumes[:5]) / 5 if len(volumes) >= 5 else None
             avg_volume_10 = sum(volumes[:10]) / 10 if len(volumes) >= 10 else None
             avg_volume_20 = sum(volumes[:20]) / 20 if len(volumes) >= 20 else None
@@ -226,21 +246,21 @@ class StockVolumePriceService:
             volumes_data = []
             
             for row in reversed(daily_data):
-                dates.append(row.trade_date)
+                dates.append(row['trade_date'])
                 kline_data.append([
-                    float(row.open),
-                    float(row.close),
-                    float(row.low),
-                    float(row.high)
+                    float(row['open']),
+                    float(row['close']),
+                    float(row['low']),
+                    float(row['high'])
                 ])
-                volumes_data.append(float(row.volume))
+                volumes_data.append(float(row['volume']))
             
             return {
                 "dates": dates,
                 "klineData": kline_data,
                 "volumes": volumes_data,
                 "volume": float(volumes[0]),
-                "amount": float(daily_data[0].amount),
+                "amount": float(daily_data[0]['amount']),
                 "volumeRatio": volume_ratio,
                 "avgVolume5": float(avg_volume_5) if avg_volume_5 else None,
                 "avgVolume10": float(avg_volume_10) if avg_volume_10 else None,
@@ -249,3 +269,36 @@ class StockVolumePriceService:
         except Exception as e:
             logger.error(f"Error in get_stock_volume_price_data: {str(e)}")
             raise
+
+    @staticmethod
+    def _build_volume_price_data(window):
+        """基于日线存储视图构建个股量价数据"""
+        mask = window.valid
+        if not mask.any():
+            return None
+        
+        volumes = window["vol"][mask]
+        recent = volumes[::-1]
+        avg_volume_5 = float(recent[:5].mean()) if len(recent) >= 5 else None
+        avg_volume_10 = float(recent[:10].mean()) if len(recent) >= 10 else None
+        avg_volume_20 = float(recent[:20].mean()) if len(recent) >= 20 else None
+        
+        # K线数据顺序：开盘、收盘、最低、最高
+        kline_data = np.column_stack([
+            window["open"][mask],
+            window["close"][mask],
+            window["low"][mask],
+            window["high"][mask]
+        ])
+        
+        return {
+            "dates": window.dates[mask].astype(str).tolist(),
+            "klineData": kline_data.tolist(),
+            "volumes": volumes.tolist(),
+            "volume": float(volumes[-1]),
+            "amount": float(window["amount"][mask][-1]),
+            "volumeRatio": float(volumes[-1] / avg_volume_5) if avg_volume_5 else None,
+            "avgVolume5": avg_volume_5,
+            "avgVolume10": avg_volume_10,
+            "avgVolume20": avg_volume_20
+        }
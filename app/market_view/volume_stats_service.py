@@ -0,0 +1,153 @@
+import sys
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.core.database import get_db
+from loguru import logger
+
+logger = logger.bind(module=__name__)
+
+# 最长均量窗口（交易日数），增量计算时每只股票向前回溯的行数
+MAX_WINDOW = 60
+
+UPSERT_SQL = text("""
+    INSERT INTO stock_volume_stats (
+        ts_code, trade_date, vol, amount, pre_vol, pre_amount,
+        avg_vol_5, avg_vol_10, avg_vol_20, avg_vol_60,
+        volume_ratio_5, volume_ratio_10, volume_ratio_20, volume_ratio_60,
+        updated_at
+    )
+    SELECT
+        ts_code,
+        trade_date,
+        vol,
+        amount,
+        pre_vol,
+        pre_amount,
+        avg_vol_5,
+        avg_vol_10,
+        avg_vol_20,
+        avg_vol_60,
+        vol / NULLIF(avg_vol_5, 0),
+        vol / NULLIF(avg_vol_10, 0),
+        vol / NULLIF(avg_vol_20, 0),
+        vol / NULLIF(avg_vol_60, 0),
+        NOW()
+    FROM (
+        SELECT
+            ts_code,
+            trade_date,
+            vol,
+            amount,
+            LAG(vol) OVER w as pre_vol,
+            LAG(amount) OVER w as pre_amount,
+            AVG(vol) OVER (w ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING) as avg_vol_5,
+            AVG(vol) OVER (w ROWS BETWEEN 10 PRECEDING AND 1 PRECEDING) as avg_vol_10,
+            AVG(vol) OVER (w ROWS BETWEEN 20 PRECEDING AND 1 PRECEDING) as avg_vol_20,
+            AVG(vol) OVER (w ROWS BETWEEN 60 PRECEDING AND 1 PRECEDING) as avg_vol_60
+        FROM (
+            -- 每只股票取 start_date 之前自身最近的 MAX_WINDOW 行（而不是按日历回溯），
+            -- 停牌过的股票与全量回填时的窗口一致
+            SELECT p.ts_code, p.trade_date, p.vol, p.amount
+            FROM (
+                SELECT DISTINCT ts_code
+                FROM stock_daily
+                WHERE trade_date BETWEEN :start_date AND :end_date
+            ) c
+            CROSS JOIN LATERAL (
+                SELECT ts_code, trade_date, vol, amount
+                FROM stock_daily
+                WHERE ts_code = c.ts_code
+                AND trade_date < :start_date
+                ORDER BY trade_date DESC
+                LIMIT :max_window
+            ) p
+            UNION ALL
+            SELECT ts_code, trade_date, vol, amount
+            FROM stock_daily
+            WHERE trade_date BETWEEN :start_date AND :end_date
+        ) d
+        WINDOW w AS (PARTITION BY ts_code ORDER BY trade_date)
+    ) t
+    WHERE trade_date BETWEEN :start_date AND :end_date
+    ON CONFLICT (ts_code, trade_date) DO UPDATE SET
+        vol = EXCLUDED.vol,
+        amount = EXCLUDED.amount,
+        pre_vol = EXCLUDED.pre_vol,
+        pre_amount = EXCLUDED.pre_amount,
+        avg_vol_5 = EXCLUDED.avg_vol_5,
+        avg_vol_10 = EXCLUDED.avg_vol_10,
+        avg_vol_20 = EXCLUDED.avg_vol_20,
+        avg_vol_60 = EXCLUDED.avg_vol_60,
+        volume_ratio_5 = EXCLUDED.volume_ratio_5,
+        volume_ratio_10 = EXCLUDED.volume_ratio_10,
+        volume_ratio_20 = EXCLUDED.volume_ratio_20,
+        volume_ratio_60 = EXCLUDED.volume_ratio_60,
+        updated_at = EXCLUDED.updated_at
+""")
+
+
+class VolumeStatsService:
+    """维护 stock_volume_stats 派生表
+
+    新交易日入库后调用 update_trade_date（或 sync），每只股票只回溯自身最近 60 行
+    stock_daily 数据计算当日均量和量比（结果与全量回填一致），查询接口直接按交易日读取一天的数据。
+    """
+
+    def __init__(self, db: Session = None):
+        self.db = next(get_db()) if db is None else db
+
+    def refresh(self, start_date: str, end_date: str) -> int:
+        """重新计算 [start_date, end_date] 区间内所有股票的成交量统计（可重复执行）"""
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+        logger.info("Refreshing volume stats from {} to {}", start_date, end_date)
+        try:
+            result = self.db.execute(UPSERT_SQL, {
+                "max_window": MAX_WINDOW,
+                "start_date": start_date,
+                "end_date": end_date
+            })
+            self.db.commit()
+            logger.info("Refreshed {} volume stats rows", result.rowcount)
+            return result.rowcount
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error refreshing volume stats: {}", str(e))
+            raise
+
+    def update_trade_date(self, trade_date: str) -> int:
+        """计算单个交易日的成交量统计"""
+        return self.refresh(trade_date, trade_date)
+
+    def sync(self) -> int:
+        """补齐 stock_daily 中已入库但尚未计算统计的交易日"""
+        row = self.db.execute(text("""
+            SELECT
+                (SELECT MAX(trade_date) FROM stock_volume_stats) as stats_date,
+                (SELECT MIN(trade_date) FROM stock_daily) as first_date,
+                (SELECT MAX(trade_date) FROM stock_daily) as daily_date
+        """)).fetchone()
+        if not row.daily_date:
+            return 0
+        if row.stats_date and row.stats_date >= row.daily_date:
+            logger.info("Volume stats already up to date: {}", row.stats_date)
+            return 0
+
+        # 派生表为空时全量回填
+        start_date = row.first_date
+        if row.stats_date:
+            start_date = self.db.execute(text("""
+                SELECT MIN(trade_date) as next_date
+                FROM stock_daily
+                WHERE trade_date > :stats_date
+            """), {"stats_date": row.stats_date}).fetchone().next_date
+        return self.refresh(start_date, row.daily_date)
+
+
+if __name__ == "__main__":
+    # 用法：python -m app.market_view.volume_stats_service [start_date [end_date]]
+    service = VolumeStatsService()
+    if len(sys.argv) > 1:
+        service.refresh(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else sys.argv[1])
+    else:
+        service.sync()
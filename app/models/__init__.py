@@ -1,3 +1,9 @@
-from .stock import StockBasic
+from .stock import StockBasic, StockDaily
+from .factor import StkFactorPro
+from .moneyflow import MoneyflowDc
+from .volume_stats import StockVolumeStats
+from .market_breadth import MarketBreadth
+from .indicator_state import StockIndicatorState
 
-__all__ = ['StockBasic']
+__all__ = ['StockBasic', 'StockDaily', 'StkFactorPro', 'MoneyflowDc', 'StockVolumeStats',
+           'MarketBreadth', 'StockIndicatorState']
@@ -0,0 +1,70 @@
+from sqlalchemy import Column, String, Float, Index
+from app.core.database import Base
+from app.core.partitions import PARTITION_BY, partition_by_year
+
+
+class StkFactorPro(Base):
+    """股票技术面因子（tushare stk_factor_pro，按 trade_date 年度范围分区）
+
+    实际表包含 tushare 返回的全部列（各指标的 bfq/qfq/hfq 版本），
+    这里只映射服务层读取的列。
+    """
+    __tablename__ = 'stk_factor_pro'
+
+    # 复合主键：股票代码 + 交易日期
+    ts_code = Column(String(10), primary_key=True, comment='股票代码')
+    trade_date = Column(String(8), primary_key=True, comment='交易日期')
+
+    # 行情与估值
+    close = Column(Float, comment='收盘价')
+    pct_chg = Column(Float, comment='涨跌幅')
+    vol = Column(Float, comment='成交量（手）')
+    amount = Column(Float, comment='成交额（千元）')
+    turnover_rate = Column(Float, comment='换手率（%）')
+    turnover_rate_f = Column(Float, comment='换手率（自由流通股）')
+    volume_ratio = Column(Float, comment='量比')
+    pe = Column(Float, comment='市盈率')
+    pb = Column(Float, comment='市净率')
+    total_mv = Column(Float, comment='总市值（万元）')
+    circ_mv = Column(Float, comment='流通市值（万元）')
+
+    # 技术指标（不复权）
+    ma_bfq_5 = Column(Float, comment='5日均线')
+    ma_bfq_10 = Column(Float, comment='10日均线')
+    ma_bfq_20 = Column(Float, comment='20日均线')
+    ma_bfq_60 = Column(Float, comment='60日均线')
+    macd_dif_bfq = Column(Float, comment='MACD DIF')
+    macd_dea_bfq = Column(Float, comment='MACD DEA')
+    macd_bfq = Column(Float, comment='MACD')
+    kdj_k_bfq = Column(Float, comment='KDJ K')
+    kdj_d_bfq = Column(Float, comment='KDJ D')
+    kdj_bfq = Column(Float, comment='KDJ J')
+    rsi_bfq_6 = Column(Float, comment='RSI 6')
+    rsi_bfq_12 = Column(Float, comment='RSI 12')
+    rsi_bfq_24 = Column(Float, comment='RSI 24')
+    boll_upper_bfq = Column(Float, comment='布林上轨')
+    boll_mid_bfq = Column(Float, comment='布林中轨')
+    boll_lower_bfq = Column(Float, comment='布林下轨')
+    atr_bfq = Column(Float, comment='ATR')
+    bias1_bfq = Column(Float, comment='BIAS 6')
+    bias2_bfq = Column(Float, comment='BIAS 12')
+    bias3_bfq = Column(Float, comment='BIAS 24')
+    brar_ar_bfq = Column(Float, comment='BRAR AR')
+    brar_br_bfq = Column(Float, comment='BRAR BR')
+    psy_bfq = Column(Float, comment='PSY')
+    psyma_bfq = Column(Float, comment='PSYMA')
+
+    # 技术指标（前复权）
+    macd_qfq = Column(Float, comment='MACD（前复权）')
+    kdj_k_qfq = Column(Float, comment='KDJ K（前复权）')
+    kdj_d_qfq = Column(Float, comment='KDJ D（前复权）')
+    rsi_qfq_6 = Column(Float, comment='RSI 6（前复权）')
+    mfi_qfq = Column(Float, comment='MFI（前复权）')
+
+    __table_args__ = (
+        Index('ix_stk_factor_pro_trade_date', 'trade_date'),
+        {'postgresql_partition_by': PARTITION_BY},
+    )
+
+
+partition_by_year(StkFactorPro.__table__)
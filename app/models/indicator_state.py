@@ -0,0 +1,39 @@
+from sqlalchemy import Column, String, Float, DateTime, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.core.database import Base
+
+
+class StockIndicatorState(Base):
+    """个股递推指标状态（由 stock_daily 派生，按交易日增量维护）
+
+    保存每只股票在每个交易日收盘后 MACD(12,26,9)、KDJ(9,3,3)、RSI(6/12/24) 的递推中间量，
+    新交易日只需读取前一状态和当日行情推进一步，结果与从上市首日全量计算一致。
+    停牌日不产生新状态，下一交易日从该股票最近一条状态继续。
+    """
+    __tablename__ = 'stock_indicator_state'
+
+    # 复合主键：股票代码 + 交易日期
+    ts_code = Column(String(10), primary_key=True, comment='股票代码')
+    trade_date = Column(String(8), primary_key=True, comment='交易日期')
+
+    # MACD
+    close = Column(Float, comment='收盘价（下一交易日计算 RSI 的前收盘价）')
+    ema_short = Column(Float, comment='收盘价 EMA(12)')
+    ema_long = Column(Float, comment='收盘价 EMA(26)')
+    macd_dea = Column(Float, comment='DIF 的 EMA(9)')
+
+    # KDJ
+    kdj_k = Column(Float, comment='K 值')
+    kdj_d = Column(Float, comment='D 值')
+    high_window = Column(ARRAY(Float), comment='最近9个交易日最高价')
+    low_window = Column(ARRAY(Float), comment='最近9个交易日最低价')
+
+    # RSI：涨幅、振幅的 SMA(N,1)
+    rsi_up_6 = Column(Float, comment='6日平滑涨幅')
+    rsi_abs_6 = Column(Float, comment='6日平滑振幅')
+    rsi_up_12 = Column(Float, comment='12日平滑涨幅')
+    rsi_abs_12 = Column(Float, comment='12日平滑振幅')
+    rsi_up_24 = Column(Float, comment='24日平滑涨幅')
+    rsi_abs_24 = Column(Float, comment='24日平滑振幅')
+
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
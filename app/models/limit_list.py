@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime
+from sqlalchemy import Column, String, Float, Integer, DateTime, select
 from app.core.database import Base
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 class LimitList(Base):
     """涨跌停数据表"""
@@ -38,7 +38,7 @@ class LimitList(Base):
     limit = Column(String(1), comment='涨跌停状态(D跌停/U涨停/Z炸板)')
 
     @staticmethod
-    def filter_by_criteria(db: Session, limit_times: Optional[int] = None, up_stat: Optional[str] = None):
+    async def filter_by_criteria(db: AsyncSession, limit_times: Optional[int] = None, up_stat: Optional[str] = None):
         """
         根据连板次数和涨停统计筛选股票
         :param db: 数据库会话对象
@@ -46,12 +46,12 @@ class LimitList(Base):
         :param up_stat: 涨停统计 (N/T 格式)
         :return: 符合条件的股票列表
         """
-        query = db.query(LimitList)
+        query = select(LimitList)
         if limit_times is not None:
-            query = query.filter(LimitList.limit_times == limit_times)
+            query = query.where(LimitList.limit_times == limit_times)
         if up_stat is not None:
-            query = query.filter(LimitList.up_stat == up_stat)
-        return query.all()
+            query = query.where(LimitList.up_stat == up_stat)
+        return (await db.execute(query)).scalars().all()
 
 
 class KplList(Base):
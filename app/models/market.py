@@ -1,5 +1,6 @@
 from sqlalchemy import Column, String, Float, Date, Integer
 from app.core.database import Base
+from app.models.stock import StockDaily  # noqa: F401  stock_daily 的唯一定义
 
 class IndexDailyBasic(Base):
     __tablename__ = 'index_dailybasic'
@@ -18,16 +19,6 @@ class IndexDailyBasic(Base):
     pe_ttm = Column(Float)
     pb = Column(Float)
 
-class StockDaily(Base):
-    __tablename__ = 'stock_daily'
-
-    id = Column(Integer, primary_key=True, index=True)
-    ts_code = Column(String, index=True)
-    trade_date = Column(String, index=True)
-    close = Column(Float)
-    pct_chg = Column(Float)
-    amount = Column(Float)
-
 class GgtDaily(Base):
     """港股通每日成交"""
     __tablename__ = 'ggt_daily'
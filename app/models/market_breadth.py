@@ -0,0 +1,33 @@
+from sqlalchemy import Column, String, Float, Integer, DateTime, func
+from app.core.database import Base
+
+
+class MarketBreadth(Base):
+    """每日市场宽度统计（由 stock_daily 派生，按交易日增量维护）
+
+    每个交易日每个板块一行，board = 'all' 为全市场汇总。
+    板块按代码划分：sh_main 沪市主板(60)、sz_main 深市主板(00)、gem 创业板(30)、
+    star 科创板(68)、bse 北交所(.BJ)、other 其他。
+    涨跌停按板块涨跌幅限制判断（主板 10%，创业板 2020-08-24 起 20%，科创板 20%，北交所 30%）。
+    """
+    __tablename__ = 'market_breadth'
+
+    # 复合主键：交易日期 + 板块
+    trade_date = Column(String(8), primary_key=True, comment='交易日期')
+    board = Column(String(10), primary_key=True, comment='板块')
+
+    # 家数统计
+    total_count = Column(Integer, comment='股票数')
+    up_count = Column(Integer, comment='上涨家数')
+    down_count = Column(Integer, comment='下跌家数')
+    flat_count = Column(Integer, comment='平盘家数')
+    limit_up_count = Column(Integer, comment='涨停家数')
+    limit_down_count = Column(Integer, comment='跌停家数')
+    up_5_count = Column(Integer, comment='涨幅超5%家数')
+    down_5_count = Column(Integer, comment='跌幅超5%家数')
+
+    # 成交统计
+    total_amount = Column(Float, comment='成交额（千元）')
+    total_vol = Column(Float, comment='成交量（手）')
+
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
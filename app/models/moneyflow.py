@@ -0,0 +1,34 @@
+from sqlalchemy import Column, String, Float, Index
+from app.core.database import Base
+from app.core.partitions import PARTITION_BY, partition_by_year
+
+
+class MoneyflowDc(Base):
+    """个股资金流向（东方财富，按 trade_date 年度范围分区）"""
+    __tablename__ = 'moneyflow_dc'
+
+    # 复合主键：股票代码 + 交易日期
+    ts_code = Column(String(10), primary_key=True, comment='股票代码')
+    trade_date = Column(String(8), primary_key=True, comment='交易日期')
+
+    name = Column(String, comment='股票名称')
+    pct_change = Column(Float, comment='涨跌幅')
+    close = Column(Float, comment='最新价')
+    net_amount = Column(Float, comment='主力净流入额（万元）')
+    net_amount_rate = Column(Float, comment='主力净流入净占比')
+    buy_elg_amount = Column(Float, comment='超大单净流入额（万元）')
+    buy_elg_amount_rate = Column(Float, comment='超大单净流入净占比')
+    buy_lg_amount = Column(Float, comment='大单净流入额（万元）')
+    buy_lg_amount_rate = Column(Float, comment='大单净流入净占比')
+    buy_md_amount = Column(Float, comment='中单净流入额（万元）')
+    buy_md_amount_rate = Column(Float, comment='中单净流入净占比')
+    buy_sm_amount = Column(Float, comment='小单净流入额（万元）')
+    buy_sm_amount_rate = Column(Float, comment='小单净流入净占比')
+
+    __table_args__ = (
+        Index('ix_moneyflow_dc_trade_date', 'trade_date'),
+        {'postgresql_partition_by': PARTITION_BY},
+    )
+
+
+partition_by_year(MoneyflowDc.__table__)
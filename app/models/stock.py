@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Float, Date, Integer, ForeignKey, DateTime, func
+from sqlalchemy import Column, String, Float, Date, Integer, ForeignKey, DateTime, Index, func
 from app.core.database import Base
+from app.core.partitions import PARTITION_BY, partition_by_year
 from sqlalchemy.orm import relationship
 
 class StockBasic(Base):
@@ -28,12 +29,12 @@ class StockBasic(Base):
         return f"{self.ts_code} - {self.name}"
 
 class StockDaily(Base):
-    """股票日线数据"""
+    """股票日线数据（按 trade_date 年度范围分区，见 app.core.partitions）"""
     __tablename__ = "stock_daily"
 
-    id = Column(Integer, primary_key=True, index=True)
-    ts_code = Column(String, index=True, comment="股票代码")
-    trade_date = Column(Date, comment="交易日期")
+    # 复合主键：股票代码 + 交易日期（分区键须包含在主键中）
+    ts_code = Column(String(10), primary_key=True, comment="股票代码")
+    trade_date = Column(String(8), primary_key=True, comment="交易日期")
     open = Column(Float, comment="开盘价")
     high = Column(Float, comment="最高价")
     low = Column(Float, comment="最低价")
@@ -45,3 +46,12 @@ class StockDaily(Base):
     amount = Column(Float, comment="成交额")
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    __table_args__ = (
+        # 全市场单日截面查询
+        Index('ix_stock_daily_trade_date', 'trade_date'),
+        {'postgresql_partition_by': PARTITION_BY},
+    )
+
+
+partition_by_year(StockDaily.__table__)
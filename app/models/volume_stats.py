@@ -0,0 +1,38 @@
+from sqlalchemy import Column, String, Float, DateTime, Index, func
+from app.core.database import Base
+
+
+class StockVolumeStats(Base):
+    """个股滚动成交量统计（由 stock_daily 派生，按交易日增量维护）
+
+    均量均为不含当日的前 N 个交易日平均成交量，量比 = 当日成交量 / 前 N 日均量。
+    """
+    __tablename__ = 'stock_volume_stats'
+
+    # 复合主键：股票代码 + 交易日期
+    ts_code = Column(String(10), primary_key=True, comment='股票代码')
+    trade_date = Column(String(8), primary_key=True, comment='交易日期')
+
+    # 当日及前一日数据
+    vol = Column(Float, comment='成交量（手）')
+    amount = Column(Float, comment='成交额（千元）')
+    pre_vol = Column(Float, comment='前一交易日成交量')
+    pre_amount = Column(Float, comment='前一交易日成交额')
+
+    # 前 N 日均量
+    avg_vol_5 = Column(Float, comment='前5日均量')
+    avg_vol_10 = Column(Float, comment='前10日均量')
+    avg_vol_20 = Column(Float, comment='前20日均量')
+    avg_vol_60 = Column(Float, comment='前60日均量')
+
+    # 量比
+    volume_ratio_5 = Column(Float, comment='5日量比')
+    volume_ratio_10 = Column(Float, comment='10日量比')
+    volume_ratio_20 = Column(Float, comment='20日量比')
+    volume_ratio_60 = Column(Float, comment='60日量比')
+
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+    __table_args__ = (
+        Index('ix_stock_volume_stats_trade_date', 'trade_date'),
+    )
@@ -71,7 +71,7 @@ class DailyData(BaseModel):
     volume: float
     amount: float
     pct_chg: float
-    turnover_rate: float
+    turnover_rate: Optional[float] = None
 
 class TechnicalData(BaseModel):
     trade_date: str
@@ -0,0 +1,13 @@
+import numpy as np
+
+
+def top_k(values: np.ndarray, k: int, descending: bool = True) -> np.ndarray:
+    """取前 k 个非 NaN 值的下标（argpartition 后只对 k 个元素排序）"""
+    candidates = np.flatnonzero(~np.isnan(values))
+    if k <= 0 or not len(candidates):
+        return candidates[:0]
+    keys = -values[candidates] if descending else values[candidates]
+    if k < len(candidates):
+        part = np.argpartition(keys, k - 1)[:k]
+        candidates, keys = candidates[part], keys[part]
+    return candidates[np.argsort(keys, kind="stable")]
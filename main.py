@@ -1,23 +1,23 @@
 from fastapi import FastAPI
+from starlette.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1 import api_router
-from app.core.database import engine, Base
+from app.core.database import engine, async_engine, Base
+from app.core.cache import get_cache
+from app.core.trade_calendar import trade_calendar
+from app.core.responses import FastJSONResponse
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.market_view.stock_search_service import stock_search_index
 
 app = FastAPI(
     title="Stock Analysis Backend",
     description="股票市场分析后端系统",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
-# 添加中间件记录请求日志
-@app.middleware("http")
-async def log_requests(request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Response: {response.status_code}")
-    return response
-
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +27,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按路由统计延迟、状态码、响应字节数（最外层，计入 CORS 等中间件的耗时），慢请求写日志
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # 注册路由
 app.include_router(api_router, prefix="/api/v1")  # 修改这里，恢复 /api 前缀
 
@@ -38,7 +42,23 @@ async def startup():
     except Exception as e:
         logger.error(f"Error creating database tables: {str(e)}")
         raise
+    await trade_calendar.load()
+    # 预先构建股票搜索索引，避免首个搜索请求承担构建耗时
+    try:
+        await stock_search_index.refresh()
+    except Exception as e:
+        logger.error(f"Error building stock search index: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    await get_cache().close()
+    await async_engine.dispose()
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Stock Analysis Backend"}
\ No newline at end of file
+    return {"message": "Welcome to Stock Analysis Backend"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 文本格式的运行指标（当前 worker 进程）"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
\ No newline at end of file
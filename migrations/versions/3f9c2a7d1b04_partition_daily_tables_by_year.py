@@ -0,0 +1,102 @@
+"""stock_daily、stk_factor_pro、moneyflow_dc 按 trade_date 年度范围分区
+
+- 主键改为 (ts_code, trade_date)，去掉自增 id 列和单列 ts_code 索引
+- 保留 trade_date 单列索引，供全市场单日截面查询使用
+- 分区按已有数据的年份范围创建（至少到明年），之后的年份由数据入库时自动创建
+
+每张表：以原表结构（LIKE）新建分区表 -> 按业务键去重复制数据 -> 删除原表 -> 改名。
+表不存在或已是分区表时跳过。downgrade 还原为不分区的表（保留复合主键，不恢复 id 列）。
+
+Revision ID: 3f9c2a7d1b04
+Revises:
+Create Date: 2026-10-17 09:00:00
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+from app.core.partitions import PARTITION_BY, PARTITIONED_TABLES, partition_name
+
+revision = '3f9c2a7d1b04'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _relkind(conn, table: str):
+    return conn.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+                        {"table": table}).scalar()
+
+
+def _columns(conn, table: str):
+    rows = conn.execute(sa.text("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        AND table_name = :table
+        ORDER BY ordinal_position
+    """), {"table": table}).fetchall()
+    return ", ".join(f'"{row.column_name}"' for row in rows)
+
+
+def _copy(conn, source: str, target: str) -> None:
+    """按 (ts_code, trade_date) 去重复制，丢弃业务键为空的行"""
+    columns = _columns(conn, target)
+    conn.execute(sa.text(f"""
+        INSERT INTO {target} ({columns})
+        SELECT {columns} FROM {source}
+        WHERE ts_code IS NOT NULL AND trade_date IS NOT NULL
+        ON CONFLICT (ts_code, trade_date) DO NOTHING
+    """))
+
+
+def _replace(table: str, new_table: str) -> None:
+    """新表替换原表，并恢复主键和索引名"""
+    op.execute(f"DROP TABLE {table}")
+    op.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    op.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {new_table}_pkey TO {table}_pkey")
+    op.execute(f"CREATE INDEX ix_{table}_trade_date ON {table} (trade_date)")
+    op.execute(f"ANALYZE {table}")
+
+
+def _create_like(table: str, new_table: str, partition_by: str = "") -> None:
+    op.execute(f"CREATE TABLE {new_table} (LIKE {table} INCLUDING DEFAULTS INCLUDING COMMENTS) {partition_by}")
+    op.execute(f"ALTER TABLE {new_table} DROP COLUMN IF EXISTS id")
+    op.execute(f"ALTER TABLE {new_table} ALTER COLUMN ts_code SET NOT NULL, ALTER COLUMN trade_date SET NOT NULL")
+    op.execute(f"ALTER TABLE {new_table} ADD CONSTRAINT {new_table}_pkey PRIMARY KEY (ts_code, trade_date)")
+
+
+def _years(conn, table: str) -> range:
+    row = conn.execute(sa.text(f"SELECT MIN(trade_date) as first, MAX(trade_date) as last FROM {table}")).fetchone()
+    last_year = date.today().year + 1
+    if row.first is None:
+        return range(last_year - 1, last_year + 1)
+    return range(int(str(row.first)[:4]), max(int(str(row.last)[:4]), last_year) + 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    for table in PARTITIONED_TABLES:
+        relkind = _relkind(conn, table)
+        if relkind is None or relkind == 'p':
+            continue
+        new_table = f"{table}_partitioned"
+        _create_like(table, new_table, f"PARTITION BY {PARTITION_BY}")
+        years = _years(conn, table)
+        # 分区先以最终名称挂在新表上，改名后随之归属原表名
+        for year in years:
+            op.execute(f"CREATE TABLE {partition_name(table, year)} PARTITION OF {new_table} "
+                       f"FOR VALUES FROM ('{year}0101') TO ('{year + 1}0101')")
+        _copy(conn, table, new_table)
+        _replace(table, new_table)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    for table in PARTITIONED_TABLES:
+        if _relkind(conn, table) != 'p':
+            continue
+        new_table = f"{table}_unpartitioned"
+        _create_like(table, new_table)
+        _copy(conn, table, new_table)
+        # 删除分区表时各分区一并删除
+        _replace(table, new_table)
@@ -0,0 +1,61 @@
+import fnmatch
+
+import pytest
+
+from app.core import cache as cache_module
+from app.core.cache import LocalCache
+from app.core.cache_policy import TradeDateTTLPolicy
+
+
+class FakeRedisClient:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = str(value)
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+
+class FakeRedisCache:
+    """RedisCache 中缓存装饰器和入库水位用到的接口（内存实现）"""
+
+    def __init__(self):
+        self.redis_client = FakeRedisClient()
+        self.expires = {}
+
+    @property
+    def data(self):
+        return self.redis_client.data
+
+    async def get_raw(self, key):
+        return self.data.get(key)
+
+    async def set_raw(self, key, data, expire=None):
+        self.data[key] = data
+        self.expires[key] = expire
+        return True
+
+    async def clear_pattern(self, pattern):
+        for key in [k for k in self.data if fnmatch.fnmatchcase(k, pattern)]:
+            del self.data[key]
+        return True
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    """替换进程内共享的 Redis 缓存和一级缓存"""
+    redis_cache = FakeRedisCache()
+    local_cache = LocalCache(max_size=10_000, max_expire=60)
+    monkeypatch.setattr(cache_module, "get_cache", lambda: redis_cache)
+    monkeypatch.setattr(cache_module, "get_local_cache", lambda: local_cache)
+    monkeypatch.setattr(cache_module, "ttl_policy", TradeDateTTLPolicy())
+    return redis_cache, local_cache
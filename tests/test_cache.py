@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from app.core.cache import LocalCache, cached
+
+
+def test_concurrent_callers_share_one_computation(fake_cache):
+    redis_cache, _ = fake_cache
+    calls = []
+
+    @cached("test")
+    async def load(trade_date: str, limit: int = 10):
+        calls.append((trade_date, limit))
+        await asyncio.sleep(0.01)
+        return {"rows": [1, 2, 3]}
+
+    async def run():
+        return await asyncio.gather(*(load("20240105") for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == [("20240105", 10)]
+    assert all(result == {"rows": [1, 2, 3]} for result in results)
+    # 每个调用方拿到互不影响的对象
+    assert len({id(result) for result in results}) == 5
+    results[0]["rows"].append(4)
+    assert results[1] == {"rows": [1, 2, 3]}
+    assert len(redis_cache.data) == 1
+
+
+def test_local_hit_returns_fresh_copy(fake_cache):
+    _, local_cache = fake_cache
+    calls = []
+
+    @cached("test")
+    async def load(trade_date: str):
+        calls.append(trade_date)
+        return {"rows": [1]}
+
+    first = asyncio.run(load("20240105"))
+    first["rows"].append(2)
+    second = asyncio.run(load("20240105"))
+    assert calls == ["20240105"]
+    assert second == {"rows": [1]}
+    assert local_cache.hits == 1
+
+
+def test_redis_hit_fills_local_cache(fake_cache):
+    redis_cache, local_cache = fake_cache
+    redis_cache.data["test:load:20240105"] = json.dumps({"rows": [9]})
+
+    @cached("test")
+    async def load(trade_date: str):
+        raise AssertionError("should not be computed")
+
+    assert asyncio.run(load("20240105")) == {"rows": [9]}
+    assert local_cache.get("test:load:20240105") == json.dumps({"rows": [9]})
+
+
+def test_cache_if_false_is_not_stored(fake_cache):
+    redis_cache, _ = fake_cache
+    calls = []
+
+    @cached("test", cache_if=lambda value: value["complete"])
+    async def load(trade_date: str):
+        calls.append(trade_date)
+        return {"complete": False}
+
+    asyncio.run(load("20240105"))
+    asyncio.run(load("20240105"))
+    assert len(calls) == 2
+    assert redis_cache.data == {}
+
+
+def test_local_cache_evicts_least_recently_used():
+    local_cache = LocalCache(max_size=100, max_expire=60)
+    for key in ("a", "b", "c", "d"):
+        local_cache.set(key, key, 25, 60)
+    assert local_cache.get("a") == "a"      # a 变为最近使用
+    local_cache.set("e", "e", 25, 60)       # 超过 100，淘汰最久未使用的 b
+    assert local_cache.get("b") is None
+    assert [local_cache.get(key) for key in ("a", "c", "d", "e")] == ["a", "c", "d", "e"]
+    assert local_cache.size == 100
+
+
+def test_local_cache_skips_large_and_expired_entries():
+    local_cache = LocalCache(max_size=100, max_expire=60)
+    local_cache.set("large", "x", 26, 60)
+    assert local_cache.get("large") is None
+    assert local_cache.size == 0
+
+    local_cache.set("expired", "x", 1, 0)
+    assert local_cache.get("expired") is None
+    assert local_cache.size == 0
+
+
+def test_local_cache_delete_matching():
+    local_cache = LocalCache(max_size=100, max_expire=60)
+    local_cache.set("test:load:20240105", "x", 1, 60)
+    local_cache.set("test:load:20240104", "y", 1, 60)
+    local_cache.delete_matching(lambda key: ":20240105" in key)
+    assert local_cache.get("test:load:20240105") is None
+    assert local_cache.get("test:load:20240104") == "y"
+    assert local_cache.size == 1
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.core.cache_policy import GENERATION_KEY, MARKET_TZ, WATERMARK_KEY, TradeDateTTLPolicy
+from app.core.config import settings
+from app.core.trade_calendar import trade_calendar
+
+TODAY = "20240105"    # 周五
+
+
+def at(hour, minute=0, day=TODAY):
+    return datetime(int(day[:4]), int(day[4:6]), int(day[6:]), hour, minute, tzinfo=MARKET_TZ)
+
+
+@pytest.fixture(autouse=True)
+def calendar(monkeypatch):
+    monkeypatch.setattr(trade_calendar, "_dates", np.array([20240102, 20240103, 20240104, 20240105, 20240108]))
+    monkeypatch.setattr(trade_calendar, "source", "test")
+
+
+@pytest.fixture
+def policy():
+    return TradeDateTTLPolicy()
+
+
+@pytest.mark.parametrize("now, expected", [
+    (at(9, 0), "CACHE_EXPIRE_PENDING"),         # 开盘前
+    (at(10, 30), "CACHE_EXPIRE_INTRADAY"),
+    (at(15, 30), "CACHE_EXPIRE_AFTER_CLOSE"),
+])
+def test_today_without_watermark(policy, now, expected):
+    assert policy.ttl_for(TODAY, None, now) == getattr(settings, expected)
+    assert policy.ttl_for(TODAY, "20240104", now) == getattr(settings, expected)
+
+
+def test_today_after_ingestion(policy):
+    assert policy.ttl_for(TODAY, TODAY, at(15, 30)) == settings.CACHE_EXPIRE_HISTORY
+
+
+def test_today_non_trading_day(policy):
+    assert policy.ttl_for("20240106", None, at(10, 30, "20240106")) == settings.CACHE_EXPIRE_PENDING
+
+
+@pytest.mark.parametrize("watermark, expected", [
+    (None, "CACHE_EXPIRE_PENDING"),             # 未记录水位，无法确认已入库
+    ("20240103", "CACHE_EXPIRE_PENDING"),       # 尚未入库
+    ("20240104", "CACHE_EXPIRE_HISTORY"),
+    (TODAY, "CACHE_EXPIRE_HISTORY"),
+])
+def test_past_date(policy, watermark, expected):
+    assert policy.ttl_for("2024-01-04", watermark, at(10, 30)) == getattr(settings, expected)
+
+
+@pytest.mark.parametrize("watermark", [None, "20240108"])
+def test_future_date(policy, watermark):
+    assert policy.ttl_for("20240108", watermark, at(10, 30)) == settings.CACHE_EXPIRE_PENDING
+
+
+def test_no_trade_date(policy):
+    assert policy.ttl_for(None, TODAY, at(10, 30)) == settings.CACHE_EXPIRE
+
+
+def test_advance_watermark_clears_only_that_date(fake_cache, policy):
+    redis_cache, local_cache = fake_cache
+    keys = ["market_review:get_sector_flow:20240105", "market_review:get_top_list:20240105:0123456789ab",
+            "market_review:get_sector_flow:20240104", "stock:get_detail:None:0123456789ab"]
+    for key in keys:
+        redis_cache.data[key] = "{}"
+        local_cache.set(key, "{}", 2, 60)
+
+    asyncio.run(policy.advance_watermark("2024-01-05"))
+    assert sorted(k for k in redis_cache.data if k not in (WATERMARK_KEY, GENERATION_KEY)) == sorted(keys[2:])
+    assert [local_cache.get(key) for key in keys] == [None, None, "{}", "{}"]
+    assert redis_cache.data[WATERMARK_KEY] == TODAY
+    assert asyncio.run(policy.get_watermark()) == TODAY
+    assert asyncio.run(policy.get_generation()) == 1
+
+
+def test_advance_watermark_for_older_date_keeps_watermark(fake_cache, policy):
+    redis_cache, _ = fake_cache
+    asyncio.run(policy.advance_watermark(TODAY))
+    redis_cache.data["market_review:get_sector_flow:20240104"] = "{}"
+
+    asyncio.run(policy.advance_watermark("20240104"))
+    assert "market_review:get_sector_flow:20240104" not in redis_cache.data
+    assert redis_cache.data[WATERMARK_KEY] == TODAY
+    assert asyncio.run(policy.get_generation()) == 2
+
+
+def test_watermark_loaded_from_redis(fake_cache, policy):
+    redis_cache, _ = fake_cache
+    redis_cache.data[WATERMARK_KEY] = "2024-01-04"
+    redis_cache.data[GENERATION_KEY] = "7"
+    assert asyncio.run(policy.get_watermark()) == "20240104"
+    assert asyncio.run(policy.get_generation()) == 7
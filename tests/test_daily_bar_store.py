@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.market_view import daily_bar_store
+from app.market_view.daily_bar_store import FIELDS, DailyBarStore
+
+
+class FakeEngine:
+    @contextmanager
+    def connect(self):
+        yield None
+
+
+def write_store(path, codes, dates, close):
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.mkdir()
+    arrays = {}
+    for field in FIELDS:
+        arr = np.lib.format.open_memmap(tmp_path / f"{field}.npy", mode="w+", dtype=np.float64, shape=close.shape)
+        arr[:] = close if field == "close" else np.nan
+        arrays[field] = arr
+    return DailyBarStore._publish(tmp_path, path, arrays, np.array(codes), np.array(dates, dtype=np.int32),
+                                  {"rows": 0})
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = tmp_path / "daily_bars"
+    write_store(path, ["000001.SZ", "600000.SH"], [20240102, 20240103],
+                np.array([[1.0, 2.0], [3.0, 4.0]]))
+    return path
+
+
+def patch_with(monkeypatch, path, dates, rows):
+    queried = []
+
+    def read_sql(sql, conn, params=None):
+        queried.append(params["dates"])
+        df = pd.DataFrame(rows, columns=["ts_code", "trade_date", "close"])
+        for field in FIELDS:
+            if field not in df.columns:
+                df[field] = np.nan
+        return df
+
+    monkeypatch.setattr(daily_bar_store.pd, "read_sql", read_sql)
+    store = DailyBarStore.patch(dates, str(path), FakeEngine())
+    return store, queried
+
+
+def test_patch_appends_new_date_and_stock(monkeypatch, store_path):
+    store, queried = patch_with(monkeypatch, store_path, ["2024-01-04"], [
+        ("000001.SZ", "20240104", 5.0),
+        ("000002.SZ", "20240104", 6.0),
+    ])
+    assert queried == [["20240104"]]
+    assert store.codes.tolist() == ["000001.SZ", "000002.SZ", "600000.SH"]
+    assert store.dates.tolist() == [20240102, 20240103, 20240104]
+    np.testing.assert_array_equal(store.arrays["close"], [
+        [1.0, 2.0, 5.0],
+        [np.nan, np.nan, 6.0],
+        [3.0, 4.0, np.nan],
+    ])
+    assert store.meta["patched_dates"] == ["20240104"]
+
+
+def test_patch_replaces_existing_date_column(monkeypatch, store_path):
+    store, _ = patch_with(monkeypatch, store_path, ["20240102"], [("600000.SH", "20240102", 7.0)])
+    assert store.dates.tolist() == [20240102, 20240103]
+    np.testing.assert_array_equal(store.arrays["close"], [[np.nan, 2.0], [7.0, 4.0]])
+    assert not store_path.with_name(store_path.name + ".tmp").exists()
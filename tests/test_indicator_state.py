@@ -0,0 +1,145 @@
+import asyncio
+import numpy as np
+import pytest
+
+from app.market_view import indicators
+from app.market_view.indicator_state_service import STATE_COLUMNS, IndicatorStateService, _state_from_rows
+
+CODES = np.array(["000001.SZ", "000002.SZ", "600000.SH"])
+DATES = np.arange(20240101, 20240101 + 60)
+
+
+def make_bars(seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.normal(0, 0.2, (len(CODES), len(DATES))), axis=1)
+    high = close + rng.uniform(0, 0.3, close.shape)
+    low = close - rng.uniform(0, 0.3, close.shape)
+    close[1, 10:14] = np.nan      # 停牌
+    close[1, 35] = np.nan
+    close[2, :25] = np.nan        # 第 25 个交易日上市
+    high[np.isnan(close)] = np.nan
+    low[np.isnan(close)] = np.nan
+    return {"high": high, "low": low, "close": close}
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeStateService(IndicatorStateService):
+    """用内存中的日线和状态行替代数据库访问"""
+
+    def __init__(self, bars):
+        super().__init__(FakeSession())
+        self.bars = bars
+        self.rows = {}
+
+    def _columns(self, start_date, end_date):
+        return np.flatnonzero((DATES >= int(start_date)) & (DATES <= int(end_date)))
+
+    def _trade_dates(self, start_date, end_date):
+        return [str(DATES[t]) for t in self._columns(start_date or "0", end_date)]
+
+    def _daily_codes(self, start_date, end_date):
+        traded = ~np.isnan(self.bars["close"][:, self._columns(start_date, end_date)])
+        return CODES[traded.any(axis=1)].tolist()
+
+    def _load_bars(self, codes, start_date, end_date):
+        cols = self._columns(start_date, end_date)
+        rows = [int(np.flatnonzero(CODES == code)[0]) for code in codes]
+        return DATES[cols], {field: values[np.ix_(rows, cols)] for field, values in self.bars.items()}
+
+    def _load_state(self, trade_date, codes):
+        rows = []
+        for code in codes:
+            dates = [date for (ts_code, date) in self.rows if ts_code == code and date < trade_date]
+            if dates:
+                rows.append({"ts_code": code, **self.rows[(code, max(dates))]})
+        return _state_from_rows(codes, rows)
+
+    def _write(self, codes, trade_date, state, rows):
+        for i in rows:
+            self.rows[(codes[i], trade_date)] = {col: np.array(state[col][i]) for col in STATE_COLUMNS}
+        return len(rows)
+
+    def latest(self):
+        return self._load_state("99999999", CODES)
+
+
+def assert_state_equal(actual, expected):
+    for col in STATE_COLUMNS:
+        np.testing.assert_allclose(actual[col], expected[col], rtol=1e-12, equal_nan=True, err_msg=col)
+
+
+@pytest.mark.parametrize("d0", [5, 12, 30])
+def test_refresh_on_top_of_rebuild_matches_full_rebuild(d0):
+    bars = make_bars()
+    incremental = FakeStateService(bars)
+    incremental.rebuild(str(DATES[d0]))
+    incremental.refresh(str(DATES[d0 + 1]), str(DATES[-1]))
+
+    full = FakeStateService(bars)
+    full.rebuild(str(DATES[-1]))
+    assert_state_equal(incremental.latest(), full.latest())
+
+
+def test_refresh_is_repeatable():
+    bars = make_bars()
+    service = FakeStateService(bars)
+    service.rebuild(str(DATES[20]))
+    service.refresh(str(DATES[21]), str(DATES[-1]))
+    once = service.latest()
+    service.refresh(str(DATES[40]), str(DATES[-1]))
+    assert_state_equal(service.latest(), once)
+
+
+def test_state_outputs_match_full_computation():
+    bars = make_bars()
+    specs = indicators.parse_specs(indicators.STATE_SPECS + ["ma:5", "boll:20,2"])
+    expected = indicators.compute(bars, specs)
+
+    start = 30
+    before = {field: values[:, :start] for field, values in bars.items()}
+    state, _ = indicators.advance(indicators.empty_state(len(CODES)), before)
+    actual = indicators.compute_from_state(state, bars, start, specs)
+    for key, values in expected.items():
+        np.testing.assert_allclose(actual[key][:, start:], values[:, start:], rtol=1e-9, atol=1e-9,
+                                   equal_nan=True, err_msg=key)
+
+
+@pytest.mark.parametrize("available", [True, False])
+def test_compute_indicators_steps_from_persisted_state(monkeypatch, available):
+    bars = make_bars()
+    start = 40
+    before = {field: values[:, :start] for field, values in bars.items()}
+    persisted, _ = indicators.advance(indicators.empty_state(len(CODES)), before)
+    loads = []
+
+    async def load_bars(ts_codes, start_date, end_date, db=None):
+        loads.append(start_date)
+        cols = np.flatnonzero((DATES >= int(start_date)) & (DATES <= int(end_date)))
+        return CODES, DATES[cols], {field: values[:, cols] for field, values in bars.items()}
+
+    async def load_state_before(trade_date, codes, db=None):
+        assert trade_date == str(DATES[start])
+        return persisted if available else None
+
+    monkeypatch.setattr(indicators, "load_bars", load_bars)
+    monkeypatch.setattr("app.market_view.indicator_state_service.load_state_before", load_state_before)
+    monkeypatch.setattr(indicators.trade_calendar, "window_start",
+                        lambda value, n: str(DATES[max(int(np.searchsorted(DATES, int(value))) - n, 0)]))
+
+    specs = indicators.parse_specs(["macd:12,26,9", "rsi:6", "ma:5"])
+    result = asyncio.run(indicators.compute_indicators(None, specs, str(DATES[start]), str(DATES[-1])))
+    expected = indicators.compute(bars, specs)
+    # 有状态时只读取 MA(5) 所需的 5 个交易日
+    assert loads[0] == str(DATES[start - 5])
+    assert len(loads) == (1 if available else 2)
+    assert result["dates"].tolist() == DATES[start:].tolist()
+    for key, values in expected.items():
+        np.testing.assert_allclose(result["values"][key], values[:, start:], rtol=1e-9, atol=1e-9,
+                                   equal_nan=True, err_msg=key)
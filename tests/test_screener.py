@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from app.market_view.screener import (
+    MAX_EXPRESSION_LENGTH,
+    MAX_EXPRESSION_NODES,
+    compile_expression,
+    cross_section_query,
+)
+
+NAN = np.nan
+
+
+def mask(expression, **columns):
+    columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+    size = len(next(iter(columns.values())))
+    return compile_expression(expression).mask(columns, size).tolist()
+
+
+# ---------------------------------------------------------------- 拒绝的语法
+
+
+@pytest.mark.parametrize("expression", [
+    "pct_chg.real > 0",                      # Attribute
+    "__import__('os').system('id')",         # 未知函数 + 字符串
+    "eval('1')",                             # 未知函数
+    "pct_chg.__class__",                     # Attribute
+    "(lambda: 1)()",                         # Lambda
+    "pct_chg if vol else amount",            # IfExp
+    "pct_chg[0] > 1",                        # Subscript
+    "[pct_chg]",                             # List
+    "'a' < 'b'",                             # 字符串常量
+    "pct_chg in (1, 2)",                     # In
+    "pct_chg is None",                       # Is
+    "pct_chg << 2",                          # 位运算
+    "abs(x=pct_chg)",                        # 关键字参数
+    "abs(pct_chg, vol)",                     # 参数个数
+    "unknown_field > 0",                     # 未知字段
+    "pct_chg >",                             # 语法错误
+    "",                                      # 空表达式
+])
+def test_rejects_unsupported_syntax(expression):
+    with pytest.raises(ValueError):
+        compile_expression(expression)
+
+
+def test_rejects_out_of_range_literal():
+    with pytest.raises(ValueError):
+        compile_expression("1" * 400 + " > pct_chg")
+
+
+def test_rejects_long_and_complex_expressions():
+    with pytest.raises(ValueError):
+        compile_expression("pct_chg + " * (MAX_EXPRESSION_LENGTH // 10) + "1")
+    with pytest.raises(ValueError):
+        compile_expression("+".join(["1"] * (MAX_EXPRESSION_NODES // 2 + 1)))
+
+
+# ---------------------------------------------------------------- 求值
+
+
+def test_arithmetic_and_functions():
+    assert mask("vol / avg_vol_5 >= 2", vol=[4, 3, 10], avg_vol_5=[2, 2, 0]) == [True, False, True]
+    assert mask("abs(pct_chg) > 5", pct_chg=[-6, 4, 6]) == [True, False, True]
+    assert mask("max(pct_chg, vol) > 5", pct_chg=[1, 6, 1], vol=[1, 1, 7]) == [False, True, True]
+
+
+def test_chained_comparison():
+    assert mask("0 < pct_chg < 5", pct_chg=[-1, 0, 1, 4.9, 5, 9]) == [False, False, True, True, False, False]
+    assert mask("1 <= pct_chg <= vol", pct_chg=[1, 2, 3], vol=[1, 1, 5]) == [True, False, True]
+
+
+def test_nan_is_never_selected():
+    pct_chg = [NAN, 1.0, 0.0]
+    assert mask("pct_chg > 0", pct_chg=pct_chg) == [False, True, False]
+    assert mask("pct_chg <= 0", pct_chg=pct_chg) == [False, False, True]
+    assert mask("pct_chg != 1", pct_chg=pct_chg) == [False, False, True]
+    assert mask("pct_chg", pct_chg=pct_chg) == [False, True, False]
+    assert mask("not pct_chg", pct_chg=pct_chg) == [False, False, True]
+    assert mask("pct_chg or vol", pct_chg=pct_chg, vol=[NAN, 0, 0]) == [False, True, False]
+    assert mask("pct_chg + 1 > 0", pct_chg=pct_chg) == [False, True, True]
+
+
+def test_not_of_comparison_negates_comparison_result():
+    # 文档中的例外：比较对 NaN 为 False，取反后为真；需要时用 isnull 排除
+    assert mask("not (pct_chg > 5)", pct_chg=[NAN, 6]) == [True, False]
+    assert mask("not (pct_chg > 5) and not isnull(pct_chg)", pct_chg=[NAN, 6, 1]) == [False, False, True]
+
+
+def test_coalesce_and_isnull():
+    assert mask("coalesce(pct_chg, 0) >= 0", pct_chg=[NAN, -1]) == [True, False]
+    assert mask("isnull(pct_chg)", pct_chg=[NAN, -1]) == [True, False]
+
+
+def test_expression_fields():
+    expression = compile_expression("pct_chg > 0 and vol / avg_vol_5 > 2 and pct_chg < 9")
+    assert expression.fields == ["pct_chg", "vol", "avg_vol_5"]
+
+
+# ---------------------------------------------------------------- 截面查询
+
+
+def test_cross_section_query_joins_only_needed_tables():
+    sql = str(cross_section_query(["pct_chg", "vol"]))
+    assert "d.pct_chg as pct_chg" in sql
+    assert "JOIN stock_volume_stats" not in sql
+    assert "JOIN moneyflow_dc" not in sql
+    assert "JOIN moneyflow " not in sql
+    assert "JOIN stk_factor_pro" not in sql
+
+    sql = str(cross_section_query(["volume_ratio_5", "turnover_rate", "elg_net_vol"]))
+    assert "JOIN stock_volume_stats v" in sql
+    assert "JOIN stk_factor_pro f" in sql
+    assert "JOIN moneyflow mf" in sql
+    assert "JOIN moneyflow_dc" not in sql
+    assert "mf.buy_elg_vol - mf.sell_elg_vol as elg_net_vol" in sql
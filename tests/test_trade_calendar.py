@@ -0,0 +1,95 @@
+from datetime import date
+
+import pytest
+
+from app.core.config import settings
+from app.core.trade_calendar import TradeCalendar
+
+# 2024-01-06/07 为周末，2024-01-01 元旦休市
+DATES = ["20240102", "20240103", "20240104", "20240105", "20240108", "20240109"]
+
+
+@pytest.fixture
+def calendar():
+    calendar = TradeCalendar()
+    calendar.set_dates(DATES, "test")
+    return calendar
+
+
+def test_is_open(calendar):
+    assert calendar.is_open("20240105")
+    assert calendar.is_open("2024-01-08")
+    assert calendar.is_open(date(2024, 1, 9))
+    assert not calendar.is_open("20240106")
+    # 日历范围之外按工作日判断
+    assert calendar.is_open("20231229")
+    assert calendar.is_open("20240110")
+    assert not calendar.is_open("20240113")
+    assert not calendar.is_open("not a date")
+
+
+def test_offset_on_trading_day(calendar):
+    assert calendar.offset("20240105", 0) == "20240105"
+    assert calendar.prev("20240105") == "20240104"
+    assert calendar.next("20240105") == "20240108"
+    assert calendar.prev("20240108", 3) == "20240103"
+
+
+def test_offset_on_non_trading_day(calendar):
+    assert calendar.offset("20240106", 0) == "20240105"
+    assert calendar.offset("20240107", 0) == "20240105"
+    assert calendar.prev("20240106") == "20240105"
+    assert calendar.next("20240106") == "20240108"
+
+
+def test_offset_out_of_range(calendar):
+    assert calendar.offset("20231231", 0) is None
+    assert calendar.prev("20240102") is None
+    assert calendar.next("20240109") is None
+    assert calendar.next("20231231") == "20240102"
+    assert calendar.prev("20240201") == "20240109"
+    assert calendar.offset("20240201", 0) == "20240109"
+
+
+def test_window_start(calendar):
+    assert calendar.window_start("20240109", 3) == "20240104"
+    assert calendar.window_start("20240106", 2) == "20240104"
+    # 不足 n 个交易日时取日历首日
+    assert calendar.window_start("20240104", 10) == "20240102"
+    # 之前没有交易日时取 value 本身
+    assert calendar.window_start("20240102", 5) == "20240102"
+    assert calendar.window_start("20231201", 5) == "20231201"
+    assert calendar.window_start("20240109", 0) == "20240109"
+
+
+def test_range_and_count(calendar):
+    assert calendar.range("20240104", "20240108") == ["20240104", "20240105", "20240108"]
+    assert calendar.count("20240104", "20240108") == 3
+    assert calendar.range("20240106", "20240107") == []
+    assert calendar.count("20240106", "20240107") == 0
+    assert calendar.range("20231201", "20240103") == ["20240102", "20240103"]
+    assert calendar.count("20240110", "20240201") == 0
+
+
+def test_fallback_file(monkeypatch, tmp_path):
+    path = tmp_path / "trade_cal.csv"
+    path.write_text("exchange,cal_date,is_open\nSSE,20240105,1\nSSE,20240106,0\nSSE,20240108,1\n")
+    monkeypatch.setattr(settings, "TRADE_CALENDAR_FILE", str(path))
+    calendar = TradeCalendar()
+    calendar._load_fallback()
+    assert calendar.source == str(path)
+    assert calendar.authoritative
+    assert calendar.range("20240101", "20240131") == ["20240105", "20240108"]
+
+
+def test_weekday_fallback(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "TRADE_CALENDAR_FILE", str(tmp_path / "missing.csv"))
+    calendar = TradeCalendar()
+    calendar._load_fallback()
+    assert calendar.source == "weekdays"
+    assert not calendar.authoritative
+    assert calendar.is_open("20240105")
+    assert not calendar.is_open("20240106")
+    assert calendar.offset("20240106", 0) == "20240105"
+    assert calendar.next("20240105") == "20240108"
+    assert calendar.count("20240101", "20240107") == 5